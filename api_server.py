@@ -1,12 +1,10 @@
-from flask import Flask, request, jsonify, send_file, after_this_request
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
-import subprocess
-import threading
-import sys
 import os
+import sys
+import json
 import shutil
-import tempfile
-from pathlib import Path
+import re
 from urllib.parse import urlparse
 from dotenv import load_dotenv
 
@@ -14,28 +12,26 @@ load_dotenv()
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
-
-from tools.autonomous_agent import agent_instance
-
-def run_agent_process(niche, location, sources):
-    """Runs the main_agent.py in a separate process."""
-    cmd = [sys.executable, "main_agent.py", "--mode", "flow-lead-gen", "--niche", niche]
-
-    if location:
-        cmd.extend(["--location", location])
-
-    if sources:
-        cmd.extend(["--sources"] + sources)
-
-    print(f"Starting agent with command: {' '.join(cmd)}")
-
-    try:
-        # Run in a separate process to avoid blocking the server
-        # We don't wait for it to finish here, as it can take minutes
-        subprocess.Popen(cmd, cwd=os.getcwd())
-    except Exception as e:
-        print(f"Error starting agent: {e}")
-
+# Behind nginx/apache, let the web server send cached MP3s (X-Sendfile)
+app.config["USE_X_SENDFILE"] = os.getenv("USE_X_SENDFILE", "").lower() in {"1", "true", "yes"}
+
+from tools.job_scheduler import flow_scheduler
+from tools.flow_worker_pool import WarmWorkerPool
+from tools.youtube_jobs import conversion_manager
+from tools.youtube_stream import Mp3Stream, stream_limiter
+from tools.audio_cache import extract_video_id
+from tools.metrics import metrics
+from tools.db_outbox import outbox
+
+# FLOW_RUNNER=subprocess keeps the old one-interpreter-per-run behaviour
+flow_pool = None
+if os.getenv("FLOW_RUNNER", "pool") == "pool":
+    flow_pool = WarmWorkerPool(processes=flow_scheduler.max_workers)
+    flow_scheduler.runner = flow_pool.run
+
+# Registers the outbox writers and drains rows earlier runs left pending
+from tools.db_client import start_outbox_flusher
+start_outbox_flusher()
 
 def is_valid_youtube_url(url: str) -> bool:
     """Basic validation to allow only YouTube URLs."""
@@ -60,110 +56,413 @@ def is_valid_youtube_url(url: str) -> bool:
 
 @app.route('/api/run-flow', methods=['POST'])
 def run_flow():
-    data = request.json
+    data = request.json or {}
     niche = data.get('niche')
     location = data.get('location')
     sources = data.get('sources', ['instagram'])  # Default to instagram
+    priority = data.get('priority', 5)  # Lower number = runs sooner
 
     if not niche:
         return jsonify({"error": "Niche is required"}), 400
 
-    # Start the agent in a background thread/process
-    thread = threading.Thread(target=run_agent_process, args=(niche, location, sources))
-    thread.start()
+    try:
+        priority = int(priority)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Field 'priority' must be an integer"}), 400
+
+    # Queue the run; identical in-flight requests share one job
+    job, created = flow_scheduler.submit(niche, location, sources, priority=priority)
 
     return jsonify({
-        "status": "started",
-        "message": f"FlowSearch started for niche: {niche}",
+        "status": "queued" if created else "deduplicated",
+        "job_id": job.id,
+        "message": f"FlowSearch queued for niche: {niche}" if created
+                   else f"FlowSearch for niche: {niche} is already in progress",
         "params": {
             "niche": niche,
             "location": location,
             "sources": sources
         }
-    })
-
+    }), 202
 
-@app.route('/api/youtube-to-mp3', methods=['POST'])
-def youtube_to_mp3():
-    """
-    Converts a YouTube URL to MP3 and returns the file.
 
-    Request JSON:
-    {
-      "url": "https://www.youtube.com/watch?v=..."
-    }
-    """
+@app.route('/api/run-news', methods=['POST'])
+def run_news():
     data = request.json or {}
+
+    try:
+        priority = int(data.get('priority', 5))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Field 'priority' must be an integer"}), 400
+
+    job, created = flow_scheduler.submit(None, mode="news", priority=priority)
+
+    return jsonify({
+        "status": "queued" if created else "deduplicated",
+        "job_id": job.id,
+    }), 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = flow_scheduler.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    payload = job.to_dict()
+    payload["queue_position"] = flow_scheduler.queue_position(job_id)
+    return jsonify(payload)
+
+
+def _validate_youtube_request(data=None):
+    """Returns (youtube_url, quality, None) or (None, None, error_response) for a conversion request."""
+    if data is None:
+        data = request.json or {}
     youtube_url = (data.get('url') or '').strip()
+    quality = str(data.get('quality', '0')).strip()
 
     if not youtube_url:
-        return jsonify({"error": "Field 'url' is required"}), 400
+        return None, None, (jsonify({"error": "Field 'url' is required"}), 400)
 
     if not is_valid_youtube_url(youtube_url):
-        return jsonify({"error": "Only YouTube URLs are allowed"}), 400
+        return None, None, (jsonify({"error": "Only YouTube URLs are allowed"}), 400)
+
+    # yt-dlp --audio-quality: VBR 0 (best) - 10 or a bitrate like 128K
+    if not re.fullmatch(r"(10|\d|\d{2,3}K)", quality):
+        return None, None, (jsonify({"error": "Field 'quality' must be 0-10 or a bitrate like 192K"}), 400)
 
     if not shutil.which("yt-dlp"):
-        return jsonify({
+        return None, None, (jsonify({
             "error": "yt-dlp is not installed on server. Install dependency and retry."
-        }), 500
+        }), 500)
 
     if not shutil.which("ffmpeg"):
-        return jsonify({
+        return None, None, (jsonify({
             "error": "ffmpeg is not installed on server. MP3 conversion requires ffmpeg."
-        }), 500
+        }), 500)
 
-    tmp_dir = tempfile.mkdtemp(prefix="ytmp3_")
-    output_template = str(Path(tmp_dir) / "%(title).80s-%(id)s.%(ext)s")
+    return youtube_url, quality, None
 
-    cmd = [
-        "yt-dlp",
-        "--extract-audio",
-        "--audio-format", "mp3",
-        "--audio-quality", "0",
-        "--no-playlist",
-        "--output", output_template,
-        youtube_url,
-    ]
 
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=False)
-        if result.returncode != 0:
-            return jsonify({
-                "error": "Failed to convert YouTube video to MP3",
-                "details": result.stderr.strip() or result.stdout.strip() or "Unknown error",
-            }), 502
-
-        mp3_files = sorted(Path(tmp_dir).glob("*.mp3"), key=lambda p: p.stat().st_mtime, reverse=True)
-        if not mp3_files:
-            return jsonify({"error": "Conversion completed, but MP3 file was not found"}), 500
-
-        mp3_path = mp3_files[0]
-
-        @after_this_request
-        def cleanup(response):
-            try:
-                shutil.rmtree(tmp_dir, ignore_errors=True)
-            except Exception:
-                pass
-            return response
-
-        return send_file(
-            mp3_path,
-            as_attachment=True,
-            download_name=mp3_path.name,
-            mimetype="audio/mpeg",
-            max_age=0,
-        )
+def _send_conversion_file(job):
+    if not job.file_path.exists():
+        return jsonify({"error": "File is no longer available. Start a new conversion."}), 410
+    return _send_audio_file(job.file_path, job.download_name)
+
+
+def _send_audio_file(path, download_name):
+    # conditional=True enables HTTP Range / If-Range handling; the file itself
+    # goes out through the WSGI file wrapper (sendfile where the server supports it)
+    return send_file(
+        path,
+        as_attachment=True,
+        download_name=download_name,
+        mimetype="audio/mpeg",
+        max_age=0,
+        conditional=True,
+    )
+
+
+@app.route('/api/youtube-to-mp3/jobs', methods=['POST'])
+def create_youtube_to_mp3_job():
+    """
+    Starts a YouTube -> MP3 conversion in the background.
+
+    Request JSON:
+    {
+      "url": "https://www.youtube.com/watch?v=...",
+      "quality": "0"  (optional, yt-dlp --audio-quality)
+    }
+    """
+    youtube_url, quality, error = _validate_youtube_request()
+    if error:
+        return error
+
+    job = conversion_manager.submit(youtube_url, quality)
+    return jsonify({
+        "status": job.status,
+        "job_id": job.id,
+        "cached": job.cached,
+        "status_url": f"/api/youtube-to-mp3/jobs/{job.id}",
+        "file_url": f"/api/youtube-to-mp3/jobs/{job.id}/file",
+    }), 202
+
+
+@app.route('/api/youtube-to-mp3/jobs/<job_id>', methods=['GET'])
+def youtube_to_mp3_job_status(job_id):
+    job = conversion_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
 
+@app.route('/api/youtube-to-mp3/jobs/<job_id>/file', methods=['GET'])
+def youtube_to_mp3_job_file(job_id):
+    job = conversion_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    if job.status == "failed":
+        return jsonify({"error": "Failed to convert YouTube video to MP3", "details": job.error}), 502
+
+    if job.status != "completed":
+        return jsonify({"error": "Conversion still in progress", "status": job.status}), 409
+
+    return _send_conversion_file(job)
+
+
+@app.route('/api/youtube-to-mp3/cache', methods=['GET'])
+def youtube_to_mp3_cache_stats():
+    return jsonify(conversion_manager.cache.stats())
+
+
+@app.route('/api/youtube-to-mp3/stream', methods=['GET', 'POST'])
+def youtube_to_mp3_stream():
+    """
+    Streams MP3 while it is being converted: yt-dlp stdout -> ffmpeg -> chunked response.
+    No temp files; closing the connection kills both processes.
+    Accepts the same fields as /api/youtube-to-mp3 as JSON (POST) or query string (GET).
+    """
+    data = request.get_json(silent=True) if request.method == 'POST' else request.args
+    youtube_url, quality, error = _validate_youtube_request(data or {})
+    if error:
+        return error
+
+    # Already converted: serve from the cache instead of transcoding again
+    video_id = extract_video_id(youtube_url)
+    cached = conversion_manager.cache.get(video_id, quality) if video_id else None
+    if cached:
+        return _send_audio_file(cached["path"], cached["download_name"])
+
+    if not stream_limiter.try_acquire():
+        return jsonify({"error": "Too many conversions in progress. Retry shortly."}), 503
+
+    stream = Mp3Stream(youtube_url, quality)
+    try:
+        started = stream.start()
     except Exception as e:
-        shutil.rmtree(tmp_dir, ignore_errors=True)
+        stream.close()
+        stream_limiter.release()
         return jsonify({"error": f"Unexpected server error: {e}"}), 500
 
+    if not started:
+        stream_limiter.release()
+        return jsonify({"error": "Failed to convert YouTube video to MP3"}), 502
+
+    def cleanup():
+        stream.close()
+        stream_limiter.release()
+
+    response = Response(
+        iter(stream),
+        mimetype="audio/mpeg",
+        headers={
+            "Content-Disposition": f"attachment; filename={video_id or 'youtube-audio'}.mp3",
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",
+        },
+    )
+    # Called by the WSGI server when the response ends or the client goes away
+    response.call_on_close(cleanup)
+    return response
+
+
+@app.route('/api/youtube-to-mp3', methods=['POST'])
+def youtube_to_mp3():
+    """
+    Converts a YouTube URL to MP3 and returns the file once it is ready.
+    Kept for existing clients; new clients should use /api/youtube-to-mp3/jobs.
+    The conversion still runs in the bounded conversion pool.
+
+    Request JSON:
+    {
+      "url": "https://www.youtube.com/watch?v=...",
+      "quality": "0"  (optional, yt-dlp --audio-quality)
+    }
+    """
+    youtube_url, quality, error = _validate_youtube_request()
+    if error:
+        return error
+
+    job = conversion_manager.submit(youtube_url, quality)
+    job.done.wait()
+
+    if job.status != "completed":
+        return jsonify({
+            "error": "Failed to convert YouTube video to MP3",
+            "details": job.error or "Unknown error",
+        }), 502
+
+    return _send_conversion_file(job)
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition of pipeline, LLM and job metrics (worker processes included)."""
+    job_counts = {status: 0 for status in ("queued", "running", "completed", "failed")}
+    for job in flow_scheduler.list_jobs():
+        job_counts[job["status"]] = job_counts.get(job["status"], 0) + 1
+    for status, count in job_counts.items():
+        metrics.set("flow_jobs", count, status=status)
+
+    # Only report agent sessions once the agent stack has been loaded by a request
+    if "tools.agent_sessions" in sys.modules:
+        session_counts = {status: 0 for status in ("queued", "planning", "running", "completed", "failed", "idle")}
+        for session in get_agent_sessions().list_sessions():
+            session_counts[session["status"]] = session_counts.get(session["status"], 0) + 1
+        for status, count in session_counts.items():
+            metrics.set("agent_sessions", count, status=status)
+
+    outbox.stats()  # sets the outbox depth and age gauges
+
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/api/db-outbox', methods=['GET'])
+def db_outbox_stats():
+    """Rows waiting for Supabase in the local outbox, per table: pending, rejected, oldest age."""
+    return jsonify(outbox.stats())
 
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({"status": "ok"})
 
+def get_agent_sessions():
+    """The agent session manager (and the LLM/search SDKs) is loaded on the first agent request."""
+    from tools.agent_sessions import agent_sessions
+    return agent_sessions
+
+# Session used by the legacy single-agent endpoints below
+DEFAULT_AGENT_SESSION = "default"
+
+def _start_agent_session(goal, session_id=None):
+    from tools.agent_sessions import SessionLimitError
+    try:
+        session = get_agent_sessions().create(goal, session_id=session_id)
+    except SessionLimitError as e:
+        return None, (jsonify({"status": "failed", "message": str(e)}), 429)
+    return session, None
+
+@app.route('/api/agent/sessions', methods=['POST'])
+def create_agent_session():
+    data = request.get_json(silent=True) or {}
+    goal = data.get('goal')
+
+    if not goal:
+        return jsonify({"status": "failed", "message": "Goal is required"}), 400
+
+    session, error = _start_agent_session(goal)
+    if error:
+        return error
+    return jsonify({
+        "status": "started",
+        "session_id": session.id,
+        "status_url": f"/api/agent/{session.id}/status",
+    }), 202
+
+@app.route('/api/agent/search-cache', methods=['GET'])
+def agent_search_cache_stats():
+    from tools.search_cache import search_cache
+    return jsonify(search_cache.stats())
+
+@app.route('/api/agent/sessions', methods=['GET'])
+def list_agent_sessions():
+    return jsonify({"sessions": get_agent_sessions().list_sessions()})
+
+@app.route('/api/agent/<session_id>/status', methods=['GET'])
+def agent_session_status(session_id):
+    session = get_agent_sessions().get(session_id)
+    if not session:
+        return jsonify({"status": "failed", "message": "Session not found"}), 404
+    return jsonify({"session_id": session.id, **session.agent.get_state()})
+
+# Seconds between SSE keepalive comments when the agent is quiet
+AGENT_SSE_KEEPALIVE = 15
+
+def _parse_event_cursor():
+    """Cursor from ?since= or, for reconnecting EventSource clients, the Last-Event-ID header."""
+    raw = request.args.get('since', request.headers.get('Last-Event-ID'))
+    if raw is None or raw == '':
+        return None, None
+    try:
+        cursor = int(raw)
+    except ValueError:
+        return None, (jsonify({"status": "failed", "message": "since must be an integer cursor"}), 400)
+    if cursor < 0:
+        return None, (jsonify({"status": "failed", "message": "since must be >= 0"}), 400)
+    return cursor, None
+
+def _agent_events_response(agent, session_id):
+    cursor, error = _parse_event_cursor()
+    if error:
+        return error
+    events, next_cursor, truncated = agent.events.since(cursor or 0)
+    return jsonify({
+        "session_id": session_id,
+        "events": events,
+        "cursor": next_cursor,
+        # Events after the cursor fell out of the buffer; reload /status
+        "truncated": truncated,
+    })
+
+def _sse_message(event_type, data, event_id=None):
+    message = f"event: {event_type}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data, default=str)}\n\n"
+
+def _agent_event_stream(agent):
+    cursor, error = _parse_event_cursor()
+    if error:
+        return error
+
+    def generate():
+        position = cursor
+        if position is None:
+            # New client: one full snapshot, then only changes
+            state = agent.get_state()
+            position = state["cursor"]
+            yield _sse_message("state", state, position)
+        while True:
+            if not agent.events.wait(position, timeout=AGENT_SSE_KEEPALIVE):
+                yield ": keepalive\n\n"
+                continue
+            events, position, truncated = agent.events.since(position)
+            if truncated:
+                yield _sse_message("truncated", {"cursor": position})
+            for event in events:
+                yield _sse_message(event["type"], event, event["seq"])
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # nginx: don't buffer the stream
+    })
+
+@app.route('/api/agent/<session_id>/events', methods=['GET'])
+def agent_session_events(session_id):
+    session = get_agent_sessions().get(session_id)
+    if not session:
+        return jsonify({"status": "failed", "message": "Session not found"}), 404
+    return _agent_events_response(session.agent, session.id)
+
+@app.route('/api/agent/<session_id>/events/stream', methods=['GET'])
+def agent_session_event_stream(session_id):
+    session = get_agent_sessions().get(session_id)
+    if not session:
+        return jsonify({"status": "failed", "message": "Session not found"}), 404
+    return _agent_event_stream(session.agent)
+
+@app.route('/api/agent/<session_id>/stop', methods=['POST'])
+def stop_agent_session(session_id):
+    if not get_agent_sessions().stop(session_id):
+        return jsonify({"status": "failed", "message": "Session not found"}), 404
+    return jsonify({"status": "stopped", "session_id": session_id})
+
+@app.route('/api/agent/<session_id>', methods=['DELETE'])
+def delete_agent_session(session_id):
+    if not get_agent_sessions().remove(session_id):
+        return jsonify({"status": "failed", "message": "Session not found"}), 404
+    return jsonify({"status": "deleted", "session_id": session_id})
+
 @app.route('/api/agent/start', methods=['POST'])
 def start_agent():
     data = request.json
@@ -171,20 +470,41 @@ def start_agent():
     
     if not goal:
         return jsonify({"status": "failed", "message": "Goal is required"}), 400
-        
-    result = agent_instance.start(goal)
-    return jsonify(result)
+
+    _, error = _start_agent_session(goal, session_id=DEFAULT_AGENT_SESSION)
+    if error:
+        return error
+    return jsonify({"status": "started"})
 
 @app.route('/api/agent/status', methods=['GET'])
 def agent_status():
-    return jsonify(agent_instance.get_state())
+    session = get_agent_sessions().get(DEFAULT_AGENT_SESSION)
+    if not session:
+        return jsonify({"status": "idle", "goal": "", "tasks": [], "logs": []})
+    return jsonify(session.agent.get_state())
+
+@app.route('/api/agent/events', methods=['GET'])
+def agent_events():
+    session = get_agent_sessions().get(DEFAULT_AGENT_SESSION)
+    if not session:
+        return jsonify({"session_id": DEFAULT_AGENT_SESSION, "events": [], "cursor": 0, "truncated": False})
+    return _agent_events_response(session.agent, session.id)
+
+@app.route('/api/agent/events/stream', methods=['GET'])
+def agent_event_stream():
+    session = get_agent_sessions().get(DEFAULT_AGENT_SESSION)
+    if not session:
+        return jsonify({"status": "failed", "message": "No agent running"}), 404
+    return _agent_event_stream(session.agent)
 
 @app.route('/api/agent/stop', methods=['POST'])
 def stop_agent():
-    agent_instance.stop()
+    get_agent_sessions().stop(DEFAULT_AGENT_SESSION)
     return jsonify({"status": "stopped"})
 
 if __name__ == '__main__':
     port = 8000
+    if flow_pool:
+        flow_pool.start()
     print(f"FlowAssist API running on http://localhost:{port}")
     app.run(host='0.0.0.0', port=port)
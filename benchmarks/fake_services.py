@@ -0,0 +1,375 @@
+"""
+Local stand-ins for every external service the pipelines call, served from one
+threaded HTTP server:
+
+  /reddit/r/<sub>/.rss               Reddit RSS            (REDDIT_RSS_BASE), every 10th post cross-posted
+  /github/...                        GitHub REST API       (GITHUB_API_BASE)
+  /youtube/v3/...                    YouTube Data API      (YOUTUBE_API_BASE)
+  /v1beta/models/<m>:generateContent Gemini REST API       (GEMINI_API_BASE)
+  /openai/v1/chat/completions        OpenAI API            (OPENAI_BASE_URL)
+  /v2/...                            Apify API + datasets  (APIFY_API_URL)
+  /rest/v1/<table>                   Supabase PostgREST    (SUPABASE_URL)
+
+LLM endpoints take a configurable latency, share of slow (10x latency) calls and 429 rate,
+and either provider can be taken down (every call answered with 503). PostgREST writes can fail
+transiently (a 503 page from the proxy) at a configurable rate, and rows holding a NUL character
+are rejected the way Postgres rejects them (400, SQLSTATE 22P05). `FakeServices.env()` returns
+the environment that points the tools at the server.
+
+Usage (standalone, e.g. to run main_agent.py by hand):
+  python benchmarks/fake_services.py --items 100 --port 8765
+"""
+import argparse
+import gzip
+import json
+import random
+import threading
+import time
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+_LLM_REPLY = {
+    # Summarizer fields
+    "summary_points": [
+        "Nowy model osiąga lepsze wyniki w testach.",
+        "Wagi są dostępne publicznie.",
+        "Premiera zapowiedziana na przyszły tydzień.",
+    ],
+    "category": "Modele LLM",
+    # FlowAnalyzer fields
+    "pain_score": 7,
+    "signals": [{"category": "Booking", "text": "Czy macie wolny termin?", "confidence": "high"}],
+    "summary": "Klienci pytają o terminy w komentarzach.",
+}
+
+_COMMENTS = [
+    "Czy macie wolny termin na piątek?",
+    "Jaka cena za hybrydę?",
+    "Jak się można zapisać? Dzwonię i nikt nie odbiera...",
+    "Beautiful work!",
+]
+
+
+class FakeConfig:
+    def __init__(self, items: int = 10, llm_latency: float = 0.0, llm_429_rate: float = 0.0, seed: int = 1,
+                 llm_slow_rate: float = 0.0, llm_down=(), db_error_rate: float = 0.0):
+        self.items = items
+        self.llm_latency = llm_latency
+        self.llm_429_rate = llm_429_rate
+        self.llm_slow_rate = llm_slow_rate
+        self.llm_down = set(llm_down)
+        self.db_error_rate = db_error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+
+    def count(self, service: str):
+        with self.lock:
+            self.requests[service] = self.requests.get(service, 0) + 1
+
+    def llm_throttled(self) -> bool:
+        with self.lock:
+            slow = self.random.random() < self.llm_slow_rate
+            throttled = self.random.random() < self.llm_429_rate
+        if self.llm_latency:
+            time.sleep(self.llm_latency * (10 if slow else 1))
+        return throttled
+
+    def db_unavailable(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.db_error_rate
+
+
+# Every n-th Reddit post is the same story in every subreddit (a cross-post), as in real feeds
+CROSSPOST_EVERY = 10
+
+
+def _story(key: str, words: int = 12) -> str:
+    """Deterministic made-up words, so distinct stories do not look alike to near-duplicate detection."""
+    rng = random.Random(key)
+    return " ".join(f"{rng.choice('bdfgklmnprstvz')}{rng.choice('aeiou')}{rng.randrange(10000)}" for _ in range(words))
+
+
+# Shaped like real Reddit RSS content: markdown HTML, a table, an image and the "submitted by" footer
+_REDDIT_BODY = (
+    '<!-- SC_OFF --><div class="md"><p>{story} about a <a href="https://example.com/m">new model</a>. '
+    'It has two sentences.</p><table><tr><th>Benchmark</th><th>Score</th></tr><tr><td>MMLU</td><td>91.2</td></tr>'
+    '</table><p><img src="https://preview.redd.it/bench.png?width=640&amp;format=png"/></p></div><!-- SC_ON --> '
+    '&#32; submitted by &#32; <a href="https://www.reddit.com/user/bench"> /u/bench </a> <br/> '
+    '<span><a href="https://example.com/link">[link]</a></span> &#32; '
+    '<span><a href="https://www.reddit.com/r/bench/comments/1/">[comments]</a></span>'
+)
+
+
+def _rss_feed(sub: str, items: int) -> bytes:
+    now = formatdate(usegmt=True)
+    entries = ""
+    for i in range(items):
+        story = f"story-{i}" if i % CROSSPOST_EVERY == 0 else f"{sub}-{i}"
+        entries += (
+            f"<entry><title>{_story(story, 5)}: new model results</title>"
+            f"<link href=\"https://example.com/r/{sub}/{i}\"/>"
+            f"<id>t3_{sub}_{i}</id><updated>2026-01-01T00:00:00+00:00</updated>"
+            f"<author><name>/u/user{i}</name></author>"
+            f"<content type=\"html\">{escape(_REDDIT_BODY.format(story=_story(story)))}</content>"
+            f"</entry>"
+        )
+    return (f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><feed xmlns=\"http://www.w3.org/2005/Atom\">"
+            f"<title>r/{sub}</title><updated>{now}</updated>{entries}</feed>").encode()
+
+
+def _github_repo(i: int) -> Dict:
+    return {
+        "full_name": f"bench/repo-{i}",
+        "html_url": f"https://example.com/bench/repo-{i}",
+        "pushed_at": "2026-01-01T00:00:00Z",
+        "owner": {"login": "bench", "avatar_url": "https://example.com/a.png"},
+        "description": f"Benchmark repository: {_story(f'repo-{i}')}",
+    }
+
+
+def _apify_item(actor: str, i: int) -> Dict:
+    if "tiktok" in actor:
+        return {"id": f"tt{i}", "webVideoUrl": f"https://example.com/tt/{i}", "text": f"Video {i} #salon",
+                "authorMeta": {"name": f"salon_{i}"}, "diggCount": i, "commentCount": 3, "createTime": 1767225600}
+    if "facebook" in actor:
+        return {"id": f"fb{i}", "url": f"https://example.com/fb/{i}", "text": f"Post {i}",
+                "user": {"name": f"Salon {i}"}, "likes": i, "comments": 2, "time": "2026-01-01T00:00:00Z"}
+    if "comments" in actor:
+        return {"text": _COMMENTS[i % len(_COMMENTS)], "ownerUsername": f"user{i}", "likesCount": 0,
+                "timestamp": "2026-01-01T00:00:00Z"}
+    return {
+        "id": f"ig{i}", "url": f"https://example.com/p/{i}", "caption": f"Nowe stylizacje paznokci {i}",
+        "ownerUsername": f"salon_{i}", "likesCount": i, "commentsCount": len(_COMMENTS),
+        "timestamp": "2026-01-01T00:00:00Z",
+        "latestComments": [{"text": c} for c in _COMMENTS],
+    }
+
+
+def _apify_run(run_id: str, actor_id: str, dataset_id: str) -> Dict:
+    return {
+        "id": run_id, "actId": actor_id, "userId": "bench", "status": "SUCCEEDED",
+        "startedAt": "2026-01-01T00:00:00.000Z", "finishedAt": "2026-01-01T00:00:01.000Z",
+        "meta": {"origin": "API"}, "stats": {},
+        "options": {"build": "latest", "timeoutSecs": 300, "memoryMbytes": 1024, "diskMbytes": 2048},
+        "buildId": "bench", "defaultDatasetId": dataset_id,
+        "defaultKeyValueStoreId": "bench", "defaultRequestQueueId": "bench",
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: FakeConfig = None
+    datasets: Dict[str, str] = {}
+    runs: Dict[str, Dict] = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    # -- helpers --
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if self.headers.get("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        return raw
+
+    def _send(self, status: int, payload, content_type="application/json", headers=None):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # -- routing --
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PATCH(self):
+        self._route("POST")
+
+    def _route(self, method):
+        url = urlparse(self.path)
+        path, query = url.path, parse_qs(url.query)
+        body = self._body() if method == "POST" else b""
+        cfg = self.config
+
+        if path.startswith("/reddit/r/") and path.endswith(".rss"):
+            cfg.count("reddit")
+            return self._send(200, _rss_feed(path.split("/")[3], cfg.items), "application/atom+xml")
+
+        if path.startswith("/github/"):
+            cfg.count("github")
+            if path.startswith("/github/search/repositories"):
+                return self._send(200, {"items": [_github_repo(i) for i in range(10)]})
+            return self._send(200, _github_repo(0))
+
+        if path.startswith("/youtube/v3/"):
+            cfg.count("youtube")
+            if path.endswith("/channels"):
+                return self._send(200, {"items": [{"id": "UCbenchbenchbenchbenchbe",
+                                                   "contentDetails": {"relatedPlaylists": {"uploads": "UUbench"}}}]})
+            max_results = int((query.get("maxResults") or ["5"])[0])
+            return self._send(200, {"items": [{
+                "snippet": {"title": f"Video {_story(f'video-{i}', 5)}", "publishedAt": "2026-01-01T00:00:00Z",
+                            "thumbnails": {"high": {"url": "https://example.com/t.jpg"}},
+                            "channelTitle": "Bench Channel",
+                            "description": f"Benchmark video description. {_story(f'video-{i}')}"},
+                "contentDetails": {"videoId": f"vid{i:08d}"},
+            } for i in range(min(max_results, cfg.items))]})
+
+        if ":generateContent" in path:
+            cfg.count("gemini")
+            if "gemini" in cfg.llm_down:
+                return self._send(503, {"error": {"code": 503, "message": "Service unavailable (fake)",
+                                                  "status": "UNAVAILABLE"}})
+            if cfg.llm_throttled():
+                return self._send(429, {"error": {"code": 429, "message": "Resource exhausted (fake)",
+                                                  "status": "RESOURCE_EXHAUSTED"}})
+            return self._send(200, {
+                "candidates": [{"content": {"parts": [{"text": json.dumps(_LLM_REPLY, ensure_ascii=False)}],
+                                            "role": "model"}, "finishReason": "STOP", "index": 0}],
+                "usageMetadata": {"promptTokenCount": len(body) // 4, "candidatesTokenCount": 80,
+                                  "totalTokenCount": len(body) // 4 + 80},
+            })
+
+        if path.startswith("/openai/") and path.endswith("/chat/completions"):
+            cfg.count("openai")
+            if "openai" in cfg.llm_down:
+                return self._send(503, {"error": {"message": "Service unavailable (fake)", "type": "server_error"}})
+            if cfg.llm_throttled():
+                return self._send(429, {"error": {"message": "Rate limit (fake)", "type": "rate_limit"}},
+                                  headers={"retry-after-ms": "20"})
+            return self._send(200, {
+                "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+                "model": "gpt-4o-mini",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": json.dumps(_LLM_REPLY, ensure_ascii=False)}}],
+                "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": 80,
+                          "total_tokens": len(body) // 4 + 80},
+            })
+
+        if path.startswith("/v2/"):
+            cfg.count("apify")
+            return self._apify(method, path, query)
+
+        if path.startswith("/rest/v1/"):
+            cfg.count("postgrest")
+            if method == "POST":
+                if cfg.db_unavailable():
+                    return self._send(503, b"<html><body>503 Service Unavailable</body></html>", "text/html")
+                if "\\u0000" in body.decode("utf-8"):
+                    return self._send(400, {"code": "22P05", "details": "\\u0000 cannot be converted to text.",
+                                            "hint": None, "message": "unsupported Unicode escape sequence"})
+                rows = json.loads(body or b"[]")
+                return self._send(201, rows if isinstance(rows, list) else [rows])
+            # sources, existing-URL lookups: nothing stored
+            return self._send(200, [])
+
+        self._send(404, {"error": f"no fake for {method} {path}"})
+
+    def _apify(self, method, path, query):
+        parts = path.strip("/").split("/")
+        if method == "POST" and len(parts) == 4 and parts[1] in ("acts", "actors") and parts[3] == "runs":
+            run_id, dataset_id = uuid.uuid4().hex[:17], uuid.uuid4().hex[:17]
+            self.datasets[dataset_id] = parts[2].replace("~", "/")
+            self.runs[run_id] = _apify_run(run_id, parts[2], dataset_id)
+            return self._send(201, {"data": self.runs[run_id]})
+        if len(parts) >= 3 and parts[1] == "actor-runs" and parts[2] in self.runs:
+            if parts[-1] == "log":
+                return self._send(200, b"", "text/plain")
+            return self._send(200, {"data": self.runs[parts[2]]})
+        if len(parts) == 4 and parts[1] == "datasets" and parts[3] == "items":
+            actor = self.datasets.get(parts[2], "")
+            total = self.config.items
+            offset = int((query.get("offset") or ["0"])[0])
+            limit = int((query.get("limit") or [str(total)])[0] or total)
+            items = [_apify_item(actor, i) for i in range(offset, min(offset + limit, total))]
+            return self._send(200, items, headers={
+                "X-Apify-Pagination-Offset": str(offset),
+                "X-Apify-Pagination-Limit": str(limit),
+                "X-Apify-Pagination-Count": str(len(items)),
+                "X-Apify-Pagination-Total": str(total),
+                "X-Apify-Pagination-Desc": "false",
+            })
+        self._send(404, {"error": {"type": "record-not-found", "message": path}})
+
+
+class FakeServices:
+    """Runs all fakes on one local port in a background thread."""
+
+    def __init__(self, config: FakeConfig, port: int = 0):
+        handler = type("Handler", (_Handler,), {"config": config, "datasets": {}, "runs": {}})
+        self.config = config
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-services", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self) -> "FakeServices":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def env(self) -> Dict[str, str]:
+        base = self.base_url
+        return {
+            "REDDIT_RSS_BASE": f"{base}/reddit",
+            "GITHUB_API_BASE": f"{base}/github",
+            "YOUTUBE_API_BASE": base,
+            "YOUTUBE_API_KEY": "fake-youtube-key",
+            "GEMINI_API_BASE": base,
+            "GEMINI_API_KEY": "fake-gemini-key",
+            "OPENAI_BASE_URL": f"{base}/openai/v1",
+            "OPENAI_API_KEY": "fake-openai-key",
+            "APIFY_API_URL": base,
+            "APIFY_API_KEY": "fake-apify-key",
+            "SUPABASE_URL": base,
+            "SUPABASE_KEY": "fake.supabase.key",
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fakes of the external services")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--items", type=int, default=10, help="Items per feed / Apify dataset")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds added to each LLM call")
+    parser.add_argument("--llm-429-rate", type=float, default=0.0, help="Fraction of LLM calls answered with 429")
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="Fraction of LLM calls taking 10x the latency")
+    parser.add_argument("--llm-down", action="append", choices=["gemini", "openai"], default=[],
+                        help="Answer every call to this LLM provider with 503")
+    parser.add_argument("--db-error-rate", type=float, default=0.0, help="Fraction of DB writes answered with 503")
+    args = parser.parse_args()
+
+    services = FakeServices(FakeConfig(args.items, args.llm_latency, args.llm_429_rate,
+                                       llm_slow_rate=args.llm_slow_rate, llm_down=args.llm_down,
+                                       db_error_rate=args.db_error_rate), port=args.port)
+    print(f"Fake services on {services.base_url}. Environment:")
+    for name, value in services.env().items():
+        print(f"  export {name}={value}")
+    try:
+        services.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Offline end-to-end benchmark for run_news_aggregator and run_flow_lead_gen.
+
+Every external service is replaced by the local fakes in benchmarks/fake_services.py
+(Reddit RSS, GitHub, YouTube, Gemini, OpenAI, Apify, Supabase PostgREST), so runs cost
+no credits or quota. Each (mode, scale) runs in a fresh interpreter, where scale is the
+number of items per feed / Apify dataset. Reported per run:
+  - items/sec (fetched news items, or lead candidates)
+  - p50/p95 latency per pipeline stage and LLM provider (from tools.metrics histograms)
+  - peak RSS of the pipeline process
+
+Note: apify-client 3.x waits a fixed few seconds after every actor run for its status
+watcher; that cost is real and shows up under stage=collector.
+
+With --replay the pipelines run against a cassette recorded by
+`main_agent.py --record PATH` (see tools/cassette.py) instead of the fakes: real
+responses, no network, and saving is skipped. --record captures a run against the
+fakes into a cassette (use it with a single --scale).
+
+Usage:
+  python benchmarks/pipeline_bench.py
+  python benchmarks/pipeline_bench.py --mode news --scale 10 --scale 100
+  python benchmarks/pipeline_bench.py --llm-latency 0.2 --llm-429-rate 0.05
+  LLM_HEDGE=1 python benchmarks/pipeline_bench.py --llm-latency 0.1 --llm-slow-rate 0.1
+  python benchmarks/pipeline_bench.py --mode flow-lead-gen --llm-down gemini
+  python benchmarks/pipeline_bench.py --json pipeline.json
+  python benchmarks/pipeline_bench.py --baseline pipeline.json --max-regression 20
+  python benchmarks/pipeline_bench.py --mode news --replay .cache/cassettes/news.sqlite3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_services import FakeConfig, FakeServices  # noqa: E402
+
+MODES = ["news", "flow-lead-gen"]
+DEFAULT_SCALES = [10, 100, 10000]
+FLOW_NICHE = "paznokcie"
+
+
+def run_child(mode: str, out_path: str, niche: str, dry_run: bool):
+    """Runs one pipeline in this (fresh) interpreter and writes timings, RSS and metrics."""
+    import resource
+    import main_agent
+    from tools.metrics import metrics
+
+    start = time.perf_counter()
+    if mode == "news":
+        result = main_agent.run_news_aggregator(dry_run=dry_run)
+        items = result.get("fetched", 0)
+    else:
+        result = main_agent.run_flow_lead_gen(niche, sources=["instagram"], dry_run=dry_run)
+        items = result.get("candidates", 0)
+    if not dry_run:
+        # Saves queue rows in the outbox; the run is done once they are written
+        from tools.db_client import flush_outbox
+        flush_outbox()
+    wall_s = time.perf_counter() - start
+
+    with open(out_path, "w") as f:
+        json.dump({
+            "wall_s": wall_s,
+            "items": items,
+            "result": result,
+            # ru_maxrss is in KiB on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "metrics": metrics.snapshot(),
+        }, f)
+
+
+def histogram_quantile(q: float, bounds: List[float], buckets: List[int], count: int) -> float:
+    """Prometheus-style quantile estimate from cumulative bucket counts (linear within a bucket)."""
+    if not count:
+        return 0.0
+    rank = q * count
+    lower, below = 0.0, 0
+    for bound, cumulative in zip(bounds, buckets):
+        if cumulative >= rank:
+            in_bucket = cumulative - below
+            return lower + (bound - lower) * ((rank - below) / in_bucket if in_bucket else 1.0)
+        lower, below = bound, cumulative
+    return bounds[-1]
+
+
+def stage_latencies(snapshot: Dict) -> Dict[str, Dict]:
+    from tools.metrics import _FAMILIES
+
+    rows = {}
+    for name, labels, value in snapshot["series"]:
+        if name == "stage_duration_seconds":
+            detail = ",".join(f"{k}={v}" for k, v in sorted(labels.items()) if k != "stage")
+            key = f"{labels['stage']}[{detail}]" if detail else labels["stage"]
+        elif name == "llm_request_duration_seconds":
+            key = f"llm[{labels['provider']},{labels['component']}]"
+        else:
+            continue
+        bounds = _FAMILIES[name][2]
+
+        def quantile_ms(q):
+            # The bucket estimate can overshoot the largest observation (or be the only one); clamp to it
+            if value["count"] == 1:
+                return round(value["max"] * 1000, 2)
+            return round(min(histogram_quantile(q, bounds, value["buckets"], value["count"]), value["max"]) * 1000, 2)
+
+        rows[key] = {
+            "calls": value["count"],
+            "p50_ms": quantile_ms(0.5),
+            "p95_ms": quantile_ms(0.95),
+            "max_ms": round(value["max"] * 1000, 2),
+        }
+    return dict(sorted(rows.items()))
+
+
+def bench(mode: str, scale: Optional[int], llm_latency: float, llm_429_rate: float, niche: str = FLOW_NICHE,
+          record: Optional[str] = None, replay: Optional[str] = None, llm_slow_rate: float = 0.0,
+          llm_down: List[str] = ()) -> Dict:
+    """One child run against the fakes (at `scale`), or against a cassette when `replay` is set."""
+    services = None
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    args = ["--child", mode, "--niche", niche]
+    if replay:
+        env.update(CASSETTE_MODE="replay", CASSETTE_PATH=os.path.abspath(replay))
+        args.append("--dry-run")
+    else:
+        services = FakeServices(FakeConfig(items=scale, llm_latency=llm_latency, llm_429_rate=llm_429_rate,
+                                           llm_slow_rate=llm_slow_rate, llm_down=llm_down)).start()
+        env.update(services.env())
+        if record:
+            env.update(CASSETTE_MODE="record", CASSETTE_PATH=os.path.abspath(record))
+    label = "replay" if replay else scale
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="pipeline_bench_") as tmp:
+            out_path = os.path.join(tmp, "result.json")
+            # A fresh owner index per run, so earlier runs' analyses are not reused
+            env["OWNER_INDEX_PATH"] = os.path.join(tmp, "owner_index.sqlite3")
+            env["DB_OUTBOX_PATH"] = os.path.join(tmp, "db_outbox.sqlite3")
+            env["SOURCES_SNAPSHOT_PATH"] = os.path.join(tmp, "sources.json")
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), *args, "--out", out_path],
+                cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+            )
+            if proc.returncode != 0:
+                tail = proc.stderr.strip().splitlines()[-1:] or ["unknown error"]
+                raise RuntimeError(f"{mode} @ {label} failed: {tail[0]}")
+            with open(out_path) as f:
+                child = json.load(f)
+    finally:
+        if services:
+            services.stop()
+
+    return {
+        "mode": mode,
+        "scale": label,
+        "items": child["items"],
+        "wall_s": round(child["wall_s"], 3),
+        "items_per_s": round(child["items"] / child["wall_s"], 1) if child["wall_s"] else 0.0,
+        "peak_rss_mb": round(child["peak_rss_mb"], 1),
+        "requests": dict(services.config.requests) if services else {},
+        "stages": stage_latencies(child["metrics"]),
+    }
+
+
+def compare(results: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """Returns throughput drops and peak-RSS growth above max_regression percent."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        before, after = previous["items_per_s"], current["items_per_s"]
+        if before and (before - after) / before * 100 > max_regression:
+            regressions.append(f"{name} items/s: {before} -> {after}")
+        before, after = previous["peak_rss_mb"], current["peak_rss_mb"]
+        if before and (after - before) / before * 100 > max_regression:
+            regressions.append(f"{name} peak RSS: {before} -> {after} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark")
+    parser.add_argument("--mode", action="append", choices=MODES, help="Run only these pipelines")
+    parser.add_argument("--scale", action="append", type=int, help=f"Items per source (default {DEFAULT_SCALES})")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds added to every fake LLM call")
+    parser.add_argument("--llm-429-rate", type=float, default=0.0, help="Fraction of fake LLM calls answered with 429")
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="Fraction of fake LLM calls taking 10x the latency")
+    parser.add_argument("--llm-down", action="append", choices=["gemini", "openai"], default=[],
+                        help="Fake LLM provider that answers every call with 503")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --json result")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="Allowed slowdown in percent")
+    parser.add_argument("--niche", default=FLOW_NICHE, help="Hashtag for flow-lead-gen (must match a replayed cassette)")
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument("--record", metavar="PATH", help="Record the runs against the fakes into this cassette")
+    cassette_group.add_argument("--replay", metavar="PATH", help="Run against this cassette instead of the fakes")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    parser.add_argument("--dry-run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.out, args.niche, args.dry_run)
+        return
+
+    results = {}
+    for mode in args.mode or MODES:
+        if args.replay:
+            print(f"Benchmarking {mode} replayed from {args.replay}...")
+            results[f"{mode}@replay"] = bench(mode, None, 0.0, 0.0, args.niche, replay=args.replay)
+            continue
+        for scale in args.scale or DEFAULT_SCALES:
+            print(f"Benchmarking {mode} @ {scale} items...")
+            results[f"{mode}@{scale}"] = bench(mode, scale, args.llm_latency, args.llm_429_rate, args.niche,
+                                               record=args.record, llm_slow_rate=args.llm_slow_rate,
+                                               llm_down=args.llm_down)
+
+    print(f"\n{'run':<24}{'items':>8}{'wall s':>10}{'items/s':>10}{'peak MB':>10}")
+    for name, r in results.items():
+        print(f"{name:<24}{r['items']:>8}{r['wall_s']:>10}{r['items_per_s']:>10}{r['peak_rss_mb']:>10}")
+        for stage, s in r["stages"].items():
+            print(f"    {stage:<52}{s['calls']:>7} calls  p50 {s['p50_ms']:>9} ms  p95 {s['p95_ms']:>9} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print("\nPipeline regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo pipeline regressions.")
+
+
+if __name__ == "__main__":
+    main()
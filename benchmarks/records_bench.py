@@ -0,0 +1,215 @@
+"""
+Memory and copy-cost benchmark: slotted pipeline records vs the plain dicts they replaced.
+
+  lead: a FlowAssist lead after all four layers. The old flat dict (collector fields,
+        analysis merged in, enrichment merged in, flow_score, score_val) vs LeadCandidate
+        holding PainAnalysis / Enrichment / LeadScore.
+  news: a summarized news item. The old dict vs NewsItem.
+
+Scraper payloads (Apify items, LLM answers, strings) are created before measuring and
+shared by both variants, so only the per-record structure is counted. Reported per record:
+  - bytes retained (tracemalloc)
+  - build time, shallow copy time, and time to convert to a DB row
+
+copy.copy() of a slotted record goes through __reduce_ex__ and is several times slower
+than dict.copy(); the pipeline attaches results to a lead instead of copying it.
+
+Usage:
+  python benchmarks/records_bench.py
+  python benchmarks/records_bench.py --count 100000 --json records.json
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from tools.flow_records import Enrichment, LeadCandidate, LeadScore, PainAnalysis, comment_texts  # noqa: E402
+from tools.news_item import NewsItem  # noqa: E402
+
+_COMMENTS = ["Jaka cena za hybrydę?", "Czy macie wolny termin na piątek?", "Super!", "Gdzie to jest?"]
+
+
+def _payloads(count: int) -> List[Dict]:
+    """Inputs as the scrapers and the LLM deliver them."""
+    payloads = []
+    for i in range(count):
+        payloads.append({
+            "item": {
+                "id": f"ig{i}", "url": f"https://www.instagram.com/p/{i}/", "caption": f"Nowe stylizacje {i}",
+                "ownerUsername": f"salon_{i}", "likesCount": i, "commentsCount": len(_COMMENTS),
+                "timestamp": "2026-01-01T00:00:00Z", "latestComments": [{"text": c} for c in _COMMENTS],
+            },
+            "analysis": {"pain_score": 7, "signals": [{"category": "Booking", "text": _COMMENTS[1],
+                                                       "confidence": "high"}],
+                         "summary": "Clients ask about booking"},
+            "gap_details": ["No bio link found"],
+            "news": {
+                "id": f"00000000-0000-0000-0000-{i:012d}", "title": f"Post {i}",
+                "url": f"https://www.reddit.com/r/bench/comments/{i}/", "published_at": "2026-01-01T00:00:00Z",
+                "author": f"/u/user{i}", "text": f"Benchmark post body {i}. It has two sentences.",
+                "points": [f"Punkt {i}.1", f"Punkt {i}.2", f"Punkt {i}.3"], "hash": f"{i:032x}",
+            },
+        })
+    return payloads
+
+
+# -- the old dict shapes --
+
+def lead_dict(p: Dict) -> Dict:
+    item = p["item"]
+    lead = {
+        "platform": "instagram",
+        "source_id": item.get("id"),
+        "url": item.get("url"),
+        "caption": item.get("caption"),
+        "owner_username": item.get("ownerUsername"),
+        "likes_count": item.get("likesCount", 0),
+        "comments_count": item.get("commentsCount", 0),
+        "timestamp": item.get("timestamp"),
+        "comments": item["latestComments"],
+        "raw_data": item,
+    }
+    lead.update(p["analysis"])
+    lead.update({"automation_gap_score": 5, "gap_details": p["gap_details"]})
+    lead["flow_score"] = {"score": 48.0, "priority": "LOW", "breakdown": {"pain": 7, "engagement": 0.1, "gap": 5}}
+    lead["score_val"] = 48.0
+    return lead
+
+
+def lead_dict_db_record(lead: Dict) -> Dict:
+    # What _save_leads built per lead before the records
+    record = {
+        "company_name": lead.get("company_name") or lead.get("owner_username", "Unknown"),
+        "status": "detected",
+        "automation_readiness": "not_ready",
+        "score": int(lead.get("score_val", 0)),
+        "industry": "Beauty",
+        "website": lead.get("website_url"),
+        "detected_at": "now()",
+        "last_updated": "now()",
+        "signals": lead.get("signals", []),
+        "contact_info": {"username": lead.get("owner_username"), "url": lead.get("url"),
+                         "phone": lead.get("public_phone_country_code")},
+        "notes": f"Pain Score: {lead.get('pain_score', 0)}, Gap Score: {lead.get('automation_gap_score', 0)}",
+        "tags": [lead.get("platform", "instagram")],
+    }
+    score = record["score"]
+    if score >= 80: record["automation_readiness"] = "hot"
+    elif score >= 50: record["automation_readiness"] = "warm"
+    elif score >= 30: record["automation_readiness"] = "cold"
+    return record
+
+
+def news_dict(p: Dict) -> Dict:
+    n = p["news"]
+    return {
+        "id": n["id"], "source_platform": "reddit", "title": n["title"], "url": n["url"],
+        "published_at": n["published_at"], "summary_points": n["points"], "category": "Modele LLM",
+        "author_or_channel": n["author"], "thumbnail": None, "raw_content": n["text"],
+        "content_hash": n["hash"], "source_tokens": 140,
+    }
+
+
+def news_dict_db_record(item: Dict) -> Dict:
+    return {k: v for k, v in item.items() if k not in ("content_hash", "source_tokens")}
+
+
+# -- the records --
+
+def lead_record(p: Dict) -> LeadCandidate:
+    item = p["item"]
+    return LeadCandidate(
+        platform="instagram",
+        source_id=item.get("id"),
+        url=item.get("url"),
+        caption=item.get("caption"),
+        owner_username=item.get("ownerUsername"),
+        likes_count=item.get("likesCount", 0),
+        comments_count=item.get("commentsCount", 0),
+        timestamp=item.get("timestamp"),
+        comments=comment_texts(item["latestComments"]),
+        raw_data=item,
+        analysis=PainAnalysis(pain_score=7.0, signals=p["analysis"]["signals"], summary=p["analysis"]["summary"]),
+        enrichment=Enrichment(automation_gap_score=5, gap_details=p["gap_details"]),
+        score=LeadScore(score=48.0, priority="LOW", pain=7.0, engagement=0.1, gap=5),
+    )
+
+
+def news_record(p: Dict) -> NewsItem:
+    n = p["news"]
+    return NewsItem(
+        source_platform="reddit", title=n["title"], url=n["url"], published_at=n["published_at"],
+        author_or_channel=n["author"], raw_content=n["text"], category="Modele LLM",
+        summary_points=n["points"], id=n["id"], content_hash=n["hash"], source_tokens=140,
+    )
+
+
+def _per_record_us(fn: Callable, objects: List) -> float:
+    start = time.perf_counter()
+    for obj in objects:
+        fn(obj)
+    return (time.perf_counter() - start) / len(objects) * 1e6
+
+
+def measure(build: Callable, to_db: Callable, payloads: List[Dict]) -> Dict:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = [build(p) for p in payloads]
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del built
+
+    # Timed separately: tracing slows allocation-heavy code down several times
+    gc.collect()
+    start = time.perf_counter()
+    built = [build(p) for p in payloads]
+    build_s = time.perf_counter() - start
+
+    count = len(payloads)
+    return {
+        # The list holding the records is counted too; it is the same size for both variants
+        "bytes_per_record": round(retained / count, 1),
+        "build_us": round(build_s / count * 1e6, 3),
+        "copy_us": round(_per_record_us(copy.copy, built), 3),
+        "to_db_record_us": round(_per_record_us(to_db, built), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slotted records vs dicts: memory and copy cost")
+    parser.add_argument("--count", type=int, default=50000, help="Records per variant")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    payloads = _payloads(args.count)
+    results = {
+        "lead/dict": measure(lead_dict, lead_dict_db_record, payloads),
+        "lead/record": measure(lead_record, LeadCandidate.to_db_record, payloads),
+        "news/dict": measure(news_dict, news_dict_db_record, payloads),
+        "news/record": measure(news_record, NewsItem.to_db_record, payloads),
+    }
+
+    print(f"{'variant':<14}{'bytes/rec':>12}{'build us':>11}{'copy us':>10}{'to_db us':>11}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['bytes_per_record']:>12}{r['build_us']:>11}{r['copy_us']:>10}{r['to_db_record_us']:>11}")
+    for kind in ("lead", "news"):
+        old, new = results[f"{kind}/dict"]["bytes_per_record"], results[f"{kind}/record"]["bytes_per_record"]
+        print(f"{kind}: records use {(1 - new / old) * 100:.0f}% less memory than dicts")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Startup-time benchmark for main_agent and api_server.
+
+Each scenario is run in a fresh interpreter with `python -X importtime`:
+  - cold: bytecode cache redirected to an empty directory (PYTHONPYCACHEPREFIX),
+          so every module (repo + site-packages) is compiled from source
+  - warm: bytecode cache primed by a previous run, median of --repeat runs
+
+Usage:
+  python benchmarks/startup_bench.py
+  python benchmarks/startup_bench.py --json startup.json
+  python benchmarks/startup_bench.py --baseline startup.json --max-regression 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> code executed in the fresh interpreter
+SCENARIOS = {
+    "main_agent": "import main_agent",
+    "main_agent:news": "import main_agent, tools.scraper_rss, tools.scraper_youtube, tools.scraper_github, tools.summarizer, tools.db_client",
+    "main_agent:flow-lead-gen": "import main_agent; main_agent.build_flow_components()",
+    "api_server": "import api_server",
+}
+
+
+def _parse_importtime(stderr: str) -> List[Dict]:
+    """Parses `-X importtime` lines: 'import time: self [us] | cumulative | imported package'."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            _, fields = line.split(":", 1)
+            self_us, cumulative_us, name = fields.split("|", 2)
+            rows.append({
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip())) // 2,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            })
+        except ValueError:
+            continue
+    return rows
+
+
+def run_once(code: str, pycache_prefix: str) -> Dict:
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache_prefix)
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or ["unknown error"]
+        raise RuntimeError(f"'{code}' failed: {tail[0]}")
+
+    rows = _parse_importtime(proc.stderr)
+    top_level = [r for r in rows if r["depth"] == 1]
+    return {
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(sum(r["cumulative_us"] for r in top_level) / 1000, 1),
+        "modules": len(rows),
+        "top": sorted(top_level, key=lambda r: r["cumulative_us"], reverse=True),
+    }
+
+
+def bench_scenario(code: str, repeat: int) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="pycache_") as pycache:
+        cold = run_once(code, pycache)
+        warm_runs = [run_once(code, pycache) for _ in range(repeat)]
+
+    # Module breakdown from the median warm run
+    warm = sorted(warm_runs, key=lambda r: r["wall_ms"])[len(warm_runs) // 2]
+    return {
+        "cold_wall_ms": cold["wall_ms"],
+        "cold_import_ms": cold["import_ms"],
+        "warm_wall_ms": round(statistics.median(r["wall_ms"] for r in warm_runs), 1),
+        "warm_import_ms": round(statistics.median(r["import_ms"] for r in warm_runs), 1),
+        "modules": warm["modules"],
+        "top_imports": [
+            {"module": r["module"], "cumulative_ms": round(r["cumulative_us"] / 1000, 1)}
+            for r in warm["top"][:10]
+        ],
+    }
+
+
+def compare(results: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """Returns a list of regressions above max_regression percent."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ("cold_wall_ms", "warm_wall_ms"):
+            before, after = previous[metric], current[metric]
+            if before and (after - before) / before * 100 > max_regression:
+                regressions.append(f"{name} {metric}: {before} -> {after} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup-time benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Warm runs per scenario")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Run only these scenarios")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --json result")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="Allowed slowdown in percent")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        print(f"Benchmarking {name}...")
+        results[name] = bench_scenario(SCENARIOS[name], args.repeat)
+
+    print(f"\n{'scenario':<26}{'cold ms':>10}{'warm ms':>10}{'imports ms':>12}{'modules':>9}")
+    for name, r in results.items():
+        print(f"{name:<26}{r['cold_wall_ms']:>10}{r['warm_wall_ms']:>10}{r['warm_import_ms']:>12}{r['modules']:>9}")
+        for imp in r["top_imports"][:5]:
+            print(f"    {imp['module']:<40}{imp['cumulative_ms']:>8} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print("\nStartup regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo startup regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,93 +7,158 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-# Import Tools
-try:
-    from tools.scraper_rss import fetch_reddit_rss
-    from tools.scraper_youtube import fetch_youtube_videos
-    from tools.scraper_github import fetch_github_trending
-    from tools.summarizer import summarize_news_item
-    from tools.db_client import save_news_items, get_supabase_client
-    
-    # New FlowAssist Tools
-    from tools.flow_collector import FlowCollector
-    from tools.flow_analyzer import FlowAnalyzer
-    from tools.flow_enricher import FlowEnricher
-    from tools.flow_scorer import FlowScorer
-    
-except ImportError as e:
-    print(f"Error importing tools. {e}")
-    sys.exit(1)
+# Tools are imported on first use: `--mode news` never loads the Flow*/Apify stack
+# and `--mode flow-lead-gen` never loads the news scrapers and summarizer.
 
 def get_news_sources():
-    client = get_supabase_client()
-    # Defaults
+    from tools.source_registry import source_registry
+
+    # Defaults, used when neither the database nor a snapshot of it has sources
     default_subs = ["ArtificialInteligence", "OpenAI", "MachineLearning"]
     default_yt = ["UCbfYPyITQ-7l4upoX8nvctg", "UC5_6mG17t5_tXyE6s_6E7uQ"] # Two Minute Papers, Fireship
     default_gh = [] # GitHub has its own trending fallback
 
-    if not client: 
-        return default_subs, default_yt, default_gh
-        
-    try:
-        response = client.table("sources").select("*").eq("active", True).execute()
-        data = response.data
-        subs = [s['identifier'] for s in data if s['platform'] == 'reddit']
-        yt_channels = [s['identifier'] for s in data if s['platform'] == 'youtube']
-        gh_repos = [s['identifier'] for s in data if s['platform'] == 'github']
-        
-        # Merge or fallback
-        final_subs = subs if subs else default_subs
-        final_yt = yt_channels if yt_channels else default_yt
-        
-        return final_subs, final_yt, gh_repos
-    except Exception as e:
-        print(f"Error fetching sources from DB: {e}. Using defaults.")
+    sources = source_registry.get()
+    if sources is None:
+        print("No sources from the DB or its snapshot. Using defaults.")
         return default_subs, default_yt, default_gh
 
-def run_news_aggregator(dry_run=False):
-    print("--- AI News Agent Started ---")
-    subreddits, youtube_channels, gh_repos = get_news_sources()
-    
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future_reddit = executor.submit(fetch_reddit_rss, subreddits)
-        future_youtube = executor.submit(fetch_youtube_videos, youtube_channels, max_results=10)
-        future_github = executor.submit(fetch_github_trending, gh_repos)
-        
-        items = future_reddit.result() + future_youtube.result() + future_github.result()
-        
-    print(f"Fetched {len(items)} items ({len(future_github.result())} from GitHub).")
-    if not items: return
+    return sources.get("reddit") or default_subs, sources.get("youtube") or default_yt, sources.get("github", [])
+
+def _report(progress, stage, **counts):
+    """Forwards a stage change to the caller's progress callback, if any."""
+    if progress:
+        progress(stage, counts)
+
+def build_flow_components():
+    """Instantiates the FlowAssist layers (and their API clients) once for reuse across runs."""
+    from tools.flow_collector import FlowCollector
+    from tools.flow_analyzer import FlowAnalyzer
+    from tools.flow_enricher import FlowEnricher
+    from tools.flow_scorer import FlowScorer
+
+    return {
+        "collector": FlowCollector(),
+        "analyzer": FlowAnalyzer(),
+        "enricher": FlowEnricher(),
+        "scorer": FlowScorer(),
+    }
+
+def process_news_items(items, dry_run=False, progress=None):
+    """Dedupes, summarizes and saves fetched NewsItems; returns how many were queued for the DB."""
+    from tools.summarizer import summarize_news_item
+    from tools.db_client import save_news_items
+    from tools.near_duplicates import collapse_near_duplicates
+    from tools.news_item import dedupe_news_items
+
+    # The same story can come from several feeds; summarize it once and keep the
+    # other copies as related sources of the one that is summarized
+    unique_items = collapse_near_duplicates(dedupe_news_items(items))
+    if len(unique_items) < len(items):
+        print(f"Collapsed {len(items) - len(unique_items)} duplicate items into {len(unique_items)} stories.")
 
     print("Summarizing...")
+    _report(progress, "summarizing", candidates=len(unique_items))
     processed_items = []
     with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        future_to_item = {executor.submit(summarize_news_item, item): item for item in items}
+        future_to_item = {executor.submit(summarize_news_item, item): item for item in unique_items}
         for future in concurrent.futures.as_completed(future_to_item):
             item = future_to_item[future]
             try:
                 processed_items.append(future.result())
             except Exception as e:
-                print(f"Summarization failed for '{item.get('title', 'Unknown')}': {e}")
+                print(f"Summarization failed for '{item.title}': {e}")
                 processed_items.append(item)
 
+    _report(progress, "saving", processed=len(processed_items))
+    saved = 0
     if dry_run:
-        print(json.dumps(processed_items[:2], indent=2, default=str))
+        print(json.dumps([item.to_dict() for item in processed_items[:2]], indent=2, default=str))
     else:
-        save_news_items(processed_items)
-        print(f"Saved {len(processed_items)} items.")
+        result = save_news_items(processed_items)
+        saved = result.get("queued", 0)
+        print(f"Queued {saved} items for Supabase.")
+    return saved
+
+def run_news_aggregator(dry_run=False, progress=None):
+    from tools.scraper_rss import fetch_reddit_rss
+    from tools.scraper_youtube import fetch_youtube_videos
+    from tools.scraper_github import fetch_github_trending
+
+    print("--- AI News Agent Started ---")
+    _report(progress, "collecting")
+    subreddits, youtube_channels, gh_repos = get_news_sources()
+    
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        future_reddit = executor.submit(fetch_reddit_rss, subreddits)
+        future_youtube = executor.submit(fetch_youtube_videos, youtube_channels, max_results=10)
+        future_github = executor.submit(fetch_github_trending, gh_repos)
+        
+        items = future_reddit.result() + future_youtube.result() + future_github.result()
+        
+    print(f"Fetched {len(items)} items ({len(future_github.result())} from GitHub).")
+    if not items:
+        return {"fetched": 0, "saved": 0}
+
+    saved = process_news_items(items, dry_run, progress)
+    return {"fetched": len(items), "saved": saved}
 
-def run_flow_lead_gen(niche: str, location: str = None, sources: list = ["instagram"], dry_run=False):
+def run_news_daemon(dry_run=False, health_port=None):
+    """
+    Runs news ingestion continuously (see tools/news_daemon.py): each source is fetched on its
+    own interval (NEWS_INTERVAL_REDDIT / _YOUTUBE / _GITHUB) and its new items are processed
+    as soon as they arrive; stories another source brought in recently are skipped. Sources
+    are read from the registry snapshot on every run.
+    """
+    import asyncio
+    from tools.db_client import start_outbox_flusher
+    from tools.scraper_rss import fetch_reddit_rss
+    from tools.scraper_youtube import fetch_youtube_videos
+    from tools.scraper_github import fetch_github_trending
+    from tools.news_daemon import DEFAULT_INTERVALS, HEALTH_PORT, NewsDaemon, SourceSchedule
+
+    fetchers = {
+        "reddit": lambda: fetch_reddit_rss(get_news_sources()[0]),
+        "youtube": lambda: fetch_youtube_videos(get_news_sources()[1], max_results=10),
+        "github": lambda: fetch_github_trending(get_news_sources()[2]),
+    }
+    schedules = [
+        SourceSchedule(name, DEFAULT_INTERVALS[name], fetch)
+        for name, fetch in fetchers.items() if DEFAULT_INTERVALS[name] > 0
+    ]
+    daemon = NewsDaemon(schedules, lambda items: process_news_items(items, dry_run),
+                        health_port=HEALTH_PORT if health_port is None else health_port)
+    print("--- AI News Daemon Started ---")
+    if not dry_run:
+        start_outbox_flusher()
+    asyncio.run(daemon.run())
+
+def run_flow_lead_gen(niche: str, location: str = None, sources: list = ["instagram"], dry_run=False,
+                      components: dict = None, progress=None):
     """
     Executes the 4-layer FlowAssist Lead Generation Pipeline.
+    `components` (see build_flow_components) lets long-lived workers reuse initialized layers;
+    `progress(stage, counts)` is called as the run moves between layers.
     """
+    from tools.cassette import cassette
+    from tools.flow_records import PainAnalysis
+    from tools.owner_index import owner_index
+
+    components = components or build_flow_components()
+    # Recorded runs must make every call, and replays the same calls as the recording
+    use_index = owner_index.enabled and not cassette.active
     print(f"--- FlowAssist Lead Gen Started for niche: {niche} ---")
+    if use_index:
+        purged = owner_index.purge_expired()
+        if purged:
+            print(f"Owner index: dropped {purged} expired entries.")
     if location:
         print(f"Targeting Location: {location}")
     print(f"Sources: {', '.join(sources)}")
     
     # 1. Collector
-    collector = FlowCollector()
+    _report(progress, "collecting")
+    collector = components["collector"]
     all_leads = []
     
     if "instagram" in sources:
@@ -134,65 +199,67 @@ def run_flow_lead_gen(niche: str, location: str = None, sources: list = ["instag
     print(f"Found {len(all_leads)} candidates.")
     
     # 2 & 3 & 4. Analysis Loop
-    analyzer = FlowAnalyzer()
-    enricher = FlowEnricher()
-    scorer = FlowScorer()
+    analyzer = components["analyzer"]
+    enricher = components["enricher"]
+    scorer = components["scorer"]
     
     hot_leads = []
+    reused = 0
     
     print("Layers 2-4: Analyzing, Enriching, Scoring...")
-    for lead in all_leads:
-        # A. Analyzer (Pain Detector)
-        # Construct comments_text starting with caption (business context)
-        comments_text = [lead.get('caption', '')] if lead.get('caption') else []
-        
-        comments = lead.get("comments", [])
-        if comments:
-             # Extract text from comments if they are dicts
-             if isinstance(comments[0], dict):
-                 comments_text.extend([c.get("text", "") for c in comments])
-             else:
-                 comments_text.extend(comments)
-                 
-        if comments_text:
-             analysis = analyzer.analyze_comments(comments_text)
-             lead.update(analysis) # adds pain_score, signals
+    _report(progress, "analyzing", candidates=len(all_leads))
+    for processed, lead in enumerate(all_leads, start=1):
+        # Owners analyzed recently with the same post and comments keep their analysis and enrichment
+        cached = owner_index.lookup(lead) if use_index else None
+        if cached:
+            lead.analysis, lead.enrichment = cached
+            reused += 1
         else:
-             lead["pain_score"] = 0
-             lead["signals"] = []
-             
-        # B. Enricher (Business Check)
-        # Using owner username to construct a profile object for enrichment
-        profile_data = {
-            "username": lead.get("owner_username"),
-            "bio_link": "", 
-        }
-        enrichment = enricher.enrich_profile(profile_data)
-        lead.update(enrichment)
+            # A. Analyzer (Pain Detector)
+            # Caption (business context) followed by the comment texts
+            comments_text = lead.analysis_input()
+            lead.analysis = analyzer.analyze_comments(comments_text) if comments_text else PainAnalysis()
+
+            # B. Enricher (Business Check)
+            # Using owner username to construct a profile object for enrichment
+            profile_data = {
+                "username": lead.owner_username,
+                "bio_link": "", 
+            }
+            lead.enrichment = enricher.enrich_profile(profile_data)
         
-        # C. Scorer
-        score_result = scorer.calculate_lead_score(lead)
-        lead["flow_score"] = score_result
+        # C. Scorer (always: engagement changes between runs)
+        lead.score = scorer.calculate_lead_score(lead)
+        if use_index and not cached:
+            owner_index.record(lead)
         
-        print(f"Lead: {lead.get('owner_username')} | Score: {score_result['score']} ({score_result['priority']})")
+        print(f"Lead: {lead.owner_username} | Score: {lead.score.score} ({lead.score.priority})"
+              + (" [reused analysis]" if cached else ""))
+        _report(progress, "analyzing", processed=processed)
         
-        if score_result['score'] >= 10: # Lowered threshold for demo visibility
-            lead["score_val"] = score_result['score'] # Ensure key matches save_leads expectation
+        if lead.score.score >= 10: # Lowered threshold for demo visibility
             hot_leads.append(lead)
 
     # Output
+    if reused:
+        print(f"Reused earlier analysis for {reused} of {len(all_leads)} candidates (owner index).")
     print(f"\n--- Result: {len(hot_leads)} Hot/Warm Leads ---")
+    _report(progress, "saving", hot_leads=len(hot_leads))
+    saved = 0
     if dry_run:
-        print(json.dumps(hot_leads, indent=2, default=str))
+        print(json.dumps([lead.to_dict() for lead in hot_leads], indent=2, default=str))
     else:
         # Save to DB
         if hot_leads:
             from tools.db_client import save_leads
             result = save_leads(hot_leads)
-            print(f"Leads saved to Supabase. Count: {result.get('count')}")
+            saved = result.get('queued') or 0
+            print(f"Queued {saved} leads for Supabase.")
         else:
             print("No hot/warm leads to save.")
 
+    return {"candidates": len(all_leads), "hot_leads": len(hot_leads), "saved": saved, "reused": reused}
+
 def main():
     parser = argparse.ArgumentParser(description="AssistSpace Agent")
     parser.add_argument("--mode", type=str, default="news", choices=["news", "flow-lead-gen"], help="Operation mode")
@@ -200,15 +267,54 @@ def main():
     parser.add_argument("--location", type=str, help="Target city/location (e.g. 'warszawa')")
     parser.add_argument("--sources", type=str, nargs="+", default=["instagram"], choices=["instagram", "tiktok", "facebook"], help="Data sources")
     parser.add_argument("--dry-run", action="store_true", help="Skip DB save")
+    parser.add_argument("--daemon", action="store_true", help="News mode: keep running, fetching each source on its own schedule")
+    parser.add_argument("--health-port", type=int, help="Daemon health/metrics port (default NEWS_DAEMON_HEALTH_PORT, 0 = any free port, -1 = off)")
+    parser.add_argument("--metrics-json", type=str, help="Write the run's metrics to this file instead of printing a summary")
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument("--record", type=str, metavar="PATH", help="Record every external response into this cassette file")
+    cassette_group.add_argument("--replay", type=str, metavar="PATH", help="Answer external requests from this cassette file (no network; combine with --dry-run)")
     args = parser.parse_args()
 
-    if args.mode == "flow-lead-gen":
-        if not args.niche:
-            print("Error: --niche is required for flow-lead-gen mode")
-            return
-        run_flow_lead_gen(args.niche, args.location, args.sources, args.dry_run)
+    if args.record or args.replay:
+        from tools.cassette import cassette
+        try:
+            cassette.configure("record" if args.record else "replay", args.record or args.replay)
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    try:
+        if args.mode == "flow-lead-gen":
+            if args.daemon:
+                print("Error: --daemon is only available in news mode")
+                return
+            if not args.niche:
+                print("Error: --niche is required for flow-lead-gen mode")
+                return
+            run_flow_lead_gen(args.niche, args.location, args.sources, args.dry_run)
+        elif args.daemon:
+            run_news_daemon(args.dry_run, args.health_port)
+        else:
+            run_news_aggregator(args.dry_run)
+    except ImportError as e:
+        print(f"Error importing tools. {e}")
+        sys.exit(1)
+    finally:
+        # Saves only queue rows in the local outbox; write them before exiting
+        if not args.dry_run and "tools.db_client" in sys.modules:
+            sys.modules["tools.db_client"].flush_outbox()
+        dump_metrics(args.metrics_json)
+
+def dump_metrics(path=None):
+    """Writes the run's metrics (summary + raw series) to `path`, or prints the summary."""
+    from tools.metrics import metrics
+
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(metrics.to_json(), f, indent=2)
     else:
-        run_news_aggregator(args.dry_run)
+        print("\n--- Metrics ---")
+        print(json.dumps(metrics.summary(), indent=2))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,50 @@
+import time
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+
+class EventLog:
+    """
+    Bounded ring buffer of agent events with monotonically increasing sequence numbers.
+    Readers keep the last seq they saw as a cursor and ask for everything after it;
+    waiters are woken as soon as a new event is appended.
+    """
+
+    def __init__(self, capacity: int = 500):
+        self._events = deque(maxlen=capacity)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def cursor(self) -> int:
+        return self._seq
+
+    def append(self, event_type: str, data: Dict) -> Dict:
+        with self._cond:
+            self._seq += 1
+            event = {"seq": self._seq, "type": event_type, "time": time.time(), "data": data}
+            self._events.append(event)
+            self._cond.notify_all()
+        return event
+
+    def since(self, cursor: int = 0) -> Tuple[List[Dict], int, bool]:
+        """
+        Returns (events after cursor, new cursor, truncated).
+        truncated is True when events after the cursor were already dropped from the buffer.
+        """
+        with self._cond:
+            events = [e for e in self._events if e["seq"] > cursor]
+            oldest = self._events[0]["seq"] if self._events else self._seq + 1
+            truncated = cursor + 1 < oldest and cursor < self._seq
+            return events, self._seq, truncated
+
+    def wait(self, cursor: int, timeout: Optional[float] = None) -> bool:
+        """Blocks until there are events after cursor (or timeout). Returns True if there are."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._seq > cursor, timeout=timeout)
+
+    def recent(self, event_type: str, limit: int, after: int = 0) -> List[Dict]:
+        with self._cond:
+            matching = [e for e in self._events if e["type"] == event_type and e["seq"] > after]
+        return matching[-limit:]
@@ -0,0 +1,119 @@
+import re
+import threading
+from typing import Dict, List, Optional
+
+from tools.prompt_prep import estimate_tokens, summarize_text
+
+_WORD_RE = re.compile(r"\w{4,}", re.UNICODE)
+
+
+def _keywords(text: str) -> set:
+    return {w.lower() for w in _WORD_RE.findall(text or "")}
+
+
+class MemoryEntry:
+    __slots__ = ("task_id", "description", "result", "summary", "compacted")
+
+    def __init__(self, task_id, description: str, result: str, summary: str):
+        self.task_id = task_id
+        self.description = description
+        self.result = result
+        self.summary = summary
+        self.compacted = False
+
+    def render(self, full: bool) -> str:
+        body = self.result if full and not self.compacted else self.summary
+        return f"\nFinished Task: {self.description}\nResult: {body}\n"
+
+
+class AgentMemory:
+    """
+    Stores each task result once and builds per-task context under a fixed token budget.
+
+    A task with dependencies gets only its dependencies' results (full text or summary,
+    whichever fits), in plan order, so its prompt does not depend on which parallel tasks
+    finished first. A task without dependencies gets the other results ranked by keyword
+    overlap with it (full text or summary), then a rolling summary of compacted results.
+    Once more than `keep_recent` results are stored in full,
+    the oldest are compacted: their full text is dropped and their summary folds into the
+    rolling summary, so memory and prompt size stay flat as plans grow.
+    """
+
+    def __init__(self, token_budget: int = 1500, keep_recent: int = 4, summary_chars: int = 240,
+                 rolling_summary_chars: int = 1200):
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.summary_chars = summary_chars
+        self.rolling_summary_chars = rolling_summary_chars
+        self._entries: Dict[object, MemoryEntry] = {}
+        self._order: List[object] = []
+        self._rolling_summary = ""
+        self._lock = threading.Lock()
+
+    def add(self, task_id, description: str, result: str):
+        entry = MemoryEntry(task_id, description, result or "", summarize_text(result, self.summary_chars))
+        with self._lock:
+            if task_id not in self._entries:
+                self._order.append(task_id)
+            self._entries[task_id] = entry
+            self._compact()
+
+    def _compact(self):
+        full = [tid for tid in self._order if not self._entries[tid].compacted]
+        for task_id in full[:max(len(full) - self.keep_recent, 0)]:
+            entry = self._entries[task_id]
+            entry.compacted = True
+            entry.result = ""
+            rolling = f"{self._rolling_summary} {entry.description}: {entry.summary}".strip()
+            # Keep the most recent part of the rolling summary
+            self._rolling_summary = rolling[-self.rolling_summary_chars:]
+
+    def build_context(self, task_description: str, depends_on: Optional[List] = None) -> str:
+        depends_on = depends_on or []
+        with self._lock:
+            budget = self.token_budget
+            parts = []
+
+            def take(text: str) -> bool:
+                nonlocal budget
+                cost = estimate_tokens(text)
+                if cost > budget:
+                    return False
+                parts.append(text)
+                budget -= cost
+                return True
+
+            if depends_on:
+                for task_id in depends_on:
+                    entry = self._entries.get(task_id)
+                    if entry and not take(entry.render(full=True)):
+                        take(entry.render(full=False))
+                return "".join(parts)
+
+            wanted = _keywords(task_description)
+            ranked = sorted(
+                (self._entries[tid] for tid in self._order),
+                key=lambda e: len(wanted & _keywords(e.description + " " + e.summary)),
+                reverse=True,
+            )
+            for entry in ranked:
+                if not len(wanted & _keywords(entry.description + " " + entry.summary)):
+                    break
+                if not take(entry.render(full=True)):
+                    take(entry.render(full=False))
+
+            if self._rolling_summary and budget > 16:
+                # Newest part of the rolling summary that still fits
+                rolling = self._rolling_summary[-(budget - 16) * 4:]
+                take(f"\nEarlier Progress (summary): {rolling}\n")
+
+        return "".join(parts)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "full_entries": sum(1 for e in self._entries.values() if not e.compacted),
+                "rolling_summary_tokens": estimate_tokens(self._rolling_summary),
+                "token_budget": self.token_budget,
+            }
@@ -0,0 +1,131 @@
+import os
+import time
+import uuid
+import threading
+import concurrent.futures
+from typing import Dict, List, Optional
+
+from tools.autonomous_agent import AutonomousAgent, MAX_PARALLEL_TASKS
+
+
+class AgentSession:
+    """One goal being worked on by its own AutonomousAgent."""
+
+    def __init__(self, session_id: str, agent: AutonomousAgent):
+        self.id = session_id
+        self.agent = agent
+        self.created_at = time.time()
+        self.last_access = self.created_at
+
+    def touch(self):
+        self.last_access = time.time()
+
+    @property
+    def active(self) -> bool:
+        """Holds its slot: queued, planning or running. Stopped sessions are idle, even while
+        the stopped run is still returning from an LLM call."""
+        return self.agent.is_active
+
+    def summary(self) -> Dict:
+        return {
+            "session_id": self.id,
+            "status": self.agent.status,
+            "goal": self.agent.goal,
+            "created_at": self.created_at,
+            "last_access": self.last_access,
+        }
+
+
+class SessionLimitError(Exception):
+    """Raised when every session slot is held by an active agent."""
+
+
+class AgentSessionManager:
+    """
+    Runs many agent goals side by side.
+    Agent loops share one bounded executor (max_running goals at a time, extra goals queue),
+    plan steps share another. Finished or stopped sessions idle for longer than idle_ttl are
+    evicted, and the least recently used of them makes room when max_sessions is reached.
+    """
+
+    def __init__(self, max_running: int = 4, max_sessions: int = 50, idle_ttl: int = 1800):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._loop_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, max_running), thread_name_prefix="agent-loop"
+        )
+        self._task_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, max_running) * MAX_PARALLEL_TASKS, thread_name_prefix="agent-task"
+        )
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, AgentSession] = {}
+
+    def create(self, goal: str, session_id: Optional[str] = None) -> AgentSession:
+        """
+        Starts a new session. Passing an existing session_id replaces that session
+        (its running agent is stopped first).
+        """
+        with self._lock:
+            self._evict_idle()
+            previous = self._sessions.get(session_id) if session_id else None
+            if not previous and len(self._sessions) >= self.max_sessions:
+                idle = [s for s in self._sessions.values() if not s.active]
+                if not idle:
+                    raise SessionLimitError(f"Session limit reached ({self.max_sessions})")
+                del self._sessions[min(idle, key=lambda s: s.last_access).id]
+
+            session_id = session_id or uuid.uuid4().hex[:12]
+            agent = AutonomousAgent(
+                executor=self._loop_executor,
+                task_executor=self._task_executor,
+                name=f"Agent {session_id}",
+            )
+            session = AgentSession(session_id, agent)
+            self._sessions[session_id] = session
+
+        if previous:
+            previous.agent.stop()
+        agent.start(goal)
+        return session
+
+    def get(self, session_id: str) -> Optional[AgentSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session:
+            session.touch()
+        return session
+
+    def stop(self, session_id: str) -> bool:
+        session = self.get(session_id)
+        if not session:
+            return False
+        session.agent.stop()
+        return True
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if not session:
+            return False
+        session.agent.stop()
+        return True
+
+    def list_sessions(self) -> List[Dict]:
+        with self._lock:
+            self._evict_idle()
+            sessions = list(self._sessions.values())
+        return [s.summary() for s in sorted(sessions, key=lambda s: s.created_at, reverse=True)]
+
+    def _evict_idle(self):
+        now = time.time()
+        for session_id, session in list(self._sessions.items()):
+            if not session.active and now - session.last_access > self.idle_ttl:
+                del self._sessions[session_id]
+
+
+# Global instance
+agent_sessions = AgentSessionManager(
+    max_running=int(os.getenv("AGENT_MAX_RUNNING", "4")),
+    max_sessions=int(os.getenv("AGENT_MAX_SESSIONS", "50")),
+    idle_ttl=int(os.getenv("AGENT_SESSION_IDLE_TTL", "1800")),
+)
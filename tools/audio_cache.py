@@ -0,0 +1,131 @@
+import os
+import re
+import json
+import uuid
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+_VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    """Returns the 11-character YouTube video id for watch/short/embed/youtu.be URLs."""
+    try:
+        parsed = urlparse(url.strip())
+    except Exception:
+        return None
+
+    host = (parsed.hostname or "").lower()
+    path_parts = [p for p in parsed.path.split("/") if p]
+
+    candidate = None
+    if host.endswith("youtu.be"):
+        candidate = path_parts[0] if path_parts else None
+    elif parsed.path == "/watch":
+        candidate = (parse_qs(parsed.query).get("v") or [None])[0]
+    elif len(path_parts) >= 2 and path_parts[0] in {"shorts", "embed", "live", "v"}:
+        candidate = path_parts[1]
+
+    if candidate and _VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+class AudioCache:
+    """
+    Converted audio stored on disk under <video_id>-q<quality>.mp3, with a JSON sidecar
+    holding the display filename. Entries are written atomically (temp file + os.replace)
+    and evicted least-recently-used first once the directory exceeds max_bytes.
+    """
+
+    def __init__(self, root_dir: str, max_bytes: int):
+        self.root = Path(root_dir).resolve()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _paths(self, video_id: str, quality: str):
+        safe_quality = re.sub(r"[^A-Za-z0-9]", "", quality)
+        base = self.root / f"{video_id}-q{safe_quality}"
+        return base.with_suffix(".mp3"), base.with_suffix(".json")
+
+    def get(self, video_id: str, quality: str) -> Optional[Dict]:
+        """Returns {"path", "download_name"} for a cached entry and marks it recently used."""
+        audio_path, meta_path = self._paths(video_id, quality)
+        with self._lock:
+            if not audio_path.exists():
+                self.misses += 1
+                return None
+            self.hits += 1
+            try:
+                os.utime(audio_path)  # mtime is the LRU clock
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                meta = {}
+        return {"path": audio_path, "download_name": meta.get("download_name") or audio_path.name}
+
+    def put(self, video_id: str, quality: str, source: Path, download_name: str) -> Path:
+        """Moves a finished file into the cache atomically and evicts old entries."""
+        audio_path, meta_path = self._paths(video_id, quality)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        tmp_audio = self.root / f".tmp-{uuid.uuid4().hex}.mp3"
+        tmp_meta = self.root / f".tmp-{uuid.uuid4().hex}.json"
+        shutil.move(str(source), tmp_audio)
+        with open(tmp_audio, "rb+") as f:
+            os.fsync(f.fileno())
+        tmp_meta.write_text(json.dumps({"download_name": download_name}, ensure_ascii=False), encoding="utf-8")
+
+        with self._lock:
+            os.replace(tmp_meta, meta_path)
+            os.replace(tmp_audio, audio_path)
+            self._evict(keep=audio_path)
+        return audio_path
+
+    def _evict(self, keep: Optional[Path] = None):
+        entries = []
+        for path in self.root.glob("*.mp3"):
+            if path.name.startswith(".tmp-") or path == keep:
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if keep is not None and keep.exists():
+            total += keep.stat().st_size
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                # Files being streamed stay readable on POSIX after unlink
+                path.unlink()
+                path.with_suffix(".json").unlink(missing_ok=True)
+                total -= size
+                print(f"[audio cache] Evicted {path.name} ({size} bytes)")
+            except OSError as e:
+                print(f"[audio cache] Could not evict {path.name}: {e}")
+
+    def stats(self) -> Dict:
+        entries, total = 0, 0
+        for path in self.root.glob("*.mp3") if self.root.exists() else []:
+            if path.name.startswith(".tmp-"):
+                continue
+            try:
+                total += path.stat().st_size
+                entries += 1
+            except OSError:
+                continue
+        return {
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
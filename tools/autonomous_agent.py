@@ -1,171 +1,315 @@
-import time
 import threading
-import google.generativeai as genai
+import concurrent.futures
 import json
 import os
 from dotenv import load_dotenv
-from duckduckgo_search import DDGS
+
+from tools.agent_memory import AgentMemory
+from tools.prompt_prep import estimate_tokens
+from tools.agent_events import EventLog
+from tools.search_cache import search_cache
+from tools.metrics import metrics
+from tools.llm_gateway import llm_gateway
 
 load_dotenv()
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+# Independent plan steps run concurrently, at most this many at once
+MAX_PARALLEL_TASKS = int(os.getenv("AGENT_MAX_PARALLEL_TASKS", "3"))
+# Token budget for the results of earlier tasks included in each task prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("AGENT_CONTEXT_TOKENS", "1500"))
+# Events (logs, status and task changes) kept per agent for /events and the SSE stream
+EVENT_LOG_SIZE = int(os.getenv("AGENT_EVENT_LOG_SIZE", "500"))
+
+def _normalize_plan(raw_plan):
+    """
+    Converts planner output into [{"id", "task", "depends_on"}].
+    A plain list of strings is treated as a sequential chain. Dependencies on unknown
+    or later steps are dropped, which also rules out cycles.
+    """
+    if isinstance(raw_plan, dict):
+        # JSON mode can only return an object (OpenAI): take the list inside it
+        raw_plan = next((value for value in raw_plan.values() if isinstance(value, list)), [])
+    plan = []
+    for index, step in enumerate(raw_plan or [], start=1):
+        if isinstance(step, str):
+            plan.append({"id": index, "task": step, "depends_on": [index - 1] if index > 1 else []})
+        elif isinstance(step, dict) and step.get("task"):
+            plan.append({"id": step.get("id", index), "task": str(step["task"]),
+                         "depends_on": step.get("depends_on") or []})
+
+    ids = [step["id"] for step in plan]
+    if len(set(ids)) != len(ids):
+        for index, step in enumerate(plan, start=1):
+            step["id"] = index
+
+    position = {step["id"]: i for i, step in enumerate(plan)}
+    for i, step in enumerate(plan):
+        step["depends_on"] = sorted({d for d in step["depends_on"] if d in position and position[d] < i},
+                                    key=lambda d: position[d])
+    return plan
 
 class AutonomousAgent:
-    def __init__(self):
+    def __init__(self, executor=None, task_executor=None, name="Agent"):
+        """
+        `executor` runs the agent loop and `task_executor` runs plan steps; both are
+        shared pools owned by AgentSessionManager. Without them the agent uses its own thread.
+        """
+        self.name = name
+        self.executor = executor
+        self.task_executor = task_executor
+        # One event log for the agent's lifetime, so cursors stay valid across restarts
+        self.events = EventLog(capacity=EVENT_LOG_SIZE)
+        self._run_start_seq = 0
         self.status = "idle"
         self.goal = ""
         self.tasks = []
-        self.logs = []
         self.thread = None
+        self.future = None
         self.stop_event = threading.Event()
-        self.search_tool = DDGS()
+        # Held while the run loop changes status, so it cannot overwrite stop()'s "idle"
+        self._status_lock = threading.Lock()
+        self.memory = AgentMemory(token_budget=CONTEXT_TOKEN_BUDGET)
+        self._search_tool = None
+
+    @property
+    def search_tool(self):
+        # DDGS is created on the first search, not when the server imports this module
+        if self._search_tool is None:
+            from duckduckgo_search import DDGS
+            self._search_tool = DDGS()
+        return self._search_tool
 
     def start(self, goal):
         if self.thread and self.thread.is_alive():
             self.stop()
         
         self.goal = goal
-        self.status = "planning"
         self.tasks = []
-        self.logs = []
-        self.stop_event.clear()
+        self._run_start_seq = self.events.cursor
+        self.events.append("start", {"goal": goal})
+        self.status = "planning"
+        self.memory = AgentMemory(token_budget=CONTEXT_TOKEN_BUDGET)
+        # A new event per run: a stopped run still finishing its LLM call keeps seeing its own
+        self.stop_event = threading.Event()
         
         self.log(f"Received goal: {goal}")
-        self.thread = threading.Thread(target=self._run_loop)
-        self.thread.start()
+        if self.executor:
+            # Waits for a free slot in the shared pool
+            self.status = "queued"
+            self.future = self.executor.submit(self._run_loop, self.stop_event)
+        else:
+            self.thread = threading.Thread(target=self._run_loop, args=(self.stop_event,))
+            self.thread.start()
         return {"status": "started"}
 
     def stop(self):
-        self.stop_event.set()
+        with self._status_lock:
+            self.stop_event.set()
+            self.status = "idle"
+        if self.future:
+            self.future.cancel()
         if self.thread:
             self.thread.join(timeout=2)
-        self.status = "idle"
         self.log("Agent stopped.")
 
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        if value != getattr(self, "_status", None):
+            self._status = value
+            self.events.append("status", {"status": value})
+
+    @property
+    def is_active(self):
+        return self.status in ("queued", "planning", "running")
+
     def get_state(self):
         return {
             "status": self.status,
             "goal": self.goal,
             "tasks": self.tasks,
-            "logs": self.logs[-50:] # Limit logs to last 50
+            "memory": self.memory.stats(),
+            # Logs of the current run, last 50
+            "logs": [e["data"]["message"] for e in self.events.recent("log", 50, after=self._run_start_seq)],
+            "cursor": self.events.cursor,
         }
 
     def log(self, message):
-        print(f"[Agent] {message}")
-        self.logs.append(message)
+        print(f"[{self.name}] {message}")
+        self.events.append("log", {"message": message})
+
+    def _set_task_status(self, task, status):
+        task["status"] = status
+        data = {"id": task["id"], "status": status}
+        if status == "completed":
+            data["result"] = task["result"]
+        self.events.append("task", data)
 
-    def _run_loop(self):
+    def _set_run_status(self, stop_event, status):
+        """Sets the status of the run owning `stop_event`; False (and no change) once it was stopped."""
+        with self._status_lock:
+            if stop_event.is_set():
+                return False
+            self.status = status
+            return True
+
+    def _run_loop(self, stop_event):
+        if not self._set_run_status(stop_event, "planning"):
+            return
         try:
             # 1. Planning phase
             self.log("Analyzing goal and generating tasks...")
             plan = self._generate_plan(self.goal)
             
+            # stop() may have been called during the LLM call
+            if stop_event.is_set():
+                return
             if not plan:
-                self.status = "failed"
-                self.log("Failed to generate plan.")
+                if self._set_run_status(stop_event, "failed"):
+                    self.log("Failed to generate plan.")
                 return
 
-            self.tasks = [{"description": task, "status": "pending", "result": None} for task in plan]
+            self.tasks = [
+                {"id": step["id"], "description": step["task"], "depends_on": step["depends_on"],
+                 "status": "pending", "result": None}
+                for step in plan
+            ]
+            self.events.append("plan", {"tasks": [dict(t) for t in self.tasks]})
             self.log(f"Plan generated: {len(self.tasks)} tasks.")
-            self.status = "running"
+            if not self._set_run_status(stop_event, "running"):
+                return
             
-            # 2. Execution Loop
-            context = ""
-            for i, task in enumerate(self.tasks):
-                if self.stop_event.is_set():
-                    break
-                
-                self.tasks[i]["status"] = "running"
-                self.log(f"Executing task: {task['description']}")
-                
-                # Determine if search is needed
-                is_search_needed, query = self._check_search_need(task['description'])
-                
-                if is_search_needed:
-                    self.log(f"Searching web for: {query}")
-                    search_results = self._perform_search(query)
-                    self.log(f"Found {len(search_results)} results.")
-                    task_context = f"Search Results for '{query}':\n{search_results}"
-                else:
-                    task_context = "Task executed based on internal knowledge."
-
-                # Execute task using LLM with context
-                result = self._execute_task_with_llm(task['description'], context + "\n" + task_context)
-                
-                self.tasks[i]["result"] = result
-                self.tasks[i]["status"] = "completed"
-                self.log(f"Task completed.")
-                
-                # Update context for next tasks
-                context += f"\nFinished Task: {task['description']}\nResult: {result}\n"
-                time.sleep(1)
-
-            self.status = "completed"
-            self.log("All tasks completed successfully.")
+            # 2. Execution: run every task whose dependencies are done, in parallel
+            self._execute_dag(stop_event)
+
+            if any(t["status"] != "completed" for t in self.tasks):
+                if self._set_run_status(stop_event, "failed"):
+                    self.log("Some tasks failed or were skipped.")
+            elif self._set_run_status(stop_event, "completed"):
+                self.log("All tasks completed successfully.")
 
         except Exception as e:
-            self.status = "failed"
-            self.log(f"Error in agent loop: {e}")
+            if self._set_run_status(stop_event, "failed"):
+                self.log(f"Error in agent loop: {e}")
+
+    def _execute_dag(self, stop_event):
+        if self.task_executor:
+            self._schedule_tasks(self.task_executor, stop_event)
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_PARALLEL_TASKS) as executor:
+                self._schedule_tasks(executor, stop_event)
+
+    def _schedule_tasks(self, executor, stop_event):
+        by_id = {t["id"]: t for t in self.tasks}
+        running = {}
+
+        while True:
+            if not stop_event.is_set():
+                for task in self.tasks:
+                    if len(running) >= MAX_PARALLEL_TASKS:
+                        break
+                    if task["status"] != "pending":
+                        continue
+                    dep_states = [by_id[d]["status"] for d in task["depends_on"]]
+                    if any(state in ("failed", "skipped") for state in dep_states):
+                        self._set_task_status(task, "skipped")
+                        self.log(f"Skipping task (dependency failed): {task['description']}")
+                    elif all(state == "completed" for state in dep_states):
+                        self._set_task_status(task, "running")
+                        running[executor.submit(self._run_task, task)] = task
+
+            if not running:
+                break
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                try:
+                    task["result"] = future.result()
+                    self.memory.add(task["id"], task["description"], task["result"])
+                    self._set_task_status(task, "completed")
+                    self.log(f"Task completed: {task['description']}")
+                except Exception as e:
+                    self._set_task_status(task, "failed")
+                    self.log(f"Task failed: {task['description']} ({e})")
+
+    def _run_task(self, task):
+        with metrics.stage("agent_task"):
+            return self._execute_task(task)
+
+    def _execute_task(self, task):
+        self.log(f"Executing task: {task['description']}")
+
+        # Determine if search is needed
+        is_search_needed, query = self._check_search_need(task['description'])
+
+        if is_search_needed:
+            self.log(f"Searching web for: {query}")
+            search_results = self._perform_search(query)
+            self.log(f"Found {len(search_results)} results.")
+            task_context = f"Search Results for '{query}':\n{search_results}"
+        else:
+            task_context = "Task executed based on internal knowledge."
+
+        # Earlier results come from memory: dependencies first, within a fixed token budget
+        memory_context = self.memory.build_context(task['description'], task['depends_on'])
+        self.log(f"Context from earlier tasks: ~{estimate_tokens(memory_context)} tokens.")
+
+        # Execute task using LLM with context
+        return self._execute_task_with_llm(task['description'], memory_context + "\n" + task_context)
 
     def _generate_plan(self, goal):
         try:
-            model = genai.GenerativeModel('gemini-1.5-flash')
             prompt = f"""
             Jesteś autonomicznym agentem AI. Twój cel to: "{goal}".
             Rozbij ten cel na 3-5 konkretnych, logicznych kroków (zadań) niezbędnych do jego realizacji.
             Skup się na działaniu (np. "Wyszukaj...", "Przeanalizuj...", "Napisz...").
+            Dla każdego kroku podaj listę numerów kroków, których wyników potrzebuje ("depends_on").
+            Kroki niezależne od siebie mają pustą listę — zostaną wykonane równolegle.
             
-            Zwróć TYLKO listę kroków w formacie JSON: ["krok 1", "krok 2", ...].
-            Nie dodawaj żadnego formatowania markdown (```json).
+            Zwróć TYLKO JSON w formacie:
+            {{"plan": [{{"id": 1, "task": "krok 1", "depends_on": []}}, {{"id": 2, "task": "krok 2", "depends_on": [1]}}]}}
             """
-            response = model.generate_content(prompt)
-            text = response.text.strip()
-            # Clean up markdown if model adds it anyway
-            if text.startswith("```"):
-                text = text.split("\n", 1)[1]
-                if text.endswith("```"):
-                    text = text[:-3]
-            return json.loads(text)
+            return _normalize_plan(llm_gateway.generate_json(prompt, "agent_plan"))
         except Exception as e:
             self.log(f"Planning fallback due to error: {e}")
-            return ["Zanalizować cel", "Wykonać research", "Podsumować wyniki"]
+            return _normalize_plan(["Zanalizować cel", "Wykonać research", "Podsumować wyniki"])
 
     def _check_search_need(self, task_description):
         """Returns (bool, query_string)"""
         try:
-            model = genai.GenerativeModel('gemini-1.5-flash')
             prompt = f"""
             Task: "{task_description}"
             Does this task require searching the live internet for up-to-date information, news, or specific data not in general knowledge?
             Answer JSON directly: {{"search_needed": true, "query": "search query"}} or {{"search_needed": false}}
-            Ensure valid JSON output. No markdown.
             """
-            response = model.generate_content(prompt)
-            data = json.loads(response.text.strip().replace('```json', '').replace('```', ''))
+            data = llm_gateway.generate_json(prompt, "agent_search_check")
             return data.get('search_needed', False), data.get('query', '')
         except:
             return False, ""
 
     def _perform_search(self, query):
         try:
-            results = list(self.search_tool.text(query, max_results=3))
+            # Equivalent queries from any session within the TTL reuse one DuckDuckGo call
+            results, cached = search_cache.get_or_fetch(query, lambda: self._search(query), variant="3")
+            if cached:
+                self.log(f"Using cached search results for: {query}")
             return json.dumps(results, ensure_ascii=False)
         except Exception as e:
             return f"Search failed: {e}"
 
+    def _search(self, query):
+        with metrics.stage("agent_search") as call:
+            results = list(self.search_tool.text(query, max_results=3))
+            call.items_out = len(results)
+        return results
+
     def _execute_task_with_llm(self, task, context):
         try:
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            
-            # Gather context from previous tasks
-            previous_results = "\n".join([
-                f"- Task: {t['description']}\n  Result: {t['result']}" 
-                for t in self.tasks if t['result']
-            ])
-            
-            full_context = f"Main Goal: {self.goal}\nCurrent Task: {task}\nContext:\n{context}\nPrevious Results:\n{previous_results}"
+            full_context = f"Main Goal: {self.goal}\nCurrent Task: {task}\nContext:\n{context}"
             
             prompt = f"""
             {full_context}
@@ -174,10 +318,7 @@ class AutonomousAgent:
             Korzystaj z dostarczonych wyników wyszukiwania (Search Results) jeśli są dostępne.
             Odpisz w języku polskim. Bądź konkretny i profesjonalny. Max 3 zdania.
             """
-            response = model.generate_content(prompt)
-            return response.text.strip()
+            return llm_gateway.generate(prompt, "agent_task")
         except:
             return "Zadanie wykonane (symulacja/błąd LLM)."
 
-# Global instance
-agent_instance = AutonomousAgent()
@@ -0,0 +1,323 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from dotenv import load_dotenv
+
+from tools.metrics import metrics
+from tools.service_endpoints import canonical_url
+
+load_dotenv()
+
+MODES = ("off", "record", "replay")
+DEFAULT_PATH = os.path.join(".cache", "cassettes", "pipeline.sqlite3")
+
+# Keys that gate the Gemini/OpenAI/YouTube/Apify code paths. A replay never uses them, so
+# missing ones get a placeholder and the pipeline takes the same paths as when recording.
+REPLAY_PLACEHOLDER_KEYS = ("GEMINI_API_KEY", "OPENAI_API_KEY", "YOUTUBE_API_KEY", "APIFY_API_KEY")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    request BLOB NOT NULL,
+    payload BLOB NOT NULL,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (kind, key, seq)
+)
+"""
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recorded response for a request."""
+
+
+class ReplayedError(Exception):
+    """A failure captured while recording, raised again on replay."""
+
+    def __init__(self, error: Dict):
+        super().__init__(f"{error['type']}: {error['message']}")
+        self.error = error
+        self.status = error.get("status")
+
+
+class RecordedResponse:
+    """The parts of a requests.Response the pipeline reads, rebuilt from a cassette."""
+
+    def __init__(self, status_code: int, text: str, headers: Dict):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def _canonical(value) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """HTTP status of a client error (OpenAI, google-api-core, googleapiclient, requests, replayed)."""
+    candidates = (
+        getattr(error, "status_code", None),
+        getattr(error, "status", None),
+        getattr(error, "code", None),
+        getattr(getattr(error, "resp", None), "status", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+    )
+    for status in candidates:
+        if isinstance(status, int):
+            return int(status)
+        if isinstance(status, str) and status.isdigit():
+            return int(status)
+    return None
+
+
+class Cassette:
+    """
+    Record/replay store for the responses the pipeline gets from external services.
+
+    off:    requests go straight to the service.
+    record: responses (and failures) are also written to a SQLite file, zlib-compressed.
+    replay: responses come from the file and nothing touches the network; a request
+            that was never recorded raises CassetteMiss.
+
+    Entries are keyed on (kind, sha256 of the canonical request). Repeats of the same
+    request are numbered in call order, and a replay past the last recorded repeat
+    gets the last one again.
+    """
+
+    def __init__(self, mode: str = "off", path: str = DEFAULT_PATH):
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._seq: Dict[tuple, int] = {}
+        self.mode = "off"
+        self.path = path
+        self.configure(mode, path)
+
+    def configure(self, mode: str, path: Optional[str] = None):
+        """Switches mode and/or file; also used by `main_agent.py --record/--replay`."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}' (expected one of {', '.join(MODES)})")
+        if mode == "replay" and not os.path.exists(path or self.path):
+            raise FileNotFoundError(f"Cassette file not found: {path or self.path}")
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self.mode = mode
+            self.path = path or self.path
+            self._seq = {}
+        if mode == "replay":
+            for name in REPLAY_PLACEHOLDER_KEYS:
+                os.environ.setdefault(name, "cassette-replay")
+
+    @property
+    def active(self) -> bool:
+        return self.mode != "off"
+
+    def _db(self) -> sqlite3.Connection:
+        # Callers hold self._lock
+        if self._conn is None:
+            if self.mode == "record":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            if self.mode == "record":
+                # Flow workers in other processes may record into the same file
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(_SCHEMA)
+                conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def call(self, kind: str, request: Dict, fetch: Callable[[], Any],
+             encode: Optional[Callable[[Any], Any]] = None,
+             decode: Optional[Callable[[Any], Any]] = None,
+             replay_error: Optional[Callable[[Dict], Exception]] = None) -> Any:
+        """
+        Returns fetch() (off/record) or the recorded result for `request` (replay).
+        `request` must hold everything that selects the response, and no secrets.
+        encode/decode convert the fetched object to JSON-able data and back; replayed
+        failures are raised as replay_error(error) if given, else ReplayedError.
+        """
+        if self.mode == "off":
+            return fetch()
+
+        key = hashlib.sha256(f"{kind}|{_canonical(request)}".encode("utf-8")).hexdigest()
+        with self._lock:
+            seq = self._seq.get((kind, key), 0)
+            self._seq[(kind, key)] = seq + 1
+
+        if self.mode == "replay":
+            return self._replay(kind, key, seq, request, decode, replay_error)
+
+        try:
+            result = fetch()
+        except Exception as e:
+            self._store(kind, key, seq, request, {
+                "error": {"type": type(e).__name__, "message": str(e), "status": error_status(e)}
+            })
+            raise
+        self._store(kind, key, seq, request, {"result": encode(result) if encode else result})
+        return result
+
+    def _store(self, kind: str, key: str, seq: int, request: Dict, payload: Dict):
+        row = (
+            kind, key, seq,
+            zlib.compress(_canonical(request).encode("utf-8")),
+            zlib.compress(json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")),
+            time.time(),
+        )
+        with self._lock:
+            db = self._db()
+            if seq == 0:
+                # First time this run: drop repeats left over from an older recording
+                db.execute("DELETE FROM responses WHERE kind = ? AND key = ?", (kind, key))
+            db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)", row)
+            db.commit()
+        metrics.inc("cassette_requests_total", kind=kind, outcome="recorded")
+
+    def _replay(self, kind: str, key: str, seq: int, request: Dict,
+                decode: Optional[Callable], replay_error: Optional[Callable]) -> Any:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT payload FROM responses WHERE kind = ? AND key = ? AND seq <= ? "
+                "ORDER BY seq DESC LIMIT 1",
+                (kind, key, seq),
+            ).fetchone()
+        if row is None:
+            metrics.inc("cassette_requests_total", kind=kind, outcome="miss")
+            raise CassetteMiss(f"No recorded {kind} response for {_canonical(request)[:200]}")
+
+        metrics.inc("cassette_requests_total", kind=kind, outcome="replayed")
+        payload = json.loads(zlib.decompress(row[0]).decode("utf-8"))
+        if "error" in payload:
+            raise (replay_error or ReplayedError)(payload["error"])
+        return decode(payload["result"]) if decode else payload["result"]
+
+    def stats(self) -> Dict[str, Dict]:
+        """Entries and compressed bytes per kind."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT kind, COUNT(*), SUM(LENGTH(request) + LENGTH(payload)) FROM responses GROUP BY kind"
+            ).fetchall()
+        return {kind: {"entries": count, "bytes": size} for kind, count, size in rows}
+
+
+def _cassette_from_env() -> Cassette:
+    mode = (os.getenv("CASSETTE_MODE") or "off").lower()
+    path = os.getenv("CASSETTE_PATH") or DEFAULT_PATH
+    try:
+        return Cassette(mode, path)
+    except ValueError as e:
+        print(f"{e}. Cassette disabled.")
+        return Cassette("off", path)
+
+
+# -- helpers for the external calls the pipeline makes --
+
+def http_get(url: str, **kwargs):
+    """requests.get() through the cassette, keyed on url and params (headers are not part of the key)."""
+    return cassette.call(
+        "http",
+        {"url": canonical_url(url), "params": kwargs.get("params")},
+        lambda: requests.get(url, **kwargs),
+        encode=lambda r: {
+            "status_code": r.status_code,
+            "text": r.text,
+            "headers": {"Content-Type": r.headers.get("Content-Type", "")},
+        },
+        decode=lambda data: RecordedResponse(data["status_code"], data["text"], data["headers"]),
+    )
+
+
+class _ReplayedGeminiResponse:
+    def __init__(self, data: Dict):
+        self._text = data.get("text")
+        self.usage_metadata = SimpleNamespace(**data["usage"]) if data.get("usage") else None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            # Same as a real response without text parts (e.g. blocked by safety filters)
+            raise ValueError("Recorded Gemini response has no text")
+        return self._text
+
+
+def _encode_gemini(response) -> Dict:
+    try:
+        text = response.text
+    except ValueError:
+        text = None
+    usage = getattr(response, "usage_metadata", None)
+    return {
+        "text": text,
+        "usage": {
+            "prompt_token_count": getattr(usage, "prompt_token_count", None),
+            "candidates_token_count": getattr(usage, "candidates_token_count", None),
+        } if usage is not None else None,
+    }
+
+
+def gemini_generate(model, prompt: str, **kwargs):
+    """model.generate_content() through the cassette; a replay has .text and .usage_metadata."""
+    return cassette.call(
+        "gemini",
+        # request_options (timeout/retry) do not change the answer
+        {"model": model.model_name, "prompt": prompt,
+         **{k: v for k, v in kwargs.items() if k != "request_options"}},
+        lambda: model.generate_content(prompt, **kwargs),
+        encode=_encode_gemini,
+        decode=_ReplayedGeminiResponse,
+    )
+
+
+def _encode_openai(response) -> Dict:
+    usage = getattr(response, "usage", None)
+    return {
+        "content": response.choices[0].message.content,
+        "usage": {
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+        } if usage is not None else None,
+    }
+
+
+def _decode_openai(data: Dict):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=data["content"]))],
+        usage=SimpleNamespace(**data["usage"]) if data.get("usage") else None,
+    )
+
+
+def openai_chat(client, **kwargs):
+    """client.chat.completions.create() through the cassette; a replay has .choices and .usage."""
+    return cassette.call(
+        "openai",
+        kwargs,
+        lambda: client.chat.completions.create(**kwargs),
+        encode=_encode_openai,
+        decode=_decode_openai,
+    )
+
+
+# Global instance
+cassette = _cassette_from_env()
+
+
+if __name__ == "__main__":
+    # Summary of a cassette file: python -m tools.cassette [path]
+    store = Cassette("replay", sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH)
+    for kind, info in sorted(store.stats().items()):
+        print(f"{kind:<10}{info['entries']:>8} entries {info['bytes'] / 1024:>10.1f} KiB")
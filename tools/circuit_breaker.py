@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from tools.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Value of the circuit_state gauge
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker for one external dependency.
+
+    closed:    calls go through; the last `window` outcomes are kept and once at least
+               `min_calls` of them are in, a failure rate >= `failure_rate` opens the circuit.
+    open:      calls are rejected at once (CircuitOpenError) for `open_seconds`.
+    half_open: one probe call is let through; success closes the circuit, failure reopens it.
+
+    Transitions are logged and exported as the circuit_state gauge and circuit_transitions_total.
+    """
+
+    def __init__(self, name: str, window: int = 20, min_calls: int = 5, failure_rate: float = 0.5,
+                 open_seconds: float = 30.0):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # True = failure
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        metrics.set("circuit_state", _STATE_VALUES[CLOSED], circuit=name)
+
+    # Callers hold self._lock in the underscored helpers
+
+    def _refresh(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN, f"open for {self.open_seconds:g}s, probing")
+
+    def _transition(self, state: str, reason: str):
+        previous, self._state = self._state, state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state == CLOSED:
+            self._outcomes.clear()
+        log = logger.warning if state == OPEN else logger.info
+        log(f"Circuit {self.name}: {previous} -> {state} ({reason})")
+        metrics.set("circuit_state", _STATE_VALUES[state], circuit=self.name)
+        metrics.inc("circuit_transitions_total", circuit=self.name, to=state)
+
+    def _rate(self) -> float:
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def allows_requests(self) -> bool:
+        """True if acquire() would currently let a call through (without taking the probe slot)."""
+        with self._lock:
+            self._refresh()
+            return self._state == CLOSED or (self._state == HALF_OPEN and not self._probe_in_flight)
+
+    def acquire(self) -> bool:
+        """Asks to make one call. In half-open state only a single probe is let through at a time."""
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+                self._transition(CLOSED, "probe succeeded")
+            else:
+                self._outcomes.append(False)
+
+    def record_failure(self, reason: str = ""):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+                self._transition(OPEN, f"probe failed: {reason}" if reason else "probe failed")
+                return
+            if self._state == OPEN:
+                # A call that was already in flight when the circuit opened
+                return
+            self._outcomes.append(True)
+            if len(self._outcomes) >= self.min_calls and self._rate() >= self.failure_rate:
+                self._transition(OPEN, f"{self._rate():.0%} of the last {len(self._outcomes)} calls failed"
+                                       + (f", last: {reason}" if reason else ""))
+
+    def release(self):
+        """Ends a call that says nothing about the dependency's health (e.g. a rejected request)."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "state": self._state,
+                "failure_rate": round(self._rate(), 3),
+                "calls_in_window": len(self._outcomes),
+                "retry_in_s": round(max(0.0, self._opened_at + self.open_seconds - time.monotonic()), 1)
+                if self._state == OPEN else 0.0,
+            }
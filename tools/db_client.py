@@ -1,12 +1,46 @@
+import json
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from postgrest.exceptions import APIError
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from tools.cassette import error_status
+from tools.db_outbox import outbox
+from tools.flow_records import LeadCandidate
+from tools.metrics import metrics
+from tools.news_item import dedupe_news_items
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
+# Bulk writes: rows and JSON bytes per upsert request, requests in flight, retries of a
+# request that failed transiently (timeouts, 5xx, 429) and the first retry delay (doubled per retry)
+WRITE_CHUNK_ROWS = int(os.getenv("DB_WRITE_CHUNK_ROWS", "200"))
+WRITE_CHUNK_BYTES = int(os.getenv("DB_WRITE_CHUNK_BYTES", str(512 * 1024)))
+WRITE_WORKERS = int(os.getenv("DB_WRITE_WORKERS", "4"))
+WRITE_RETRIES = int(os.getenv("DB_WRITE_RETRIES", "3"))
+WRITE_RETRY_DELAY = float(os.getenv("DB_WRITE_RETRY_DELAY", "0.5"))
+_MAX_RETRY_DELAY = 10.0
+# How long a one-shot run waits at exit for queued rows to be written (see flush_outbox)
+OUTBOX_DRAIN_SECONDS = float(os.getenv("DB_OUTBOX_DRAIN_SECONDS", "60"))
+
+# Postgres error classes that say nothing about the rows: connection exceptions, transaction
+# rollbacks (serialization failures, deadlocks), insufficient resources, operator intervention
+# (statement timeout, admin shutdown); and PostgREST's own connection / pool timeouts
+_TRANSIENT_SQLSTATE_CLASSES = ("08", "40", "53", "57")
+_TRANSIENT_POSTGREST_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+# Failures caused by some of the rows (cardinality, data exceptions, constraint violations) or
+# by the request size; a chunk failing with one of these is split to find the rows at fault
+_ROW_SQLSTATE_CLASSES = ("21", "22", "23")
+
 def get_supabase_client():
     """Returns a Supabase client instance if credentials exist, else None."""
     if not SUPABASE_URL or not SUPABASE_KEY:
@@ -17,107 +51,242 @@ def get_supabase_client():
         print(f"Failed to initialize Supabase client: {e}")
         return None
 
+def _instrumented_save(op, records, save):
+    """Runs a save function under the 'db' stage metric; failed saves count as errors."""
+    with metrics.stage("db", items_in=len(records or []), op=op) as call:
+        result = save(records)
+        if not result.get("success"):
+            call.errors += 1
+        call.items_out = result.get("count", 0)
+    return result
+
+def _http_status(error: Exception) -> Optional[int]:
+    # PostgREST errors carry a SQLSTATE / PGRST code ("23505" is not an HTTP status); only
+    # responses that were not JSON (proxy error pages) get the HTTP status as their code
+    if isinstance(error, APIError):
+        return error.code if isinstance(error.code, int) else None
+    return error_status(error)
+
+
+def is_transient_db_error(error: Exception) -> bool:
+    """True for failures worth retrying unchanged: timeouts, 5xx, 429, lost connections, deadlocks."""
+    if isinstance(error, httpx.TransportError):  # timeouts, refused or dropped connections
+        return True
+    if isinstance(error, APIError):
+        code = str(error.code or "")
+        if code in _TRANSIENT_POSTGREST_CODES or (len(code) == 5 and code[:2] in _TRANSIENT_SQLSTATE_CLASSES):
+            return True
+    status = _http_status(error)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def _error_text(error: Exception) -> str:
+    if isinstance(error, APIError):
+        if isinstance(error.code, int):
+            return f"HTTP {error.code}"
+        return f"{error.code}: {error.message}" + (f" ({error.details})" if error.details else "")
+    return str(error) or type(error).__name__
+
+
+def _is_row_error(error: Exception) -> bool:
+    if isinstance(error, APIError) and str(error.code or "")[:2] in _ROW_SQLSTATE_CLASSES:
+        return True
+    return _http_status(error) == 413
+
+
+def _chunks(records: List[Dict], max_rows: int, max_bytes: int) -> List[List[Dict]]:
+    """Consecutive chunks of at most max_rows records and (roughly) max_bytes of JSON each."""
+    chunks, chunk, size = [], [], 0
+    for record in records:
+        record_size = len(json.dumps(record, ensure_ascii=False, default=str).encode("utf-8")) + 1
+        if chunk and (len(chunk) >= max_rows or size + record_size > max_bytes):
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(record)
+        size += record_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _write_chunk(op: str, index: int, rows: List[Dict], send: Callable[[List[Dict]], int],
+                 key: Callable[[Dict], object]) -> Dict:
+    """
+    Writes one chunk. A transient failure is retried with exponential backoff (and jitter, so
+    parallel writers do not retry in step); a chunk rejected for its data is split in halves
+    until the rejected rows are isolated, so one bad row does not cost the others. Other
+    failures (auth, schema, retries used up) fail the rows that were being written.
+    """
+    report = {"chunk": index, "rows": len(rows), "saved": 0, "requests": 0, "retries": 0,
+              "failed_rows": [], "seconds": 0.0}
+
+    def attempt(part: List[Dict]):
+        for retry in range(WRITE_RETRIES + 1):
+            report["requests"] += 1
+            try:
+                report["saved"] += send(part)
+                return
+            except Exception as e:
+                if is_transient_db_error(e) and retry < WRITE_RETRIES:
+                    report["retries"] += 1
+                    metrics.inc("db_write_retries_total", op=op)
+                    delay = min(WRITE_RETRY_DELAY * 2 ** retry, _MAX_RETRY_DELAY)
+                    time.sleep(delay * random.uniform(0.5, 1.0))
+                    continue
+                if len(part) > 1 and _is_row_error(e):
+                    middle = len(part) // 2
+                    attempt(part[:middle])
+                    attempt(part[middle:])
+                    return
+                rejected = _is_row_error(e)
+                report["failed_rows"].extend({"key": key(row), "error": _error_text(e), "rejected": rejected}
+                                             for row in part)
+                return
+
+    with metrics.stage("db_chunk", items_in=len(rows), op=op) as call:
+        start = time.perf_counter()
+        attempt(rows)
+        report["seconds"] = round(time.perf_counter() - start, 3)
+        call.items_out = report["saved"]
+        call.errors = len(report["failed_rows"])
+    return report
+
+
+def bulk_write(op: str, records: List[Dict], send: Callable[[List[Dict]], int],
+               key: Callable[[Dict], object] = lambda row: None,
+               chunk_rows: Optional[int] = None, workers: Optional[int] = None) -> Dict:
+    """
+    Writes records in chunks (DB_WRITE_CHUNK_ROWS / DB_WRITE_CHUNK_BYTES) on a small pool of
+    parallel writers. `send` writes one chunk and returns the number of rows written; it must
+    be idempotent (an upsert), since a timed-out request may have been applied. `key` names a
+    row in the report of failed rows; "rejected" marks the rows the database refused (retrying
+    them unchanged will not help).
+
+    Returns {"success", "count", "failed_rows", "chunks"}, with one report per chunk: rows,
+    saved, requests, retries, failed_rows and seconds.
+    """
+    chunks = _chunks(records, max(1, chunk_rows or WRITE_CHUNK_ROWS), max(1, WRITE_CHUNK_BYTES))
+    workers = max(1, min(workers or WRITE_WORKERS, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"db-{op}") as pool:
+        reports = list(pool.map(lambda args: _write_chunk(op, *args, send, key), enumerate(chunks, 1)))
+
+    failed = [row for report in reports for row in report["failed_rows"]]
+    for report in reports:
+        status = f"{report['saved']}/{report['rows']} rows in {report['seconds']:.2f}s"
+        if report["retries"]:
+            status += f", {report['retries']} retries"
+        if report["failed_rows"]:
+            status += f", {len(report['failed_rows'])} rejected: {report['failed_rows'][0]['error']}"
+        print(f"  [{op}] chunk {report['chunk']}/{len(reports)}: {status}")
+    return {
+        "success": not failed,
+        "count": sum(report["saved"] for report in reports),
+        "failed_rows": failed,
+        "chunks": reports,
+    }
+
+
+def _lead_key(record: Dict) -> str:
+    # The upsert conflict target of the leads table
+    return json.dumps([record["company_name"], record["tags"]], ensure_ascii=False)
+
 def save_news_items(items):
     """
-    Upserts a list of news items into the 'news_items' table.
-    Filters out items that already exist in the DB based on URL.
+    Queues a list of NewsItems for the 'news_items' table in the local outbox and returns
+    without waiting for Supabase (see tools/db_outbox.py). Repeats within the batch (by URL or
+    content hash) are dropped; items whose URL is already stored are skipped when written.
     """
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        return {"success": False, "error": "Supabase credentials missing or invalid"}
+
+    # Scrapers store canonical URLs, so the URL is the item's idempotency key
+    queued = outbox.enqueue("news_items", ((item.url, item.to_db_record()) for item in dedupe_news_items(items or [])))
+    return {"success": True, "queued": queued}
+
+def _write_news_items(records):
     client = get_supabase_client()
     if not client:
         return {"success": False, "error": "Supabase credentials missing or invalid"}
 
-    if not items:
+    # 1. Fetch existing URLs to avoid duplicates, in chunks (URLs are passed in the 'in' filter)
+    existing_urls = set()
+    for i in range(0, len(records), 100):
+        chunk = [record["url"] for record in records[i:i + 100]]
+        response = client.table("news_items").select("url").in_("url", chunk).execute()
+        if response.data:
+            existing_urls.update(r['url'] for r in response.data)
+
+    # 2. Filter out duplicates
+    new_items = [record for record in records if record["url"] not in existing_urls]
+    if not new_items:
+        print("No new items to save. All items already exist.")
         return {"success": True, "count": 0}
 
-    try:
-        # 1. Fetch existing URLs to avoid duplicates
-        # We fetch all URLs from the last X days or just all if list is small. 
-        # For simplicity, if we have many, we might want to check the specific URLs in the batch.
-        urls_to_check = [item['url'] for item in items]
-        
-        # Split into chunks if there are too many URLs for the 'in' filter
-        existing_urls = []
-        for i in range(0, len(urls_to_check), 100):
-            chunk = urls_to_check[i:i + 100]
-            response = client.table("news_items").select("url").in_("url", chunk).execute()
-            if response.data:
-                existing_urls.extend([r['url'] for r in response.data])
-
-        # 2. Filter out duplicates
-        new_items = [item for item in items if item['url'] not in existing_urls]
-        
-        if not new_items:
-            print("No new items to save. All items already exist.")
-            return {"success": True, "count": 0}
-
-        print(f"Saving {len(new_items)} new items (filtered out {len(items) - len(new_items)} duplicates).")
-        
-        # 3. Perform the save (using insert since we've filtered dupes)
-        # Using upsert on ID just in case, or simple insert.
-        response = client.table("news_items").insert(new_items).execute()
-        
-        return {"success": True, "count": len(response.data) if response.data else 0}
-        
-    except Exception as e:
-        print(f"Supabase Ops Error: {e}")
-        return {"success": False, "error": str(e)}
+    print(f"Saving {len(new_items)} new items (filtered out {len(records) - len(new_items)} duplicates).")
+
+    # 3. Insert, ignoring ids that are already stored, so a write replayed after a timeout is harmless
+    def insert(rows):
+        response = client.table("news_items").upsert(rows, on_conflict="id", ignore_duplicates=True).execute()
+        return len(response.data) if response.data else 0
+
+    return bulk_write("save_news_items", new_items, insert, key=lambda row: row["url"])
 
 def save_leads(leads):
     """
-    Upserts a list of leads into the 'leads' table.
+    Queues a list of leads (LeadCandidate records, or old-style lead dicts) for the 'leads'
+    table in the local outbox and returns without waiting for Supabase (see tools/db_outbox.py).
     """
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        return {"success": False, "error": "Supabase credentials missing"}
+
+    # Map FlowAssist lead records to the DB schema (plain dicts are still accepted). Leads are
+    # keyed on the upsert conflict target (company_name, tags): a repeat replaces the queued
+    # row, which also keeps Postgres from rejecting an upsert that touches one row twice
+    db_records = [
+        (lead if isinstance(lead, LeadCandidate) else LeadCandidate.from_dict(lead)).to_db_record()
+        for lead in leads or []
+    ]
+    queued = outbox.enqueue("leads", ((_lead_key(record), record) for record in db_records))
+    return {"success": True, "queued": queued}
+
+def _write_leads(records):
     client = get_supabase_client()
     if not client:
         return {"success": False, "error": "Supabase credentials missing"}
 
-    if not leads:
-        return {"success": True, "count": 0}
+    def upsert(rows):
+        response = client.table("leads").upsert(rows, on_conflict="company_name,tags").execute()
+        return len(response.data) if response.data else 0
 
-    try:
-        # Prepare data for insertion
-        # Map FlowAssist lead structure to DB schema
-        db_records = []
-        for lead in leads:
-            record = {
-                "company_name": lead.get("company_name") or lead.get("owner_username", "Unknown"),
-                "status": "detected",
-                "automation_readiness": "not_ready", # Default, updated by scorer
-                "score": int(lead.get("score_val", 0)),
-                "industry": "Beauty", # Default/Placeholder, should come from enricher
-                "website": lead.get("website_url"),
-                "detected_at": "now()",
-                "last_updated": "now()",
-                # Store complex objects as JSON
-                "signals": lead.get("signals", []), 
-                "contact_info": {
-                    "username": lead.get("owner_username"),
-                    "url": lead.get("url"),
-                    "phone": lead.get("public_phone_country_code") # if available
-                },
-                "notes": f"Pain Score: {lead.get('pain_score', 0)}, Gap Score: {lead.get('automation_gap_score', 0)}",
-                "tags": [lead.get("platform", "instagram")]
-            }
-            
-            # Refine Readiness based on Score
-            score = record["score"]
-            if score >= 80: record["automation_readiness"] = "hot"
-            elif score >= 50: record["automation_readiness"] = "warm"
-            elif score >= 30: record["automation_readiness"] = "cold"
-            
-            db_records.append(record)
-
-        # 1. Upsert (to avoid duplicates based on company_name and platform tags)
-        print(f"Upserting {len(db_records)} leads to Supabase...")
-        response = client.table("leads").upsert(
-            db_records, 
-            on_conflict="company_name,tags"
-        ).execute()
-        
-        return {"success": True, "count": len(response.data) if response.data else 0}
+    print(f"Upserting {len(records)} leads to Supabase...")
+    result = bulk_write("save_leads", records, upsert, key=_lead_key)
+    if result["failed_rows"]:
+        print(f"Supabase did not take {len(result['failed_rows'])} of {len(records)} leads.")
+    return result
 
-    except Exception as e:
-        print(f"Supabase Ops Error (Leads): {e}")
-        return {"success": False, "error": str(e)}
+def flush_outbox(timeout: Optional[float] = None) -> Dict[str, Dict]:
+    """
+    Writes queued rows before a one-shot run exits, for up to `timeout` seconds
+    (DB_OUTBOX_DRAIN_SECONDS); whatever is still pending is written by a later run.
+    """
+    stats = outbox.drain(OUTBOX_DRAIN_SECONDS if timeout is None else timeout)
+    for op, entry in stats.items():
+        if entry["pending"] or entry["dead"]:
+            print(f"Outbox {op}: {entry['pending']} rows pending (oldest {entry['oldest_age_seconds']:.0f}s), "
+                  f"{entry['dead']} rejected.")
+    return stats
+
+def start_outbox_flusher():
+    """
+    Starts the background outbox flusher in a long-running process (API server, warm
+    workers, news daemon), so rows left pending by a crashed or timed-out run are written
+    once the database is reachable, without waiting for the next enqueue.
+    """
+    if SUPABASE_URL and SUPABASE_KEY:
+        outbox.start()
+
+outbox.register("news_items", lambda records: _instrumented_save("save_news_items", records, _write_news_items))
+outbox.register("leads", lambda records: _instrumented_save("save_leads", records, _write_leads))
 
 if __name__ == "__main__":
     # Test connection
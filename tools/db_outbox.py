@@ -0,0 +1,273 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from tools.metrics import metrics
+
+load_dotenv()
+
+DEFAULT_PATH = os.path.join(".cache", "db_outbox.sqlite3")
+# Seconds between flushes while rows are pending, rows claimed per operation and flush, and
+# how long a claim lasts (a flusher that dies mid-write gives its rows back after this)
+FLUSH_INTERVAL = float(os.getenv("DB_OUTBOX_FLUSH_INTERVAL", "5"))
+FLUSH_BATCH = int(os.getenv("DB_OUTBOX_BATCH", "1000"))
+CLAIM_SECONDS = 120.0
+# Longest pause between flushes while the database keeps failing
+_MAX_BACKOFF = 300.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    dead INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    UNIQUE (op, key)
+)
+"""
+
+# Writes one batch of rows; returns a db_client.bulk_write result ("failed_rows" entries carry
+# the row's key, the error and whether the database rejected the row itself)
+Writer = Callable[[List[Dict]], Dict]
+
+
+class Outbox:
+    """
+    Durable queue of pending Supabase writes, so data the pipeline paid for (Apify runs, LLM
+    calls) survives a database outage.
+
+    save_news_items / save_leads append rows here (one fsync'd SQLite transaction per batch)
+    and return; a background thread drains the queue through the writer registered for each
+    operation. Rows are keyed per operation (idempotency key): re-enqueuing a pending key
+    replaces its payload, and writers must be idempotent (upserts), since a flush that timed
+    out may have been applied. Outcomes per row:
+      written           -> deleted
+      transient failure -> kept and retried, with the flusher backing off
+      rejected          -> kept as dead (not retried), listed in stats()
+
+    Rows are claimed before they are written, so several processes sharing the file (warm
+    workers, one-shot runs) do not write the same rows at the same time.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, flush_interval: float = FLUSH_INTERVAL,
+                 batch_size: int = FLUSH_BATCH):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._writers: Dict[str, Writer] = {}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._backoff = 0.0
+
+    def _db(self) -> sqlite3.Connection:
+        # Callers hold self._lock
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # FULL: every commit is fsync'd, so an acknowledged enqueue survives a crash
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def register(self, op: str, writer: Writer):
+        self._writers[op] = writer
+
+    def enqueue(self, op: str, rows: Iterable[Tuple[str, Dict]]) -> int:
+        """Appends (key, row) pairs durably and wakes the flusher; returns how many were queued."""
+        now = time.time()
+        params = [(op, key, json.dumps(row, ensure_ascii=False, default=str), now) for key, row in rows]
+        if not params:
+            return 0
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany(
+                    "INSERT INTO outbox (op, key, payload, enqueued_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (op, key) DO UPDATE SET payload = excluded.payload, version = version + 1, "
+                    "attempts = 0, claimed_until = 0, dead = 0, last_error = NULL",
+                    params,
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        metrics.inc("db_outbox_rows_total", len(params), op=op, outcome="queued")
+        self.start()
+        self._wake.set()
+        return len(params)
+
+    def _claim(self, op: str) -> List[Tuple[int, int, str, Dict]]:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = db.execute(
+                    "SELECT id, version, key, payload FROM outbox WHERE op = ? AND dead = 0 AND claimed_until < ? "
+                    "ORDER BY id LIMIT ?",
+                    (op, now, self.batch_size),
+                ).fetchall()
+                db.executemany("UPDATE outbox SET claimed_until = ? WHERE id = ?",
+                               [(now + CLAIM_SECONDS, row[0]) for row in rows])
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return [(row_id, version, key, json.loads(payload)) for row_id, version, key, payload in rows]
+
+    def _settle(self, op: str, claimed: List[Tuple[int, int, str, Dict]], result: Dict) -> Dict[str, int]:
+        failures = {row.get("key"): row for row in result.get("failed_rows") or []}
+        error = result.get("error")
+        done, retry, dead = [], [], []
+        for row_id, version, key, _ in claimed:
+            failure = failures.get(key)
+            if error:
+                retry.append((error, row_id, version))
+            elif failure is None:
+                done.append((row_id, version))
+            elif failure.get("rejected"):
+                dead.append((failure.get("error"), row_id, version))
+            else:
+                retry.append((failure.get("error"), row_id, version))
+
+        # A row re-enqueued while it was being written has a new version and stays queued
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany("DELETE FROM outbox WHERE id = ? AND version = ?", done)
+                db.executemany("UPDATE outbox SET attempts = attempts + 1, claimed_until = 0, last_error = ? "
+                               "WHERE id = ? AND version = ?", retry)
+                db.executemany("UPDATE outbox SET attempts = attempts + 1, dead = 1, last_error = ? "
+                               "WHERE id = ? AND version = ?", dead)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+        counts = {"written": len(done), "retried": len(retry), "dead": len(dead)}
+        for outcome, count in counts.items():
+            if count:
+                metrics.inc("db_outbox_rows_total", count, op=op, outcome=outcome)
+        return counts
+
+    def flush(self) -> Dict[str, Dict[str, int]]:
+        """Writes one claimed batch per registered operation; returns row outcomes per operation."""
+        outcomes = {}
+        for op, writer in list(self._writers.items()):
+            claimed = self._claim(op)
+            if not claimed:
+                continue
+            try:
+                result = writer([payload for _, _, _, payload in claimed])
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            outcomes[op] = self._settle(op, claimed, result)
+            if outcomes[op]["written"]:
+                print(f"Outbox: wrote {outcomes[op]['written']} {op} rows.")
+            if outcomes[op]["dead"]:
+                print(f"Outbox: the database rejected {outcomes[op]['dead']} {op} rows; kept as dead rows.")
+        self.stats()
+        return outcomes
+
+    def _flush_round(self) -> Dict[str, Dict[str, int]]:
+        """flush(), backing off while the database fails every row it is given."""
+        outcomes = self.flush()
+        retried = sum(o["retried"] for o in outcomes.values())
+        progressed = any(o["written"] or o["dead"] for o in outcomes.values())
+        if retried and not progressed:
+            self._backoff = min(max(self._backoff * 2, self.flush_interval), _MAX_BACKOFF)
+            print(f"Outbox: database unavailable, {retried} rows kept; next attempt in {self._backoff:.1f}s.")
+        else:
+            self._backoff = 0.0
+        return outcomes
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._flush_round()
+            except Exception as e:
+                print(f"Outbox flush failed: {e}")
+                self._backoff = min(max(self._backoff * 2, self.flush_interval), _MAX_BACKOFF)
+            self._wake.wait(self._backoff or self.flush_interval)
+            self._wake.clear()
+
+    def start(self):
+        """Starts the background flusher (once per process)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="db-outbox", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+
+    def drain(self, timeout: float) -> Dict[str, Dict]:
+        """
+        Flushes until nothing is pending, the database keeps failing, or `timeout` seconds
+        pass (one-shot runs call this before exiting); rows still pending stay in the outbox.
+        """
+        deadline = time.monotonic() + timeout
+        while self._writers and self.pending() and time.monotonic() < deadline:
+            if not self._flush_round():
+                time.sleep(0.2)  # the pending rows are claimed by another flusher
+            elif self._backoff:
+                if time.monotonic() + self._backoff > deadline:
+                    break
+                time.sleep(self._backoff)
+        return self.stats()
+
+    def pending(self) -> int:
+        """Rows waiting to be written (claimed by a flusher or not); dead rows are not counted."""
+        ops = list(self._writers)
+        if not ops:
+            return 0
+        with self._lock:
+            return self._db().execute(
+                f"SELECT COUNT(*) FROM outbox WHERE dead = 0 AND op IN ({','.join('?' * len(ops))})", ops
+            ).fetchone()[0]
+
+    def stats(self) -> Dict[str, Dict]:
+        """Queue depth, dead rows and age of the oldest pending row per operation (also set as gauges)."""
+        now = time.time()
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT op, SUM(dead = 0), SUM(dead = 1), MIN(CASE WHEN dead = 0 THEN enqueued_at END) "
+                "FROM outbox GROUP BY op"
+            ).fetchall()
+        stats = {op: {"pending": 0, "dead": 0, "oldest_age_seconds": 0.0} for op in self._writers}
+        for op, pending, dead, oldest in rows:
+            stats[op] = {
+                "pending": pending or 0,
+                "dead": dead or 0,
+                "oldest_age_seconds": round(now - oldest, 1) if oldest else 0.0,
+            }
+        for op, entry in stats.items():
+            metrics.set("db_outbox_pending", entry["pending"], op=op)
+            metrics.set("db_outbox_dead", entry["dead"], op=op)
+            metrics.set("db_outbox_oldest_seconds", entry["oldest_age_seconds"], op=op)
+        return stats
+
+
+# Global instance
+outbox = Outbox(os.getenv("DB_OUTBOX_PATH") or DEFAULT_PATH)
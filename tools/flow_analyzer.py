@@ -1,11 +1,9 @@
-import os
 import logging
-import google.generativeai as genai
-from openai import OpenAI
-from typing import List, Dict, Optional
-from dotenv import load_dotenv
+from typing import List
 
-load_dotenv()
+from tools.flow_records import PainAnalysis
+from tools.llm_gateway import llm_gateway
+from tools.metrics import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -18,47 +16,36 @@ class FlowAnalyzer:
     """
     
     def __init__(self):
-        self.gemini_key = os.getenv("GEMINI_API_KEY")
-        self.openai_key = os.getenv("OPENAI_API_KEY")
-        
-        # Initialize Gemini
-        if self.gemini_key:
-            try:
-                genai.configure(api_key=self.gemini_key)
-                self.gemini_model = genai.GenerativeModel('gemini-2.0-flash')
-                logger.info("Gemini AI initialized.")
-            except Exception as e:
-                logger.warning(f"Failed to initialize Gemini: {e}")
-                self.gemini_model = None
-        else:
-            self.gemini_model = None
+        # Clients, provider failover and JSON handling live in the shared LLM gateway
+        try:
+            providers = llm_gateway.providers()
+        except Exception as e:
+            logger.warning(f"Failed to initialize LLM providers: {e}")
+            providers = []
 
-        # Initialize OpenAI
-        if self.openai_key:
-            try:
-                self.openai_client = OpenAI(api_key=self.openai_key)
-                logger.info("OpenAI initialized.")
-            except Exception as e:
-                logger.warning(f"Failed to initialize OpenAI: {e}")
-                self.openai_client = None
+        if providers:
+            logger.info(f"LLM providers: {', '.join(providers)}.")
         else:
-            self.openai_client = None
-
-        if not self.gemini_model and not self.openai_client:
             logger.error("No AI keys found (Gemini or OpenAI). Analysis will be disabled.")
 
-    def analyze_comments(self, comments: List[str]) -> Dict:
+    def analyze_comments(self, comments: List[str]) -> PainAnalysis:
         """
         Analyzes a list of comments to detect business opportunities (leads).
         Returns a score and categorized signals.
         """
+        with metrics.stage("analyzer", items_in=len(comments or [])) as call:
+            result = self._analyze(comments, call)
+            call.items_out = len(result.signals)
+        return result
+
+    def _analyze(self, comments: List[str], call) -> PainAnalysis:
         if not comments:
-            return {"pain_score": 0, "signals": []}
+            return PainAnalysis()
 
         # prompt engineering
         valid_comments = [c for c in comments if len(c) > 5 and len(c) < 500]
         if not valid_comments:
-             return {"pain_score": 0, "signals": []}
+             return PainAnalysis()
 
         comments_text = "\n".join([f"- {c}" for c in valid_comments[:50]]) # Limit to 50 comments
         
@@ -77,30 +64,16 @@ class FlowAnalyzer:
         }}
         """
 
-        import json
-
-        # 1. Try Gemini
-        if self.gemini_model:
-            try:
-                response = self.gemini_model.generate_content(prompt)
-                text = response.text.replace("```json", "").replace("```", "").strip()
-                return json.loads(text)
-            except Exception as e:
-                logger.warning(f"Gemini analysis failed: {e}")
+        try:
+            result = llm_gateway.generate_json(prompt, "analyzer")
+            if isinstance(result, dict):
+                return PainAnalysis.from_llm(result)
+            logger.warning("AI analysis returned JSON that is not an object.")
+        except Exception as e:
+            logger.error(f"AI analysis failed: {e}")
+        call.errors += 1
 
-        # 2. Try OpenAI Fallback
-        if self.openai_client:
-            try:
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{"role": "user", "content": prompt}],
-                    response_format={ "type": "json_object" }
-                )
-                return json.loads(response.choices[0].message.content)
-            except Exception as e:
-                logger.error(f"OpenAI analysis also failed: {e}")
-        
-        return {"pain_score": 0, "signals": [], "error": "AI analysis unavailable"}
+        return PainAnalysis(error="AI analysis unavailable")
 
 if __name__ == "__main__":
     # Test execution
@@ -118,4 +91,5 @@ if __name__ == "__main__":
     print("Testing FlowAnalyzer...")
     result = analyzer.analyze_comments(test_comments)
     import json
-    print(json.dumps(result, indent=2, ensure_ascii=False))
+    from dataclasses import asdict
+    print(json.dumps(asdict(result), indent=2, ensure_ascii=False))
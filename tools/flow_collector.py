@@ -6,6 +6,11 @@ from apify_client import ApifyClient
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 
+from tools.cassette import cassette
+from tools.flow_records import LeadCandidate, comment_texts
+from tools.metrics import metrics
+from tools.service_endpoints import apify_client_kwargs
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -22,9 +27,34 @@ class FlowCollector:
             logger.warning("APIFY_API_KEY not found in environment variables. Apify calls will fail.")
             self.client = None
         else:
-            self.client = ApifyClient(self.api_key)
+            self.client = ApifyClient(self.api_key, **apify_client_kwargs())
+
+    def _run_actor(self, actor_id: str, run_input: Dict) -> Optional[List[Dict]]:
+        """
+        Runs an Apify actor and returns its dataset items, or None if the run did not start.
+        Each run is timed per actor and its dataset size recorded.
+        """
+        with metrics.stage("collector", actor=actor_id) as call:
+            items = cassette.call(
+                "apify", {"actor": actor_id, "input": run_input},
+                lambda: self._fetch_actor_items(actor_id, run_input),
+            )
+            if items is None:
+                call.errors += 1
+                return None
+            call.items_out = len(items)
+        metrics.observe("apify_dataset_items", len(items), actor=actor_id)
+        return items
+
+    def _fetch_actor_items(self, actor_id: str, run_input: Dict) -> Optional[List[Dict]]:
+        run = self.client.actor(actor_id).call(run_input=run_input)
+        if not run:
+            return None
+        # apify-client < 3 returns a dict, 3.x a Run model
+        dataset_id = run["defaultDatasetId"] if isinstance(run, dict) else run.default_dataset_id
+        return self.client.dataset(dataset_id).list_items().items
             
-    def collect_instagram_leads(self, hashtags: List[str], max_posts: int = 20, max_comments: int = 50) -> List[Dict]:
+    def collect_instagram_leads(self, hashtags: List[str], max_posts: int = 20, max_comments: int = 50) -> List[LeadCandidate]:
         """
         Collects Instagram posts and their comments for given hashtags.
         Uses Apify's 'apify/instagram-scraper' or similar.
@@ -50,47 +80,43 @@ class FlowCollector:
             
             try:
                 # 'apify/instagram-hashtag-scraper'
-                run = self.client.actor("apify/instagram-hashtag-scraper").call(run_input=run_input)
+                dataset_items = self._run_actor("apify/instagram-hashtag-scraper", run_input)
                 
-                if not run:
+                if dataset_items is None:
                     logger.error("Apify run failed to start.")
                     continue
 
-                logger.info(f"Apify run finished. Fetching results from dataset {run['defaultDatasetId']}...")
-                
-                # Fetch results
-                dataset_items = self.client.dataset(run["defaultDatasetId"]).list_items().items
+                logger.info(f"Apify run finished with {len(dataset_items)} items.")
                 
                 if not dataset_items:
                     logger.warning(f"No items found for #{hashtag}")
 
                 for item in dataset_items:
                     # Transform to our standard format
-                    lead_candidate = {
-                        "platform": "instagram",
-                        "source_id": item.get("id"),
-                        "url": item.get("url"),
-                        "caption": item.get("caption"),
-                        "owner_username": item.get("ownerUsername"),
-                        "likes_count": item.get("likesCount", 0),
-                        "comments_count": item.get("commentsCount", 0),
-                        "timestamp": item.get("timestamp"),
-                        "comments": [],  # We might need a separate call for comments if not included
-                        "raw_data": item # Keep raw data for debugging/enrichment
-                    }
+                    lead_candidate = LeadCandidate(
+                        platform="instagram",
+                        source_id=item.get("id"),
+                        url=item.get("url"),
+                        caption=item.get("caption"),
+                        owner_username=item.get("ownerUsername"),
+                        likes_count=item.get("likesCount", 0),
+                        comments_count=item.get("commentsCount", 0),
+                        timestamp=item.get("timestamp"),
+                        raw_data=item  # Keep raw data for debugging/enrichment
+                    )
                     
                     # If high engagement, fetch comments (if not present)
                     # Some scrapers include latest comments.
                     if item.get("latestComments"):
-                         lead_candidate["comments"] = item["latestComments"]
-                    elif lead_candidate["comments_count"] > 0 and len(all_leads) < 10: # Increased limit
+                         lead_candidate.comments = comment_texts(item["latestComments"])
+                    elif lead_candidate.comments_count > 0 and len(all_leads) < 10: # Increased limit
                          # Fetch comments for top 10 posts only to save credits
                          # Use scrapesmith/instagram-free-comments-scraper
                          try:
-                             comments = self.get_comments(lead_candidate["url"], max_comments=20)
-                             lead_candidate["comments"] = comments
+                             comments = self.get_comments(lead_candidate.url, max_comments=20)
+                             lead_candidate.comments = comment_texts(comments)
                          except Exception as xc:
-                             logger.warning(f"Failed to fetch comments for {lead_candidate['url']}: {xc}")
+                             logger.warning(f"Failed to fetch comments for {lead_candidate.url}: {xc}")
                          
                     all_leads.append(lead_candidate)
                     
@@ -112,11 +138,10 @@ class FlowCollector:
                  "directUrls": [post_url],
                  "resultsLimit": max_comments,
              }
-             run = self.client.actor("scrapesmith/instagram-free-comments-scraper").call(run_input=run_input)
+             items = self._run_actor("scrapesmith/instagram-free-comments-scraper", run_input)
              
-             if not run: return []
+             if items is None: return []
              
-             items = self.client.dataset(run["defaultDatasetId"]).list_items().items
              comments = []
              for item in items:
                  comments.append({
@@ -130,7 +155,7 @@ class FlowCollector:
             logger.error(f"Error fetching comments for {post_url}: {e}")
             return []
 
-    def collect_facebook_leads(self, keywords: List[str], max_posts: int = 10) -> List[Dict]:
+    def collect_facebook_leads(self, keywords: List[str], max_posts: int = 10) -> List[LeadCandidate]:
         """
         Collects Facebook posts/groups content. 
         Note: Facebook scraping is notoriously difficult. Using 'apify/facebook-search-scraper'
@@ -153,30 +178,29 @@ class FlowCollector:
                 # Using a generic facebook search actor if available, or pages scraper.
                 # For this demo, let's assume 'apify/facebook-posts-scraper' or similar works with search URLs
                 # Ideally, we'd use 'apify/facebook-search-scraper'
-                run = self.client.actor("apify/facebook-posts-scraper").call(run_input=run_input)
+                dataset_items = self._run_actor("apify/facebook-posts-scraper", run_input)
                 
-                if not run: continue
+                if dataset_items is None: continue
                 
-                dataset_items = self.client.dataset(run["defaultDatasetId"]).list_items().items
                 for item in dataset_items:
-                     lead = {
-                        "platform": "facebook",
-                        "source_id": item.get("id"),
-                        "url": item.get("url"),
-                        "caption": item.get("text"),
-                        "owner_username": item.get("user", {}).get("name"),
-                        "likes_count": item.get("likes", 0),
-                        "comments_count": item.get("comments", 0),
-                        "timestamp": item.get("time"),
-                        "raw_data": item
-                     }
+                     lead = LeadCandidate(
+                        platform="facebook",
+                        source_id=item.get("id"),
+                        url=item.get("url"),
+                        caption=item.get("text"),
+                        owner_username=item.get("user", {}).get("name"),
+                        likes_count=item.get("likes", 0),
+                        comments_count=item.get("comments", 0),
+                        timestamp=item.get("time"),
+                        raw_data=item
+                     )
                      all_leads.append(lead)
             except Exception as e:
                 logger.error(f"Error scraping Facebook for {keyword}: {e}")
         
         return all_leads
 
-    def collect_tiktok_leads(self, hashtags: List[str], max_videos: int = 20) -> List[Dict]:
+    def collect_tiktok_leads(self, hashtags: List[str], max_videos: int = 20) -> List[LeadCandidate]:
         """
         Collects TikTok videos and metadata.
         """
@@ -199,26 +223,25 @@ class FlowCollector:
             
             try:
                 # 'apify/tiktok-scraper'
-                run = self.client.actor("clockworks/tiktok-scraper").call(run_input=run_input)
+                dataset_items = self._run_actor("clockworks/tiktok-scraper", run_input)
                  
-                if not run:
+                if dataset_items is None:
                     continue
                     
-                logger.info(f"Apify run finished. Fetching results...")
-                dataset_items = self.client.dataset(run["defaultDatasetId"]).list_items().items
+                logger.info(f"Apify run finished with {len(dataset_items)} items.")
                 
                 for item in dataset_items:
-                    lead_candidate = {
-                        "platform": "tiktok",
-                        "source_id": item.get("id"),
-                        "url": item.get("webVideoUrl"),
-                        "caption": item.get("text"),
-                        "owner_username": item.get("authorMeta", {}).get("name"),
-                        "likes_count": item.get("diggCount", 0),
-                        "comments_count": item.get("commentCount", 0),
-                        "timestamp": item.get("createTime"),
-                         "raw_data": item
-                    }
+                    lead_candidate = LeadCandidate(
+                        platform="tiktok",
+                        source_id=item.get("id"),
+                        url=item.get("webVideoUrl"),
+                        caption=item.get("text"),
+                        owner_username=item.get("authorMeta", {}).get("name"),
+                        likes_count=item.get("diggCount", 0),
+                        comments_count=item.get("commentCount", 0),
+                        timestamp=item.get("createTime"),
+                        raw_data=item
+                    )
                     all_leads.append(lead_candidate)
                     
             except Exception as e:
@@ -226,7 +249,7 @@ class FlowCollector:
                 
         return all_leads
 
-    def collect_instagram_browser(self, hashtags: List[str], max_posts: int = 10) -> List[Dict]:
+    def collect_instagram_browser(self, hashtags: List[str], max_posts: int = 10) -> List[LeadCandidate]:
         """
         Collects Instagram posts using a local browser (Playwright) to bypass API limitations.
         Requires 'playwright' and 'chromium' installed.
@@ -398,17 +421,15 @@ class FlowCollector:
                                 if alt_text:
                                     caption = alt_text
                             
-                            lead = {
-                                "platform": "instagram",
-                                "source_id": url.split("/p/")[1].replace("/", ""),
-                                "url": full_url,
-                                "caption": caption or f"Post from #{hashtag}",
-                                "owner_username": "hidden", 
-                                "likes_count": 0,
-                                "comments_count": 0,
-                                "timestamp": datetime.now().isoformat(),
-                                "raw_data": {"scraped_via": "browser"}
-                            }
+                            lead = LeadCandidate(
+                                platform="instagram",
+                                source_id=url.split("/p/")[1].replace("/", ""),
+                                url=full_url,
+                                caption=caption or f"Post from #{hashtag}",
+                                owner_username="hidden",
+                                timestamp=datetime.now().isoformat(),
+                                raw_data={"scraped_via": "browser"}
+                            )
                             all_leads.append(lead)
                             count += 1
                         except Exception as e:
@@ -435,4 +456,4 @@ if __name__ == "__main__":
     
     print(f"Found {len(results)} posts.")
     for res in results:
-        print(f"- {res['url']}")
+        print(f"- {res.url}")
@@ -1,8 +1,11 @@
 import logging
-import requests
 from bs4 import BeautifulSoup
 from typing import Dict, Optional
 
+from tools.cassette import http_get
+from tools.flow_records import Enrichment
+from tools.metrics import metrics
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -13,11 +16,17 @@ class FlowEnricher:
     Checks for presence of modern tools (website, booking links, etc.).
     """
     
-    def enrich_profile(self, profile_data: Dict) -> Dict:
+    def enrich_profile(self, profile_data: Dict) -> Enrichment:
         """
         Enriches a lead profile with automation gap analysis.
         Returns score (0-10, where 10 = massive gap/opportunity).
         """
+        with metrics.stage("enricher", items_in=1) as call:
+            result = self._enrich(profile_data, call)
+            call.items_out = 1
+        return result
+
+    def _enrich(self, profile_data: Dict, call) -> Enrichment:
         gap_score = 0
         gap_details = []
         
@@ -42,21 +51,20 @@ class FlowEnricher:
                      self._analyze_website(bio_link, gap_details)
                  except Exception as e:
                      logger.warning(f"Could not analyze website {bio_link}: {e}")
+                     call.errors += 1
         
         # 2. Check Contact Options
         # If scraper provides email/phone, good. If missing, might be gap.
         
-        return {
-            "automation_gap_score": min(gap_score, 10),
-            "gap_details": gap_details
-        }
+        return Enrichment(automation_gap_score=min(gap_score, 10), gap_details=gap_details)
 
     def _analyze_website(self, url: str, details: list):
         """
         Simple check of the website for keywords like "Book Now", "Order Online".
         """
         try:
-             response = requests.get(url, timeout=5)
+             with metrics.stage("enricher_website"):
+                 response = http_get(url, timeout=5)
              if response.status_code == 200:
                  soup = BeautifulSoup(response.text, 'html.parser')
                  text = soup.get_text().lower()
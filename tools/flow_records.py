@@ -0,0 +1,168 @@
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Slotted records for the FlowAssist pipeline. A lead used to be one dict that every layer
+# updated in place (raw_data, comments, pain_score, signals, gap_details, flow_score,
+# score_val, ...); each layer now returns its own small record and the candidate holds
+# them. benchmarks/records_bench.py compares memory and copy cost with the dicts.
+
+
+def _number(value: Any) -> float:
+    """LLM scores sometimes come back as strings ("7") or null."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+@dataclass(slots=True)
+class PainAnalysis:
+    """Layer 2 result (FlowAnalyzer)."""
+    pain_score: float = 0.0
+    signals: List[Dict] = field(default_factory=list)
+    summary: str = ""
+    error: Optional[str] = None
+
+    @classmethod
+    def from_llm(cls, result: Dict) -> "PainAnalysis":
+        signals = result.get("signals")
+        return cls(
+            pain_score=_number(result.get("pain_score")),
+            signals=signals if isinstance(signals, list) else [],
+            summary=str(result.get("summary") or ""),
+            error=result.get("error"),
+        )
+
+
+@dataclass(slots=True)
+class Enrichment:
+    """Layer 3 result (FlowEnricher)."""
+    automation_gap_score: int = 0
+    gap_details: List[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class LeadScore:
+    """Layer 4 result (FlowScorer)."""
+    score: float
+    priority: str
+    pain: float = 0.0
+    engagement: float = 0.0
+    gap: float = 0.0
+
+    def to_dict(self) -> Dict:
+        """The flow_score shape: score, priority and a breakdown per component."""
+        return {
+            "score": self.score,
+            "priority": self.priority,
+            "breakdown": {"pain": self.pain, "engagement": self.engagement, "gap": self.gap},
+        }
+
+
+@dataclass(slots=True)
+class LeadCandidate:
+    """A post from Layer 1 (FlowCollector), with the later layers' results attached."""
+    platform: str
+    url: Optional[str]
+    owner_username: Optional[str]
+    source_id: Optional[str] = None
+    caption: Optional[str] = None
+    likes_count: int = 0
+    comments_count: int = 0
+    timestamp: Any = None
+    comments: List[str] = field(default_factory=list)  # comment texts only
+    raw_data: Optional[Dict] = None  # the scraper's item, for debugging
+    company_name: Optional[str] = None
+    website_url: Optional[str] = None
+    phone: Optional[str] = None
+    analysis: Optional[PainAnalysis] = None
+    enrichment: Optional[Enrichment] = None
+    score: Optional[LeadScore] = None
+
+    @classmethod
+    def from_dict(cls, lead: Dict) -> "LeadCandidate":
+        """Builds a candidate from the old flat lead dict (e.g. hand-written leads passed to save_leads)."""
+        candidate = cls(
+            platform=lead.get("platform", "instagram"),
+            url=lead.get("url"),
+            owner_username=lead.get("owner_username"),
+            source_id=lead.get("source_id"),
+            caption=lead.get("caption"),
+            likes_count=lead.get("likes_count", 0),
+            comments_count=lead.get("comments_count", 0),
+            timestamp=lead.get("timestamp"),
+            comments=comment_texts(lead.get("comments") or []),
+            raw_data=lead.get("raw_data"),
+            company_name=lead.get("company_name"),
+            website_url=lead.get("website_url"),
+            phone=lead.get("public_phone_country_code"),
+            analysis=PainAnalysis.from_llm(lead),
+            enrichment=Enrichment(lead.get("automation_gap_score", 0), lead.get("gap_details", [])),
+        )
+        if "score_val" in lead:
+            candidate.score = LeadScore(score=_number(lead["score_val"]), priority="")
+        return candidate
+
+    def analysis_input(self) -> List[str]:
+        """Texts for the analyzer: the caption (business context) first, then the comments."""
+        return ([self.caption] if self.caption else []) + self.comments
+
+    def to_dict(self) -> Dict:
+        """Flat dict in the old lead shape (dry-run output)."""
+        lead = {
+            name: getattr(self, name)
+            for name in ("platform", "source_id", "url", "caption", "owner_username", "likes_count",
+                         "comments_count", "timestamp", "comments", "raw_data")
+        }
+        if self.analysis:
+            lead.update(asdict(self.analysis))
+        if self.enrichment:
+            lead.update(asdict(self.enrichment))
+        if self.score:
+            lead["flow_score"] = self.score.to_dict()
+            lead["score_val"] = self.score.score
+        return lead
+
+    def to_db_record(self) -> Dict:
+        """Row for the 'leads' table."""
+        analysis = self.analysis or PainAnalysis()
+        enrichment = self.enrichment or Enrichment()
+        score = int(self.score.score) if self.score else 0
+
+        readiness = "not_ready"
+        if score >= 80:
+            readiness = "hot"
+        elif score >= 50:
+            readiness = "warm"
+        elif score >= 30:
+            readiness = "cold"
+
+        return {
+            "company_name": self.company_name or self.owner_username or "Unknown",
+            "status": "detected",
+            "automation_readiness": readiness,
+            "score": score,
+            "industry": "Beauty",  # Default/Placeholder, should come from enricher
+            "website": self.website_url,
+            "detected_at": "now()",
+            "last_updated": "now()",
+            # Store complex objects as JSON
+            "signals": analysis.signals,
+            "contact_info": {
+                "username": self.owner_username,
+                "url": self.url,
+                "phone": self.phone,
+            },
+            "notes": f"Pain Score: {analysis.pain_score:g}, Gap Score: {enrichment.automation_gap_score}",
+            "tags": [self.platform or "instagram"],
+        }
+
+
+def comment_texts(comments: List[Any]) -> List[str]:
+    """Texts of scraped comments, which come as dicts with a "text" key or as plain strings."""
+    texts = []
+    for comment in comments:
+        text = comment.get("text") if isinstance(comment, dict) else comment
+        if text:
+            texts.append(str(text))
+    return texts
@@ -1,5 +1,5 @@
 import logging
-from typing import Dict, List
+from tools.flow_records import Enrichment, LeadCandidate, LeadScore, PainAnalysis
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -11,22 +11,22 @@ class FlowScorer:
     Score = (Engagement velocity * 0.3) + (Pain signals frequency * 0.5) + (Automation gap * 0.2)
     """
 
-    def calculate_lead_score(self, lead_data: Dict) -> Dict:
+    def calculate_lead_score(self, lead: LeadCandidate) -> LeadScore:
         """
         Calculates final score (0-100) and priority level.
-        Input `lead_data` contains output from Analyzer and Enricher.
+        `lead` carries the Analyzer and Enricher results.
         """
         
         # 1. Engagement Velocity (Mock based on raw likes/comments)
         # Assuming higher engagement implies higher lead potential (more busy -> more pain)
-        engagement = lead_data.get("likes_count", 0) + lead_data.get("comments_count", 0) * 2
+        engagement = (lead.likes_count or 0) + (lead.comments_count or 0) * 2
         engagement_score = min(engagement / 100, 10) # Cap at 10
         
         # 2. Pain Signals Frequency
-        pain_score = lead_data.get("pain_score", 0) # Already 0-10 from Gemini
+        pain_score = lead.analysis.pain_score if lead.analysis else 0 # Already 0-10 from Gemini
         
         # 3. Automation Gap
-        gap_score = lead_data.get("automation_gap_score", 0) # 0-10 from Enricher
+        gap_score = lead.enrichment.automation_gap_score if lead.enrichment else 0 # 0-10 from Enricher
         
         # Weighted Final Score (0-100 scale)
         # Weights: Pain=50%, Engagement=30%, Gap=20%
@@ -41,25 +41,24 @@ class FlowScorer:
         elif final_score > 50:
             priority = "⚠️ WARM"
             
-        return {
-            "score": round(final_score, 1),
-            "priority": priority,
-            "breakdown": {
-                "pain": pain_score,
-                "engagement": engagement_score,
-                "gap": gap_score
-            }
-        }
+        return LeadScore(
+            score=round(final_score, 1),
+            priority=priority,
+            pain=pain_score,
+            engagement=engagement_score,
+            gap=gap_score,
+        )
 
 if __name__ == "__main__":
     scorer = FlowScorer()
     
-    test_lead = {
-        "likes_count": 500, # High engagement -> +5 pts (max 10)
-        "comments_count": 50,
-        "pain_score": 8,    # Lots of "how to book?" -> +40 pts
-        "automation_gap_score": 5 # No booking link -> +10 pts
-    }
+    test_lead = LeadCandidate(
+        platform="instagram", url=None, owner_username="test",
+        likes_count=500, # High engagement -> +5 pts (max 10)
+        comments_count=50,
+        analysis=PainAnalysis(pain_score=8),    # Lots of "how to book?" -> +40 pts
+        enrichment=Enrichment(automation_gap_score=5) # No booking link -> +10 pts
+    )
     # Expected: (8*5) + (5*3) + (5*2) = 40 + 15 + 10 = 65 (Warm)
     
     print("Testing FlowScorer...")
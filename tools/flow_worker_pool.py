@@ -0,0 +1,273 @@
+import os
+import queue
+import time
+import threading
+import traceback
+import multiprocessing
+from typing import Dict, List, Optional
+
+from tools.job_scheduler import FlowJob, apply_progress
+from tools.metrics import metrics
+
+# Populated once per worker process, on its first FlowSearch job
+_components = None
+
+# Longest a job may run, from when a worker takes it, before run() gives up on it and the
+# worker is terminated (and replaced)
+JOB_TIMEOUT = float(os.getenv("FLOW_JOB_TIMEOUT", "3600"))
+# Longest pause between restarts of workers that keep failing to start
+_MAX_RESTART_DELAY = 60.0
+
+
+def _worker_main(task_queue, event_queue):
+    """
+    Worker process entry point.
+    Imports the pipeline and starts the DB outbox flusher, then serves jobs from task_queue
+    until it receives None.
+    FlowCollector/Analyzer/Enricher/Scorer are built on the first FlowSearch job and
+    reused after that; news jobs never load the Flow/Apify stack.
+    """
+    global _components
+    pid = os.getpid()
+
+    try:
+        import main_agent
+        from tools.db_client import start_outbox_flusher
+        start_outbox_flusher()
+    except Exception as e:
+        event_queue.put(("crashed", None, pid, f"Worker init failed: {e}"))
+        return
+
+    event_queue.put(("ready", None, pid, None))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        job_id, mode, params = task
+        event_queue.put(("started", job_id, pid, None))
+
+        def progress(stage, counts, _job_id=job_id):
+            event_queue.put(("progress", _job_id, pid, (stage, counts)))
+
+        try:
+            if mode == "news":
+                result = main_agent.run_news_aggregator(progress=progress, **params)
+            else:
+                if _components is None:
+                    _components = main_agent.build_flow_components()
+                result = main_agent.run_flow_lead_gen(components=_components, progress=progress, **params)
+            event_queue.put(("metrics", job_id, pid, metrics.snapshot(reset=True)))
+            event_queue.put(("done", job_id, pid, result))
+        except Exception as e:
+            traceback.print_exc()
+            event_queue.put(("metrics", job_id, pid, metrics.snapshot(reset=True)))
+            event_queue.put(("error", job_id, pid, str(e)))
+
+
+class WarmWorkerPool:
+    """
+    Pool of long-lived worker processes that keep the pipeline imported and its
+    API clients initialized, so a FlowSearch job starts without interpreter/import cost.
+    Used as a JobScheduler runner: `scheduler.runner = pool.run`.
+
+    Workers that fail to start are restarted with a growing delay. Once every worker has
+    failed to start, queued jobs fail with the startup error, and new jobs fail at once
+    until a worker starts again. A job that runs longer than FLOW_JOB_TIMEOUT fails, and its
+    worker is terminated so the next job does not queue behind it; time spent queued does
+    not count towards the timeout.
+    """
+
+    def __init__(self, processes: int = 2, start_method: str = "spawn"):
+        self.processes = max(1, processes)
+        self._ctx = multiprocessing.get_context(start_method)
+        self._task_queue = None
+        self._event_queue = None
+        self._workers: List = []
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, FlowJob] = {}
+        self._results: Dict[str, tuple] = {}
+        self._job_started: Dict[str, threading.Event] = {}
+        self._job_worker: Dict[str, int] = {}
+        self._ready_pids = set()
+        self._init_failures = 0  # consecutive workers that failed to start
+        self._init_error: Optional[str] = None
+        self._restart_at = 0.0
+        self._started = False
+        self._stopping = False
+
+    def start(self):
+        """Forks the worker processes ahead of the first job."""
+        with self._lock:
+            if self._started:
+                return
+            self._task_queue = self._ctx.Queue()
+            self._event_queue = self._ctx.Queue()
+            for _ in range(self.processes):
+                self._spawn_worker()
+            threading.Thread(target=self._event_loop, name="flow-pool-events", daemon=True).start()
+            threading.Thread(target=self._monitor_loop, name="flow-pool-monitor", daemon=True).start()
+            self._started = True
+        print(f"Warm worker pool started with {self.processes} processes.")
+
+    def _spawn_worker(self):
+        worker = self._ctx.Process(
+            target=_worker_main,
+            args=(self._task_queue, self._event_queue),
+            name="flow-pool-worker",
+            daemon=True,
+        )
+        worker.start()
+        self._workers.append(worker)
+
+    def shutdown(self):
+        if not self._started:
+            return
+        self._stopping = True
+        for _ in self._workers:
+            self._task_queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+
+    def run(self, job: FlowJob) -> Optional[Dict]:
+        """Executes a job on a warm worker and blocks until it finishes."""
+        self.start()
+
+        if job.mode == "news":
+            params = {}
+        else:
+            params = {"niche": job.niche, "location": job.location, "sources": job.sources}
+
+        done, started = threading.Event(), threading.Event()
+        with self._lock:
+            if self._init_error and not self._ready_pids:
+                raise RuntimeError(f"Warm workers cannot start: {self._init_error}")
+            self._jobs[job.id] = job
+            self._results[job.id] = (done, None, None)
+            self._job_started[job.id] = started
+        self._task_queue.put((job.id, job.mode, params))
+
+        # The timeout runs from when a worker takes the job (or it fails while queued)
+        started.wait()
+        finished = done.wait(JOB_TIMEOUT)
+        with self._lock:
+            _, result, error = self._results.pop(job.id)
+            self._jobs.pop(job.id, None)
+            self._job_started.pop(job.id, None)
+            pid = self._job_worker.pop(job.id, None)
+
+        if not finished:
+            self._terminate_worker(pid)
+            raise RuntimeError(f"Job did not finish within {JOB_TIMEOUT:g}s")
+        if error:
+            raise RuntimeError(error)
+        return result
+
+    def _finish(self, job_id: str, result=None, error=None):
+        with self._lock:
+            entry = self._results.get(job_id)
+            if not entry:
+                return
+            done = entry[0]
+            self._results[job_id] = (done, result, error)
+            started = self._job_started.get(job_id)
+        if started:
+            started.set()
+        done.set()
+
+    def _terminate_worker(self, pid: Optional[int]):
+        """Stops the worker still running a timed-out job; the monitor starts a replacement."""
+        with self._lock:
+            worker = next((w for w in self._workers if w.pid == pid), None)
+            if worker is None:
+                return
+            self._workers.remove(worker)
+            self._ready_pids.discard(pid)
+        print(f"Terminating warm worker {pid} (job timed out).")
+        worker.terminate()
+        worker.join(timeout=5)
+        if worker.is_alive():
+            worker.kill()
+            worker.join(timeout=5)
+
+    def _event_loop(self):
+        while True:
+            try:
+                kind, job_id, pid, payload = self._event_queue.get()
+            except (EOFError, OSError):
+                return
+
+            if kind == "ready":
+                with self._lock:
+                    self._ready_pids.add(pid)
+                    self._init_failures = 0
+                    self._init_error = None
+            elif kind == "started":
+                with self._lock:
+                    self._job_worker[job_id] = pid
+                    job = self._jobs.get(job_id)
+                    started = self._job_started.get(job_id)
+                if started:
+                    started.set()
+                if job:
+                    job.stage = "starting"
+            elif kind == "progress":
+                with self._lock:
+                    job = self._jobs.get(job_id)
+                if job:
+                    stage, counts = payload
+                    apply_progress(job, stage, counts)
+            elif kind == "metrics":
+                metrics.merge(payload)
+            elif kind == "done":
+                self._finish(job_id, result=payload)
+            elif kind == "error":
+                self._finish(job_id, error=payload)
+            elif kind == "crashed":
+                self._worker_failed_to_start(pid, payload)
+
+    def _worker_failed_to_start(self, pid: int, error: str):
+        with self._lock:
+            self._init_failures += 1
+            self._init_error = error
+            delay = min(2.0 ** self._init_failures, _MAX_RESTART_DELAY)
+            self._restart_at = time.monotonic() + delay
+            # Jobs not taken by a worker yet; they would wait for a worker that cannot start
+            stranded = []
+            if not self._ready_pids and self._init_failures >= self.processes:
+                stranded = [job_id for job_id in self._results if job_id not in self._job_worker]
+        print(f"Warm worker {pid}: {error}. Restarting in {delay:g}s.")
+        if stranded:
+            while True:
+                try:
+                    self._task_queue.get_nowait()
+                except queue.Empty:
+                    break
+            for job_id in stranded:
+                self._finish(job_id, error=f"Warm workers cannot start: {error}")
+
+    def _monitor_loop(self):
+        # Replace dead workers (after a delay while they fail to start) and fail the job they were running
+        while True:
+            time.sleep(2)
+            if self._stopping:
+                return
+            with self._lock:
+                dead = [w for w in self._workers if not w.is_alive()]
+                for worker in dead:
+                    self._workers.remove(worker)
+                dead_pids = {w.pid for w in dead}
+                lost = [job_id for job_id, pid in self._job_worker.items() if pid in dead_pids]
+                crashed_while_ready = dead_pids & self._ready_pids
+                self._ready_pids -= dead_pids
+            for worker in dead:
+                if worker.pid in crashed_while_ready:
+                    print(f"Warm worker {worker.pid} exited with code {worker.exitcode}.")
+            for job_id in lost:
+                self._finish(job_id, error="Worker process died while running the job")
+            if time.monotonic() < self._restart_at:
+                continue
+            with self._lock:
+                for _ in range(self.processes - len(self._workers)):
+                    self._spawn_worker()
@@ -0,0 +1,264 @@
+import os
+import sys
+import time
+import uuid
+import queue
+import itertools
+import threading
+import json
+import tempfile
+import subprocess
+from typing import Callable, Dict, List, Optional, Tuple
+
+from tools.metrics import metrics
+
+# Stage markers printed by main_agent.run_flow_lead_gen -> job stage
+_STAGE_MARKERS = [
+    ("Layer 1:", "collecting"),
+    ("Found ", "candidates"),
+    ("Layers 2-4:", "analyzing"),
+    ("Lead:", "analyzing"),
+    ("--- Result:", "saving"),
+]
+
+_FINISHED_STATES = {"completed", "failed"}
+
+
+class FlowJob:
+    """A single FlowSearch run tracked by the scheduler."""
+
+    def __init__(self, niche: Optional[str], location: Optional[str], sources: List[str], priority: int,
+                 mode: str = "flow-lead-gen"):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.niche = niche
+        self.location = location
+        self.sources = list(sources)
+        self.priority = priority
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = {"candidates": 0, "processed": 0, "hot_leads": 0}
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    @property
+    def key(self) -> Tuple[str, str, str, Tuple[str, ...]]:
+        return job_key(self.niche, self.location, self.sources, self.mode)
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "mode": self.mode,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": dict(self.progress),
+            "error": self.error,
+            "result": self.result,
+            "priority": self.priority,
+            "params": {
+                "niche": self.niche,
+                "location": self.location,
+                "sources": self.sources,
+            },
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def job_key(niche: Optional[str], location: Optional[str], sources: List[str],
+            mode: str = "flow-lead-gen") -> Tuple[str, str, str, Tuple[str, ...]]:
+    """Identity of a run: identical (niche, location, sources) requests share one job."""
+    return (
+        mode,
+        (niche or "").strip().lower(),
+        (location or "").strip().lower(),
+        tuple(sorted({s.strip().lower() for s in sources or []})),
+    )
+
+
+def apply_progress(job: FlowJob, stage: str, counts: Dict):
+    """Applies a progress event reported by main_agent (see main_agent._report)."""
+    job.stage = stage
+    for name, value in counts.items():
+        job.progress[name] = value
+
+
+def update_progress_from_line(job: FlowJob, line: str):
+    """Advances job stage/progress based on a line of main_agent output."""
+    for marker, stage in _STAGE_MARKERS:
+        if line.startswith(marker):
+            job.stage = stage
+            break
+
+    if line.startswith("Found ") and "candidates" in line:
+        try:
+            job.progress["candidates"] = int(line.split()[1])
+        except (IndexError, ValueError):
+            pass
+    elif line.startswith("Lead:"):
+        job.progress["processed"] += 1
+    elif line.startswith("--- Result:"):
+        try:
+            job.progress["hot_leads"] = int(line.split()[2])
+        except (IndexError, ValueError):
+            pass
+
+
+def run_flow_subprocess(job: FlowJob):
+    """Cold runner: executes main_agent.py in a fresh interpreter and tracks its output."""
+    cmd = [sys.executable, "main_agent.py", "--mode", job.mode]
+
+    if job.niche:
+        cmd.extend(["--niche", job.niche])
+
+    if job.location:
+        cmd.extend(["--location", job.location])
+
+    if job.sources and job.mode == "flow-lead-gen":
+        cmd.extend(["--sources"] + job.sources)
+
+    # The child writes its metrics here; they are merged into this process's registry
+    metrics_fd, metrics_path = tempfile.mkstemp(prefix="flow_metrics_", suffix=".json")
+    os.close(metrics_fd)
+    cmd.extend(["--metrics-json", metrics_path])
+
+    print(f"[job {job.id}] Starting agent with command: {' '.join(cmd)}")
+
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    proc = subprocess.Popen(
+        cmd,
+        cwd=os.getcwd(),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+    )
+    for raw_line in proc.stdout:
+        line = raw_line.rstrip()
+        print(f"[job {job.id}] {line}")
+        update_progress_from_line(job, line.strip())
+
+    returncode = proc.wait()
+    try:
+        with open(metrics_path, encoding="utf-8") as f:
+            metrics.merge(json.load(f))
+    except (OSError, ValueError):
+        pass
+    finally:
+        os.unlink(metrics_path)
+    if returncode != 0:
+        raise RuntimeError(f"main_agent.py exited with code {returncode}")
+
+
+class JobScheduler:
+    """
+    Bounded FlowSearch scheduler.
+    Jobs wait in a priority queue (lower number = sooner) and are executed by a fixed
+    number of worker threads. Identical in-flight requests are deduplicated.
+    """
+
+    def __init__(self, max_workers: int = 2, max_history: int = 200,
+                 runner: Callable[[FlowJob], Optional[Dict]] = run_flow_subprocess):
+        self.max_workers = max(1, max_workers)
+        self.max_history = max_history
+        self.runner = runner
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, FlowJob] = {}
+        self._inflight: Dict[Tuple, FlowJob] = {}
+        self._workers: List[threading.Thread] = []
+
+    def _ensure_workers(self):
+        if self._workers:
+            return
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"flow-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, niche: Optional[str], location: Optional[str] = None, sources: Optional[List[str]] = None,
+               priority: int = 5, mode: str = "flow-lead-gen") -> Tuple[FlowJob, bool]:
+        """
+        Queues a run. Returns (job, created) where created is False when an identical
+        request was already queued or running and its job is returned instead.
+        """
+        if mode == "flow-lead-gen":
+            sources = sources or ["instagram"]
+        key = job_key(niche, location, sources or [], mode)
+
+        with self._lock:
+            self._ensure_workers()
+            existing = self._inflight.get(key)
+            if existing:
+                return existing, False
+
+            job = FlowJob(niche, location, sources or [], priority, mode=mode)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+            self._prune_history()
+
+        self._queue.put((priority, next(self._seq), job.id))
+        return job, True
+
+    def get(self, job_id: str) -> Optional[FlowJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in sorted(jobs, key=lambda j: j.created_at, reverse=True)]
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based position of a queued job, None if it is not waiting."""
+        with self._queue.mutex:
+            waiting = sorted(self._queue.queue)
+        for position, (_, _, queued_id) in enumerate(waiting, start=1):
+            if queued_id == job_id:
+                return position
+        return None
+
+    def _prune_history(self):
+        # Forget the oldest finished jobs so the registry stays bounded
+        finished = [j for j in self._jobs.values() if j.status in _FINISHED_STATES]
+        overflow = len(self._jobs) - self.max_history
+        for job in sorted(finished, key=lambda j: j.finished_at)[:max(overflow, 0)]:
+            del self._jobs[job.id]
+
+    def _worker_loop(self):
+        while True:
+            _, _, job_id = self._queue.get()
+            job = self.get(job_id)
+            if not job:
+                continue
+
+            job.status = "running"
+            job.stage = "starting"
+            job.started_at = time.time()
+            try:
+                with metrics.stage("flow_job", mode=job.mode):
+                    job.result = self.runner(job)
+                job.status = "completed"
+                job.stage = "completed"
+            except Exception as e:
+                print(f"[job {job.id}] Failed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    if self._inflight.get(job.key) is job:
+                        del self._inflight[job.key]
+                job.done.set()
+                self._queue.task_done()
+
+
+# Global instance
+flow_scheduler = JobScheduler(max_workers=int(os.getenv("FLOW_MAX_WORKERS", "2")))
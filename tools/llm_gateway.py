@@ -0,0 +1,280 @@
+import concurrent.futures
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from tools.cassette import error_status, gemini_generate, openai_chat
+from tools.circuit_breaker import CircuitBreaker, CircuitOpenError
+from tools.metrics import metrics
+from tools.service_endpoints import gemini_configure_kwargs
+
+load_dotenv()
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# Hedging: if the first provider has not answered after its recent p95 latency, the same
+# request also goes to the second one and the first answer wins. Off by default (costs tokens).
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "0").lower() in ("1", "true", "yes")
+# Hedge delay until a provider has HEDGE_MIN_SAMPLES latencies, and the floor after that
+HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "2.0"))
+HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.25"))
+HEDGE_MIN_SAMPLES = 20
+# Per-provider circuit breakers: outcomes kept, minimum calls before judging, failure rate
+# that opens the circuit, and seconds it stays open before a probe call
+BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+
+# Errors caused by the request itself; they say nothing about the provider's health
+_REQUEST_ERROR_STATUSES = {400, 404, 413, 422}
+
+# Per-request timeout, and how long a client may retry a 503 itself before the gateway
+# counts a failure and moves on (the Gemini client alone would retry for up to 10 minutes)
+REQUEST_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+CLIENT_RETRY_SECONDS = float(os.getenv("LLM_CLIENT_RETRY_SECONDS", "2"))
+
+# Preference order when providers are equally healthy and have no latency data yet
+PROVIDERS = ("gemini", "openai")
+
+
+class LLMUnavailable(RuntimeError):
+    """No provider is configured, or every provider failed for a request."""
+
+
+def extract_json(text: str) -> Any:
+    """Parses an LLM answer as JSON, even when wrapped in markdown fences or surrounded by prose."""
+    candidate = (text or "").strip()
+
+    try:
+        return json.loads(candidate)
+    except Exception:
+        pass
+
+    fence_match = re.search(r"```(?:json)?\s*([\[{][\s\S]*?[\]}])\s*```", candidate)
+    if fence_match:
+        return json.loads(fence_match.group(1))
+
+    object_match = re.search(r"([\[{][\s\S]*[\]}])", candidate)
+    if object_match:
+        return json.loads(object_match.group(1))
+
+    raise ValueError("Response does not contain valid JSON")
+
+
+class _ProviderHealth:
+    """Recent latencies of one provider, plus its circuit breaker."""
+
+    def __init__(self, name: str, window: int = 200):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.ewma: Optional[float] = None
+        self.breaker = CircuitBreaker(f"llm:{name}", window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                                      failure_rate=BREAKER_FAILURE_RATE, open_seconds=BREAKER_OPEN_SECONDS)
+
+    def success(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+            self.ewma = latency if self.ewma is None else 0.8 * self.ewma + 0.2 * latency
+        self.breaker.record_success()
+
+    def failure(self, error: Exception):
+        if error_status(error) in _REQUEST_ERROR_STATUSES:
+            self.breaker.release()
+        else:
+            self.breaker.record_failure(f"{type(error).__name__}: {str(error)[:120]}")
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class LLMGateway:
+    """
+    The one place the pipeline and the agent talk to LLMs.
+    Clients are created once and shared. Each request goes to the fastest configured
+    provider whose circuit is not open and fails over to the next one; with LLM_HEDGE=1
+    a slow request is also sent to the second provider. Providers with an open circuit
+    are skipped without waiting for them to fail. Latency, outcome and tokens are recorded per
+    caller through metrics.llm_call().
+    """
+
+    def __init__(self, hedge: bool = HEDGE_ENABLED):
+        self.hedge = hedge
+        self._lock = threading.Lock()
+        self._clients: Optional[Dict[str, Any]] = None
+        self._gemini_request_options: Dict[str, Any] = {}
+        self._health = {name: _ProviderHealth(name) for name in PROVIDERS}
+        self._hedge_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    # -- clients --
+
+    def _get_clients(self) -> Dict[str, Any]:
+        """Configures the providers with an API key on first use (keeps imports off the startup path)."""
+        with self._lock:
+            if self._clients is None:
+                clients = {}
+                gemini_key = os.getenv("GEMINI_API_KEY")
+                if gemini_key:
+                    import google.generativeai as genai
+                    from google.api_core import exceptions, retry
+                    genai.configure(api_key=gemini_key, **gemini_configure_kwargs())
+                    clients["gemini"] = genai.GenerativeModel(GEMINI_MODEL)
+                    self._gemini_request_options = {
+                        "timeout": REQUEST_TIMEOUT,
+                        "retry": retry.Retry(predicate=retry.if_exception_type(exceptions.ServiceUnavailable),
+                                             initial=0.5, maximum=CLIENT_RETRY_SECONDS,
+                                             timeout=CLIENT_RETRY_SECONDS),
+                    }
+                openai_key = os.getenv("OPENAI_API_KEY")
+                if openai_key:
+                    from openai import OpenAI
+                    clients["openai"] = OpenAI(api_key=openai_key, timeout=REQUEST_TIMEOUT,
+                                               max_retries=1 if CLIENT_RETRY_SECONDS > 0 else 0)
+                self._clients = clients
+            return self._clients
+
+    def providers(self) -> List[str]:
+        """Configured providers, in preference order."""
+        clients = self._get_clients()
+        return [name for name in PROVIDERS if name in clients]
+
+    @property
+    def available(self) -> bool:
+        return bool(self._get_clients())
+
+    def _route(self) -> List[str]:
+        """Providers whose circuit lets calls through, by recent latency (unmeasured ones keep preference order)."""
+        usable = [n for n in self.providers() if self._health[n].breaker.allows_requests()]
+        usable.sort(key=lambda n: (self._health[n].ewma is None, self._health[n].ewma or 0.0))
+        return usable
+
+    # -- requests --
+
+    def generate(self, prompt: str, caller: str) -> str:
+        """Returns the model's text answer."""
+        return self._run(prompt, caller, json_mode=False)
+
+    def generate_json(self, prompt: str, caller: str) -> Any:
+        """Returns the answer parsed as JSON; the providers are asked for JSON output."""
+        return self._run(prompt, caller, json_mode=True)
+
+    def _request(self, provider: str, prompt: str, json_mode: bool):
+        client = self._get_clients()[provider]
+        if provider == "gemini":
+            kwargs = {"generation_config": {"response_mime_type": "application/json"}} if json_mode else {}
+            return gemini_generate(client, prompt, request_options=self._gemini_request_options, **kwargs)
+        kwargs = {"response_format": {"type": "json_object"}} if json_mode else {}
+        return openai_chat(client, model=OPENAI_MODEL, messages=[{"role": "user", "content": prompt}], **kwargs)
+
+    def _attempt(self, provider: str, prompt: str, caller: str, json_mode: bool) -> Any:
+        health = self._health[provider]
+        if not health.breaker.acquire():
+            metrics.inc("llm_requests_total", provider=provider, component=caller, outcome="circuit_open")
+            raise CircuitOpenError(f"circuit open for {provider}")
+
+        start = time.perf_counter()
+        with metrics.llm_call(provider, caller) as llm:
+            try:
+                response = self._request(provider, prompt, json_mode)
+            except Exception as e:
+                health.failure(e)
+                raise
+            llm.response = response
+        health.success(time.perf_counter() - start)
+
+        text = response.text if provider == "gemini" else response.choices[0].message.content
+        return extract_json(text) if json_mode else (text or "").strip()
+
+    def _run(self, prompt: str, caller: str, json_mode: bool) -> Any:
+        if not self.providers():
+            raise LLMUnavailable("No LLM provider configured (set GEMINI_API_KEY or OPENAI_API_KEY)")
+        order = self._route()
+        if not order:
+            # Fast fail: every provider is known to be down
+            for provider in self.providers():
+                metrics.inc("llm_requests_total", provider=provider, component=caller, outcome="circuit_open")
+            raise LLMUnavailable("All LLM providers are unavailable (circuits open)")
+
+        errors = []
+        if self.hedge and len(order) > 1:
+            try:
+                return self._hedged(order[0], order[1], prompt, caller, json_mode)
+            except LLMUnavailable as e:
+                errors.append(str(e))
+                order = order[2:]
+
+        for provider in order:
+            try:
+                return self._attempt(provider, prompt, caller, json_mode)
+            except Exception as e:
+                errors.append(f"{provider}: {e}")
+        raise LLMUnavailable("; ".join(errors))
+
+    def _hedge_delay(self, provider: str) -> float:
+        p95 = self._health[provider].p95()
+        return max(HEDGE_MIN_DELAY, p95 if p95 is not None else HEDGE_DEFAULT_DELAY)
+
+    def _hedged(self, primary: str, secondary: str, prompt: str, caller: str, json_mode: bool) -> Any:
+        """
+        Sends to `primary`; if it has not answered within its hedge delay (or fails), also to
+        `secondary`. The first successful answer is returned and the other one discarded.
+        """
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = concurrent.futures.ThreadPoolExecutor(max_workers=32,
+                                                                         thread_name_prefix="llm-hedge")
+            pool = self._hedge_pool
+
+        futures = {pool.submit(self._attempt, primary, prompt, caller, json_mode): primary}
+        done, _ = concurrent.futures.wait(futures, timeout=self._hedge_delay(primary))
+        hedged = not done
+        if hedged:
+            futures[pool.submit(self._attempt, secondary, prompt, caller, json_mode)] = secondary
+
+        errors = []
+        pending = set(futures)
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(f"{futures[future]}: {e}")
+                    if secondary not in futures.values():
+                        # Primary failed before the hedge delay: plain failover
+                        retry = pool.submit(self._attempt, secondary, prompt, caller, json_mode)
+                        futures[retry] = secondary
+                        pending.add(retry)
+                    continue
+                if hedged:
+                    metrics.inc("llm_hedged_requests_total", caller=caller, winner=futures[future])
+                return result
+
+        if hedged:
+            metrics.inc("llm_hedged_requests_total", caller=caller, winner="none")
+        raise LLMUnavailable("; ".join(errors))
+
+    def status(self) -> Dict[str, Dict]:
+        """Per-provider circuit state and latency for diagnostics."""
+        return {
+            name: {
+                "circuit": self._health[name].breaker.snapshot(),
+                "ewma_latency_s": self._health[name].ewma,
+                "p95_latency_s": self._health[name].p95(),
+            }
+            for name in self.providers()
+        }
+
+
+# Global instance
+llm_gateway = LLMGateway()
@@ -0,0 +1,257 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+PREFIX = "flowassist_"
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+_SIZE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# name -> (type, help, histogram buckets)
+_FAMILIES = {
+    "stage_duration_seconds": ("histogram", "Time spent in a pipeline stage call.", _LATENCY_BUCKETS),
+    "stage_calls_total": ("counter", "Pipeline stage calls.", None),
+    "stage_errors_total": ("counter", "Errors inside pipeline stage calls (raised or handled).", None),
+    "stage_items_in_total": ("counter", "Items passed into pipeline stages.", None),
+    "stage_items_out_total": ("counter", "Items produced by pipeline stages.", None),
+    "llm_request_duration_seconds": ("histogram", "LLM API request latency.", _LATENCY_BUCKETS),
+    "llm_requests_total": ("counter", "LLM API requests by outcome.", None),
+    "llm_tokens_total": ("counter", "LLM tokens reported by the provider.", None),
+    "prompt_content_tokens_total": ("counter", "Estimated tokens of scraped content put into prompts.", None),
+    "prompt_tokens_saved_total": ("counter", "Estimated prompt tokens removed by prompt preparation.", None),
+    "llm_hedged_requests_total": ("counter", "LLM requests also sent to a second provider, by winner.", None),
+    "apify_dataset_items": ("histogram", "Items in the dataset of a finished Apify actor run.", _SIZE_BUCKETS),
+    "db_write_retries_total": ("counter", "Database write requests retried after a transient failure.", None),
+    "db_outbox_rows_total": ("counter", "Rows through the local DB outbox, by outcome (queued, written, retried, dead).", None),
+    "db_outbox_pending": ("gauge", "Rows waiting in the local DB outbox.", None),
+    "db_outbox_dead": ("gauge", "Rows in the local DB outbox that the database rejected.", None),
+    "db_outbox_oldest_seconds": ("gauge", "Age of the oldest row waiting in the local DB outbox.", None),
+    "owner_index_lookups_total": ("counter", "Owner index lookups before lead analysis, by outcome.", None),
+    "cassette_requests_total": ("counter", "External requests recorded to or replayed from a cassette.", None),
+    "circuit_state": ("gauge", "Circuit breaker state (0 closed, 1 half-open, 2 open).", None),
+    "circuit_transitions_total": ("counter", "Circuit breaker state changes, by target state.", None),
+    "flow_jobs": ("gauge", "FlowSearch jobs by status.", None),
+    "agent_sessions": ("gauge", "Autonomous agent sessions by status.", None),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def llm_token_usage(response) -> Tuple[Optional[int], Optional[int]]:
+    """(prompt, completion) token counts from a Gemini or OpenAI response, None when absent."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        return getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+    return None, None
+
+
+class StageCall:
+    """Handle yielded by Metrics.stage(); set item counts and count handled errors on it."""
+
+    __slots__ = ("items_in", "items_out", "errors")
+
+    def __init__(self, items_in: Optional[int] = None):
+        self.items_in = items_in
+        self.items_out = None
+        self.errors = 0
+
+
+class LLMCall:
+    """Handle yielded by Metrics.llm_call(); assign the provider response to record token usage."""
+
+    __slots__ = ("response",)
+
+    def __init__(self):
+        self.response = None
+
+
+class Metrics:
+    """
+    In-process metrics registry: counters, gauges and histograms with labels.
+    Rendered in Prometheus text format for /metrics, or as a JSON summary for CLI runs.
+    Worker processes ship snapshots to the API process, which merges them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, LabelKey], object] = {}
+
+    # -- recording --
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._series[(name, _label_key(labels))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = _FAMILIES[name][2]
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self._series.get(key)
+            if hist is None:
+                hist = self._series[key] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0, "max": 0.0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist["buckets"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+            hist["max"] = max(hist["max"], value)
+
+    @contextmanager
+    def stage(self, stage: str, items_in: Optional[int] = None, **labels) -> Iterator[StageCall]:
+        """Times one call of a pipeline stage and records its calls, errors and item counts."""
+        call = StageCall(items_in)
+        start = time.perf_counter()
+        try:
+            yield call
+        except Exception:
+            call.errors += 1
+            raise
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - start, stage=stage, **labels)
+            self.inc("stage_calls_total", stage=stage, **labels)
+            if call.errors:
+                self.inc("stage_errors_total", call.errors, stage=stage, **labels)
+            if call.items_in is not None:
+                self.inc("stage_items_in_total", call.items_in, stage=stage, **labels)
+            if call.items_out is not None:
+                self.inc("stage_items_out_total", call.items_out, stage=stage, **labels)
+
+    @contextmanager
+    def llm_call(self, provider: str, component: str) -> Iterator[LLMCall]:
+        """Times one LLM request; records its outcome and, if call.response is set, token usage."""
+        call = LLMCall()
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield call
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            self.observe("llm_request_duration_seconds", time.perf_counter() - start,
+                         provider=provider, component=component)
+            self.inc("llm_requests_total", provider=provider, component=component, outcome=outcome)
+            if call.response is not None:
+                prompt_tokens, completion_tokens = llm_token_usage(call.response)
+                if prompt_tokens:
+                    self.inc("llm_tokens_total", prompt_tokens, provider=provider, component=component, kind="prompt")
+                if completion_tokens:
+                    self.inc("llm_tokens_total", completion_tokens, provider=provider, component=component,
+                             kind="completion")
+
+    # -- moving between processes --
+
+    def snapshot(self, reset: bool = False) -> Dict:
+        """Picklable/JSON-able copy of every series; reset=True also clears the registry."""
+        with self._lock:
+            series = [
+                [name, dict(labels), json.loads(json.dumps(value))]
+                for (name, labels), value in self._series.items()
+            ]
+            if reset:
+                self._series.clear()
+        return {"series": series}
+
+    def merge(self, snapshot: Dict):
+        """Adds a snapshot from another process (counters and histograms add, gauges are replaced)."""
+        for name, labels, value in snapshot.get("series", []):
+            if name not in _FAMILIES:
+                continue
+            kind = _FAMILIES[name][0]
+            key = (name, _label_key(labels))
+            with self._lock:
+                if kind == "gauge":
+                    self._series[key] = value
+                elif kind == "counter":
+                    self._series[key] = self._series.get(key, 0) + value
+                else:
+                    hist = self._series.get(key)
+                    if hist is None:
+                        self._series[key] = dict(value, buckets=list(value["buckets"]))
+                    else:
+                        hist["buckets"] = [a + b for a, b in zip(hist["buckets"], value["buckets"])]
+                        hist["sum"] += value["sum"]
+                        hist["count"] += value["count"]
+                        hist["max"] = max(hist["max"], value["max"])
+
+    # -- output --
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            items = sorted(self._series.items(), key=lambda kv: kv[0])
+            items = [(key, json.loads(json.dumps(value))) for key, value in items]
+
+        lines = []
+        current = None
+        for (name, labels), value in items:
+            kind, help_text, buckets = _FAMILIES.get(name, ("untyped", "", None))
+            full_name = PREFIX + name
+            if name != current:
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                current = name
+            if kind == "histogram":
+                for bound, count in zip(buckets, value["buckets"]):
+                    lines.append(f"{full_name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {count}")
+                lines.append(f"{full_name}_bucket{_format_labels(labels, ('le', '+Inf'))} {value['count']}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {value['count']}")
+            else:
+                lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict:
+        """Compact JSON-friendly view: "name{label=value,...}" -> value or histogram stats."""
+        with self._lock:
+            items = sorted(self._series.items(), key=lambda kv: kv[0])
+            summary = {}
+            for (name, labels), value in items:
+                label_text = ",".join(f"{k}={v}" for k, v in labels)
+                key = f"{name}{{{label_text}}}" if label_text else name
+                if isinstance(value, dict):
+                    summary[key] = {
+                        "count": value["count"],
+                        "sum": round(value["sum"], 4),
+                        "avg": round(value["sum"] / value["count"], 4) if value["count"] else 0.0,
+                        "max": round(value["max"], 4),
+                    }
+                else:
+                    summary[key] = value
+        return summary
+
+    def to_json(self) -> Dict:
+        """Summary plus the raw snapshot, as written by `main_agent.py --metrics-json`."""
+        return {"summary": self.summary(), **self.snapshot()}
+
+
+# Global instance
+metrics = Metrics()
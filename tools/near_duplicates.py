@@ -0,0 +1,145 @@
+import os
+import re
+from collections import defaultdict
+from typing import Dict, FrozenSet, List, Tuple
+
+from tools.metrics import metrics
+from tools.news_item import NewsItem
+
+# Items whose word sets have at least this Jaccard similarity are treated as one story
+MIN_SIMILARITY = float(os.getenv("NEWS_NEAR_DUP_SIMILARITY", "0.6"))
+# Only the start of long texts is compared
+MAX_BODY_WORDS = 300
+
+# MinHash signature: one-permutation hashing into _BINS bins (one hash per word instead of one
+# per word and permutation), banded _ROWS bins per LSH band. With 16 bands of 3 rows a pair at
+# Jaccard 0.6 shares a band with probability 1 - (1 - 0.6**3)**16 = 0.98, one at 0.2 only 0.12.
+_BINS = 48
+_ROWS = 3
+_MASK = (1 << 64) - 1
+_EMPTY = 1 << 64
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Frequent words that would pull unrelated short texts together
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "you we they my our your just now how what why can "
+    "na do się jest nie że po od za ale jak już".split()
+)
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if len(w) > 1 and w not in _STOPWORDS]
+
+
+def word_features(item: NewsItem) -> FrozenSet[str]:
+    """Words of the clean text, plus the title words twice (as "t:" features) so titles weigh more."""
+    title = _words(item.title)
+    return frozenset(_words(item.raw_content)[:MAX_BODY_WORDS]) | frozenset(title) | {f"t:{w}" for w in title}
+
+
+def minhash(features: FrozenSet[str]) -> List[int]:
+    """
+    One-permutation MinHash. Uses the built-in (per-process salted) str hash, so signatures
+    are only comparable within one run, which is all the clustering needs.
+    """
+    signature = [_EMPTY] * _BINS
+    for feature in features:
+        h = hash(feature) & _MASK
+        b, value = h % _BINS, h // _BINS
+        if value < signature[b]:
+            signature[b] = value
+    if features and _EMPTY in signature:
+        # Short texts leave bins empty. Each empty bin takes the value of the next filled bin
+        # (circularly) plus an offset per step, so every band stays usable ("rotation
+        # densification"); densified values are >= _EMPTY and never equal a real minimum.
+        nearest, steps = None, 0
+        for position in reversed(range(2 * _BINS)):
+            b = position % _BINS
+            if signature[b] < _EMPTY:
+                nearest, steps = signature[b], 0
+                continue
+            steps += 1
+            if nearest is not None and signature[b] == _EMPTY:
+                signature[b] = nearest + steps * _EMPTY
+    return signature
+
+
+def band_keys(features: FrozenSet[str]) -> List[Tuple[int, Tuple[int, ...]]]:
+    """LSH bucket keys of a feature set: (band, signature rows of the band); none for an empty set."""
+    if not features:
+        return []
+    signature = minhash(features)
+    return [(band, tuple(signature[band * _ROWS:(band + 1) * _ROWS])) for band in range(_BINS // _ROWS)]
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    common = len(a & b)
+    return common / (len(a) + len(b) - common) if a or b else 0.0
+
+
+def cluster_near_duplicates(items: List[NewsItem], min_similarity: float = MIN_SIMILARITY) -> List[List[NewsItem]]:
+    """
+    Groups items about the same story. Candidate pairs come from LSH buckets over MinHash
+    signatures (items sharing all rows of a band) and are confirmed with the exact Jaccard
+    similarity of their word sets. Clusters keep the order of their first item.
+    """
+    features = [word_features(item) for item in items]
+    buckets = defaultdict(list)
+    for index, feature_set in enumerate(features):
+        for key in band_keys(feature_set):
+            buckets[key].append(index)
+
+    parent = list(range(len(items)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Each cluster is represented by its first item; a candidate joins a cluster only when it is
+    # similar to that item, which keeps chains of slightly different titles from snowballing
+    rejected = set()
+    for members in buckets.values():
+        roots = []
+        for j in members:
+            rj = find(j)
+            for pos, r in enumerate(roots):
+                r = roots[pos] = find(r)
+                if r == rj:
+                    break
+                pair = (min(r, rj), max(r, rj))
+                if pair not in rejected:
+                    if jaccard(features[r], features[rj]) >= min_similarity:
+                        parent[max(r, rj)] = min(r, rj)
+                        roots[pos] = min(r, rj)
+                        break
+                    rejected.add(pair)
+            else:
+                roots.append(rj)
+
+    clusters: Dict[int, List[NewsItem]] = {}
+    for index, item in enumerate(items):
+        clusters.setdefault(find(index), []).append(item)
+    return list(clusters.values())
+
+
+def collapse_near_duplicates(items: List[NewsItem], min_similarity: float = MIN_SIMILARITY) -> List[NewsItem]:
+    """
+    One representative per near-duplicate cluster (the item with the most text), with the
+    others attached as related_sources, so each story is summarized and saved once; the
+    related sources are stored with it (news_items.related_sources).
+    """
+    with metrics.stage("dedup", items_in=len(items)) as call:
+        representatives = []
+        for cluster in cluster_near_duplicates(items, min_similarity):
+            representative = max(cluster, key=lambda item: len(item.raw_content))
+            representative.related_sources = [
+                {"source_platform": item.source_platform, "url": item.url, "title": item.title,
+                 "author_or_channel": item.author_or_channel}
+                for item in cluster if item is not representative
+            ]
+            representatives.append(representative)
+        call.items_out = len(representatives)
+    return representatives
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import os
+import random
+import signal
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from tools.metrics import metrics
+from tools.near_duplicates import MIN_SIMILARITY, band_keys, jaccard, word_features
+from tools.news_item import NewsItem
+
+load_dotenv()
+
+# Seconds between runs of each source, +- this share of random jitter
+DEFAULT_INTERVALS = {
+    "reddit": float(os.getenv("NEWS_INTERVAL_REDDIT", "900")),
+    "youtube": float(os.getenv("NEWS_INTERVAL_YOUTUBE", "1800")),
+    "github": float(os.getenv("NEWS_INTERVAL_GITHUB", "3600")),
+}
+JITTER = float(os.getenv("NEWS_DAEMON_JITTER", "0.1"))
+# A failed run is retried after this many seconds (or the source's interval, if shorter)
+RETRY_SECONDS = 300.0
+# Items already processed are skipped for this long, so repeated fetches are not summarized again
+SEEN_HOURS = float(os.getenv("NEWS_DAEMON_SEEN_HOURS", "72"))
+HEALTH_HOST = os.getenv("NEWS_DAEMON_HEALTH_HOST", "127.0.0.1")
+HEALTH_PORT = int(os.getenv("NEWS_DAEMON_HEALTH_PORT", "8090"))
+# How long shutdown waits for runs in progress
+SHUTDOWN_SECONDS = 60.0
+
+
+class SourceSchedule:
+    """One news source run on its own interval: `fetch()` returns the source's NewsItems."""
+
+    def __init__(self, name: str, interval: float, fetch: Callable[[], List[NewsItem]]):
+        self.name = name
+        self.interval = interval
+        self.fetch = fetch
+        self.runs = 0
+        self.failures = 0
+        self.running = False
+        self.last_started: Optional[float] = None
+        self.last_success: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_fetched = 0
+        self.last_new = 0
+        self.next_run: Optional[float] = None
+        self.first_due = time.time()
+
+    def healthy(self, now: float) -> bool:
+        """Succeeded within two intervals (plus jitter), or has not had the chance yet."""
+        reference = self.last_success or self.first_due
+        return now - reference <= 2 * self.interval * (1 + JITTER) + RETRY_SECONDS
+
+    def status(self, now: float) -> Dict:
+        return {
+            "interval_seconds": self.interval,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_success_age_seconds": round(now - self.last_success, 1) if self.last_success else None,
+            "last_error": self.last_error,
+            "last_fetched": self.last_fetched,
+            "last_new": self.last_new,
+            "next_run_in_seconds": round(max(0.0, self.next_run - now), 1) if self.next_run else None,
+            "healthy": self.healthy(now),
+        }
+
+
+class SeenItems:
+    """
+    Items processed recently, forgotten after `ttl_seconds`: their URLs and content hashes,
+    and their word sets indexed by MinHash LSH bands (tools/near_duplicates.py), so a story
+    that reaches another source later is recognised as a near-duplicate of the one already
+    summarized. The signatures use the per-process salted str hash, which is fine for the one
+    long-running daemon process.
+    """
+
+    def __init__(self, ttl_seconds: float, min_similarity: float = MIN_SIMILARITY):
+        self.ttl_seconds = ttl_seconds
+        self.min_similarity = min_similarity
+        self._expires: Dict[str, float] = {}
+        # story id -> (word features, LSH band keys, expiry); band key -> story ids
+        self._stories: Dict[int, Tuple[FrozenSet[str], List[Tuple], float]] = {}
+        self._bands: Dict[Tuple, Set[int]] = defaultdict(set)
+        self._next_story = 0
+
+    def _keys(self, item: NewsItem) -> List[str]:
+        keys = [f"url:{item.url}"]
+        if item.raw_content:
+            keys.append(f"hash:{item.content_hash}")
+        return keys
+
+    def _prune(self, now: float):
+        self._expires = {key: expires for key, expires in self._expires.items() if expires > now}
+        for story_id in [sid for sid, (_, _, expires) in self._stories.items() if expires <= now]:
+            _, bands, _ = self._stories.pop(story_id)
+            for band in bands:
+                self._bands[band].discard(story_id)
+                if not self._bands[band]:
+                    del self._bands[band]
+
+    def _is_near_duplicate(self, features: FrozenSet[str]) -> bool:
+        candidates = set()
+        for band in band_keys(features):
+            candidates.update(self._bands.get(band, ()))
+        return any(jaccard(features, self._stories[sid][0]) >= self.min_similarity for sid in candidates)
+
+    def unseen(self, items: List[NewsItem]) -> List[NewsItem]:
+        """Items whose URL, content and story were not processed recently."""
+        self._prune(time.time())
+        return [
+            item for item in items
+            if not any(key in self._expires for key in self._keys(item))
+            and not self._is_near_duplicate(word_features(item))
+        ]
+
+    def add(self, items: List[NewsItem]):
+        expires = time.time() + self.ttl_seconds
+        for item in items:
+            for key in self._keys(item):
+                self._expires[key] = expires
+            features = word_features(item)
+            bands = band_keys(features)
+            if bands:
+                self._stories[self._next_story] = (features, bands, expires)
+                for band in bands:
+                    self._bands[band].add(self._next_story)
+                self._next_story += 1
+
+    def __len__(self):
+        return len(self._expires)
+
+
+class NewsDaemon:
+    """
+    Long-running news ingestion (main_agent.py --daemon). Each source runs on its own interval
+    with jitter, in one asyncio event loop; a run fetches the source, drops items seen
+    recently by any source (same URL or content, or a near-duplicate of a story already
+    processed, see SeenItems) and hands the rest to `process(items)` (collapse near-duplicates
+    within the batch, summarize, save), which returns how many were saved. Runs process their
+    items one at a time, so two sources bringing the same story together summarize it once.
+    Fetching and processing are blocking and run in worker threads. The process stays up, so
+    imported SDKs and API clients are reused between runs.
+
+    GET /health answers 200 while every source has succeeded recently (503 otherwise), with
+    the per-source state; GET /metrics serves the Prometheus metrics. SIGTERM / SIGINT stop
+    scheduling, wait for runs in progress, and the caller then writes the DB outbox.
+    """
+
+    def __init__(self, schedules: List[SourceSchedule], process: Callable[[List[NewsItem]], int],
+                 health_host: str = HEALTH_HOST, health_port: int = HEALTH_PORT,
+                 seen_hours: float = SEEN_HOURS, jitter: float = JITTER):
+        self.schedules = schedules
+        self.process = process
+        self.health_host = health_host
+        self.health_port = health_port
+        self.jitter = jitter
+        self.seen = SeenItems(seen_hours * 3600)
+        self.started_at = time.time()
+        self._stop: Optional[asyncio.Event] = None
+        self._process_lock: Optional[asyncio.Lock] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def _delay(self, seconds: float) -> float:
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def _run_once(self, schedule: SourceSchedule):
+        schedule.running = True
+        schedule.last_started = time.time()
+        schedule.runs += 1
+        try:
+            with metrics.stage("daemon_run", source=schedule.name) as call:
+                items = await asyncio.to_thread(schedule.fetch)
+                call.items_in = len(items)
+                # Checked and recorded under the lock, so a story another source is processing
+                # right now is skipped here instead of being summarized twice
+                async with self._process_lock:
+                    new_items = self.seen.unseen(items)
+                    schedule.last_fetched, schedule.last_new = len(items), len(new_items)
+                    if new_items:
+                        await asyncio.to_thread(self.process, new_items)
+                        self.seen.add(new_items)
+                call.items_out = len(new_items)
+            print(f"[daemon] {schedule.name}: {len(items)} fetched, {len(new_items)} new.")
+            schedule.last_success = time.time()
+            schedule.last_error = None
+            return True
+        except Exception as e:
+            schedule.failures += 1
+            schedule.last_error = str(e)
+            print(f"[daemon] {schedule.name} run failed: {e}")
+            return False
+        finally:
+            schedule.running = False
+
+    async def _source_loop(self, schedule: SourceSchedule):
+        # Sources start a few seconds apart instead of all at once
+        delay = random.uniform(0, min(5.0, schedule.interval))
+        while True:
+            schedule.next_run = time.time() + delay
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+            ok = await self._run_once(schedule)
+            delay = self._delay(schedule.interval if ok else min(RETRY_SECONDS, schedule.interval))
+
+    def status(self) -> Dict:
+        now = time.time()
+        sources = {schedule.name: schedule.status(now) for schedule in self.schedules}
+        return {
+            "status": "ok" if all(entry["healthy"] for entry in sources.values()) else "degraded",
+            "uptime_seconds": round(now - self.started_at, 1),
+            "seen_items": len(self.seen),
+            "sources": sources,
+        }
+
+    def _start_health_server(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] == "/metrics":
+                    body, status, content_type = metrics.render_prometheus().encode(), 200, "text/plain; version=0.0.4"
+                elif self.path.split("?")[0] == "/health":
+                    state = daemon.status()
+                    body, content_type = json.dumps(state).encode(), "application/json"
+                    status = 200 if state["status"] == "ok" else 503
+                else:
+                    body, status, content_type = b'{"error": "not found"}', 404, "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.health_host, self.health_port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="news-daemon-health", daemon=True).start()
+        host, port = self._server.server_address[:2]
+        print(f"[daemon] Health endpoint on http://{host}:{port}/health")
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+    async def run(self):
+        self._stop = asyncio.Event()
+        self._process_lock = asyncio.Lock()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):  # Windows, or not the main thread
+                pass
+
+        if self.health_port >= 0:
+            self._start_health_server()
+        for schedule in self.schedules:
+            schedule.first_due = time.time()
+            print(f"[daemon] {schedule.name} every {schedule.interval:g}s")
+
+        tasks = [asyncio.create_task(self._source_loop(schedule)) for schedule in self.schedules]
+        await self._stop.wait()
+        print("[daemon] Shutting down; waiting for runs in progress...")
+        _, pending = await asyncio.wait(tasks, timeout=SHUTDOWN_SECONDS)
+        for task in pending:
+            task.cancel()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
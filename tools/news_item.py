@@ -0,0 +1,110 @@
+import hashlib
+import re
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+
+from tools.prompt_prep import estimate_tokens, parse_html, strip_boilerplate
+
+# Columns of the news_items table; everything else on an item is derived at scrape time.
+# related_sources is a jsonb column: near-duplicates of the story from other feeds
+STORED_FIELDS = ("id", "source_platform", "title", "url", "published_at", "summary_points", "category",
+                 "author_or_channel", "thumbnail", "raw_content", "related_sources")
+
+# Share/tracking query parameters that do not change what a URL points to
+_TRACKING_PARAM_RE = re.compile(r"^(?:utm_\w+|fbclid|gclid|igshid|ref_src|ref_url)$", re.IGNORECASE)
+
+
+@dataclass(slots=True)
+class NewsItem:
+    """A scraped news item; see build_news_item."""
+    source_platform: str
+    title: str
+    url: str
+    published_at: str
+    author_or_channel: str
+    raw_content: str = ""
+    thumbnail: Optional[str] = None
+    category: str = "Uncategorized"  # To be filled by the summarizer
+    summary_points: List[str] = field(default_factory=list)  # To be filled by the summarizer
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    content_hash: str = ""
+    source_tokens: int = 0
+    related_sources: List[Dict] = field(default_factory=list)  # near-duplicates from other feeds
+
+    def to_db_record(self) -> Dict:
+        """Row for the 'news_items' table."""
+        return {name: getattr(self, name) for name in STORED_FIELDS}
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def canonical_item_url(url: str) -> str:
+    """
+    Drops tracking query parameters. Everything else is kept byte for byte (encoding,
+    separators, case, fragment), so a URL without tracking parameters still matches the
+    rows stored before URLs were canonicalized.
+    """
+    url = (url or "").strip()
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc or not parts.query:
+        return url
+    # Each parameter keeps its trailing separator ("&" or ";")
+    params = re.split(r"(?<=[&;])", parts.query)
+    kept = [p for p in params if not _TRACKING_PARAM_RE.match(unquote_plus(p.rstrip("&;").split("=", 1)[0]))]
+    if len(kept) == len(params):
+        return url
+    return urlunsplit(parts._replace(query="".join(kept).rstrip("&;")))
+
+
+def content_hash(title: str, text: str) -> str:
+    """Hash of the case- and whitespace-normalized title and clean text (same post -> same hash)."""
+    normalized = " ".join(f"{title or ''}\n{text or ''}".lower().split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def build_news_item(source_platform: str, title: str, url: str, published_at: str, author_or_channel: str,
+                    content: str, thumbnail: Optional[str] = None, category: str = "Uncategorized") -> NewsItem:
+    """
+    Normalized NewsItem, built once by the scrapers. The content (HTML or plain text) is parsed
+    a single time: raw_content holds the clean text, the first image fills in a missing
+    thumbnail, and url is canonical. Derived fields (not stored):
+      content_hash:  see content_hash(), for deduplication
+      source_tokens: estimated tokens of the content as scraped, before cleaning
+    """
+    content = content or ""
+    text, image_url = parse_html(content)
+    text = strip_boilerplate(text)
+    title = (title or "").strip() or "No Title"
+    return NewsItem(
+        source_platform=source_platform,
+        title=title,
+        url=canonical_item_url(url),
+        published_at=published_at,
+        author_or_channel=author_or_channel,
+        raw_content=text,
+        thumbnail=thumbnail or image_url,
+        category=category,
+        content_hash=content_hash(title, text),
+        source_tokens=estimate_tokens(content),
+    )
+
+
+def dedupe_news_items(items: List[NewsItem]) -> List[NewsItem]:
+    """
+    Keeps the first item per canonical URL and per content hash (e.g. a post shared to two
+    subreddits). Items without content are only matched on URL, since their hash is just the title.
+    """
+    seen_urls, seen_hashes, unique = set(), set(), []
+    for item in items:
+        url = item.url
+        digest = item.content_hash if item.raw_content else None
+        if (url and url in seen_urls) or (digest and digest in seen_hashes):
+            continue
+        seen_urls.add(url)
+        seen_hashes.add(digest)
+        unique.append(item)
+    return unique
+
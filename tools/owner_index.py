@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+
+from tools.flow_records import Enrichment, LeadCandidate, PainAnalysis
+from tools.metrics import metrics
+
+load_dotenv()
+
+DEFAULT_PATH = os.path.join(".cache", "owner_index.sqlite3")
+# How long an owner's analysis is reused while their post and comments stay the same; 0 disables the index
+DEFAULT_TTL_HOURS = 168
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS owners (
+    platform TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    enrichment TEXT NOT NULL,
+    score REAL NOT NULL,
+    scored_at REAL NOT NULL,
+    PRIMARY KEY (platform, owner)
+)
+"""
+
+# Placeholder owner of browser-scraped posts; it does not identify anyone
+_ANONYMOUS_OWNERS = {"", "hidden"}
+
+
+def input_fingerprint(lead: LeadCandidate) -> str:
+    """
+    Hash of what the analyzer reads: the caption and the comment texts, case- and
+    whitespace-normalized and order-independent (scrapers return comments in varying order).
+    """
+    texts = sorted({" ".join(text.lower().split()) for text in lead.analysis_input()})
+    return hashlib.blake2b("\n".join(texts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class OwnerIndex:
+    """
+    Local record of owners already analyzed: (platform, owner) -> fingerprint of the analyzed
+    inputs, pain analysis, enrichment, last score and when it was computed.
+
+    run_flow_lead_gen reuses the stored analysis and enrichment (the LLM call and the website
+    check) for an owner whose inputs have the same fingerprint and were scored less than
+    `ttl_hours` ago; the score itself is always recomputed, since engagement changes.
+    Expired entries are deleted at the start of each run (purge_expired), so the file does
+    not grow with every owner ever seen. Stored in SQLite so every worker process shares it.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl_hours: float = DEFAULT_TTL_HOURS):
+        self.path = path
+        self.ttl_hours = ttl_hours
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_hours > 0
+
+    def _db(self) -> sqlite3.Connection:
+        # Callers hold self._lock
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _key(lead: LeadCandidate) -> Optional[Tuple[str, str]]:
+        owner = (lead.owner_username or "").strip().lower()
+        if owner in _ANONYMOUS_OWNERS:
+            return None
+        return lead.platform, owner
+
+    def lookup(self, lead: LeadCandidate) -> Optional[Tuple[PainAnalysis, Enrichment]]:
+        """The stored (analysis, enrichment) when the owner's inputs are unchanged and fresh, else None."""
+        key = self._key(lead)
+        if not self.enabled or key is None:
+            return None
+        with self._lock:
+            row = self._db().execute(
+                "SELECT fingerprint, analysis, enrichment, scored_at FROM owners WHERE platform = ? AND owner = ?",
+                key,
+            ).fetchone()
+
+        if row is None:
+            outcome = "miss"
+        elif time.time() - row[3] > self.ttl_hours * 3600:
+            outcome = "expired"
+        elif row[0] != input_fingerprint(lead):
+            outcome = "changed"
+        else:
+            outcome = "hit"
+        metrics.inc("owner_index_lookups_total", outcome=outcome)
+        if outcome != "hit":
+            return None
+        return PainAnalysis(**json.loads(row[1])), Enrichment(**json.loads(row[2]))
+
+    def record(self, lead: LeadCandidate):
+        """Stores a freshly analyzed and scored lead. Failed analyses are not stored, so they are retried."""
+        key = self._key(lead)
+        if not self.enabled or key is None or lead.analysis is None or lead.enrichment is None:
+            return
+        if lead.analysis.error:
+            return
+        row = (
+            *key,
+            input_fingerprint(lead),
+            json.dumps(asdict(lead.analysis), ensure_ascii=False),
+            json.dumps(asdict(lead.enrichment), ensure_ascii=False),
+            lead.score.score if lead.score else 0.0,
+            time.time(),
+        )
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO owners VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+            db.commit()
+
+    def purge_expired(self) -> int:
+        """Deletes entries older than the TTL; returns how many."""
+        if not self.enabled:
+            return 0
+        with self._lock:
+            db = self._db()
+            cursor = db.execute("DELETE FROM owners WHERE scored_at < ?", (time.time() - self.ttl_hours * 3600,))
+            db.commit()
+        return cursor.rowcount
+
+
+def _owner_index_from_env() -> OwnerIndex:
+    try:
+        ttl_hours = float(os.getenv("OWNER_INDEX_TTL_HOURS") or DEFAULT_TTL_HOURS)
+    except ValueError:
+        print("Invalid OWNER_INDEX_TTL_HOURS. Owner index disabled.")
+        ttl_hours = 0
+    return OwnerIndex(os.getenv("OWNER_INDEX_PATH") or DEFAULT_PATH, ttl_hours)
+
+
+# Global instance
+owner_index = _owner_index_from_env()
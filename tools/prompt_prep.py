@@ -0,0 +1,126 @@
+import os
+import re
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+# Token budget for an item's content in the summarizer prompt
+CONTENT_TOKEN_BUDGET = int(os.getenv("SUMMARIZER_CONTENT_TOKENS", "400"))
+
+_BLOCK_TAGS = ["p", "div", "br", "li", "tr", "table", "ul", "ol", "blockquote", "pre",
+               "h1", "h2", "h3", "h4", "h5", "h6"]
+_DROP_TAGS = ["script", "style", "img", "video", "iframe", "noscript", "svg"]
+
+_URL_RE = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+# Reddit RSS footer: "submitted by /u/name [link] [comments]"
+_REDDIT_FOOTER_RE = re.compile(r"submitted\s+by\s+/?u/\S+|\[(?:link|comments)\]", re.IGNORECASE)
+# Promo lines typical of YouTube descriptions; only dropped when short or carrying a link
+_PROMO_RE = re.compile(
+    r"subscribe|patreon|sponsor|affiliate|follow (?:me|us)|merch|discord|newsletter|"
+    r"support (?:the|this) channel|business inquiries",
+    re.IGNORECASE,
+)
+# Chapter lists ("0:00 Intro") and their headers
+_NAVIGATION_LINE_RE = re.compile(
+    r"^\s*(?:chapters|timestamps|links?)\s*:?\s*$|^\s*\(?\d{1,2}:\d{2}(?::\d{2})?\)?\s",
+    re.IGNORECASE,
+)
+_HASHTAGS_ONLY_RE = re.compile(r"^(?:\s*#[\w-]+)+\s*$", re.UNICODE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), good enough for budgeting prompts."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def summarize_text(text: str, max_chars: int) -> str:
+    """Extractive summary: leading whole sentences up to max_chars."""
+    text = " ".join((text or "").split())
+    if len(text) <= max_chars:
+        return text
+    summary = ""
+    for sentence in _SENTENCE_RE.split(text):
+        if len(summary) + len(sentence) + 1 > max_chars:
+            break
+        summary = f"{summary} {sentence}".strip()
+    return summary or text[:max_chars - 3].rstrip() + "..."
+
+
+class _TextParser(HTMLParser):
+    """Standard-library stand-in for BeautifulSoup in parse_html (used when bs4 is not installed)."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.image_url: Optional[str] = None
+        self._dropped = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "img" and self.image_url is None:
+            self.image_url = dict(attrs).get("src") or None
+        if tag in _DROP_TAGS and tag != "img":
+            self._dropped += 1
+        elif tag == "br":
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _DROP_TAGS and tag != "img":
+            self._dropped = max(0, self._dropped - 1)
+        elif tag in _BLOCK_TAGS and tag != "br":  # <br> ends its line when it opens
+            self.parts.append("\n")
+        elif tag in ("td", "th"):
+            self.parts.append(" ")
+
+    def handle_data(self, data):
+        if not self._dropped:
+            self.parts.append(data)
+
+
+def parse_html(html: str) -> Tuple[str, Optional[str]]:
+    """
+    One parse of an HTML fragment: its visible text (one line per block element) and the
+    first image URL in it. Plain text is returned as is.
+    """
+    if not html or "<" not in html:
+        return html or "", None
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        parser = _TextParser()
+        parser.feed(html)
+        parser.close()
+        return "".join(parser.parts), parser.image_url
+
+    soup = BeautifulSoup(html, "html.parser")
+    image = soup.find("img", src=True)
+    image_url = image["src"] if image else None
+    for tag in soup.find_all(_DROP_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(_BLOCK_TAGS):
+        tag.insert_after("\n")
+    for cell in soup.find_all(["td", "th"]):
+        cell.insert_after(" ")
+    return soup.get_text(), image_url
+
+
+def strip_boilerplate(text: str) -> str:
+    """Drops URLs, the Reddit RSS footer and promo/link-dump lines, and collapses whitespace."""
+    kept = []
+    for line in _REDDIT_FOOTER_RE.sub(" ", text).splitlines():
+        had_url = bool(_URL_RE.search(line))
+        if _NAVIGATION_LINE_RE.search(line) or (_PROMO_RE.search(line) and (had_url or len(line) < 80)):
+            continue
+        line = " ".join(_URL_RE.sub(" ", line).split())
+        # "Website: <url>" and the like carry nothing once the URL is gone
+        if not line or _HASHTAGS_ONLY_RE.match(line) or (had_url and len(line.split()) < 4):
+            continue
+        kept.append(line)
+    return " ".join(kept)
+
+
+def fit_to_budget(text: str, token_budget: int = CONTENT_TOKEN_BUDGET) -> str:
+    """Cuts already clean text to `token_budget` at a sentence boundary."""
+    if estimate_tokens(text) > token_budget:
+        return summarize_text(text, token_budget * 4)
+    return text
+
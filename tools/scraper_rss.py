@@ -1,8 +1,12 @@
 import feedparser
 from datetime import datetime
-import uuid
 import json
 
+from tools.cassette import http_get
+from tools.metrics import metrics
+from tools.news_item import build_news_item
+from tools.service_endpoints import REDDIT_RSS_BASE
+
 def fetch_reddit_rss(subreddits):
     """
     Fetches and parses RSS feeds from a list of subreddits.
@@ -13,38 +17,49 @@ def fetch_reddit_rss(subreddits):
     Returns:
         list: List of NewsItem dictionaries.
     """
+    with metrics.stage("scraper", items_in=len(subreddits), source="reddit") as call:
+        news_items = _fetch_reddit_rss(subreddits, call)
+        call.items_out = len(news_items)
+    return news_items
+
+def _fetch_reddit_rss(subreddits, call):
     news_items = []
     
     for sub in subreddits:
-        rss_url = f"https://www.reddit.com/r/{sub}/.rss"
+        rss_url = f"{REDDIT_RSS_BASE}/r/{sub}/.rss"
         try:
             print(f"Fetching RSS for: {sub}")
-            feed = feedparser.parse(rss_url)
+            # Downloaded here rather than by feedparser so the body can be recorded/replayed
+            response = http_get(rss_url, headers={"User-Agent": feedparser.USER_AGENT}, timeout=15)
+            if response.status_code != 200:
+                print(f"Error fetching feed for {sub}: HTTP {response.status_code}")
+                call.errors += 1
+                continue
+            feed = feedparser.parse(response.text)
             
             if feed.bozo:
                 print(f"Error parsing feed for {sub}: {feed.bozo_exception}")
+                call.errors += 1
                 continue
                 
             for entry in feed.entries:
                 # Basic filtering or processing could go here
                 
-                # Create NewsItem structure
-                item = {
-                    "id": str(uuid.uuid4()),
-                    "source_platform": "reddit",
-                    "title": entry.title if 'title' in entry else "No Title",
-                    "url": entry.link if 'link' in entry else "",
-                    "published_at": _parse_date(entry),
-                    "summary_points": [], # To be filled by summarizer
-                    "category": "Uncategorized", # To be filled by classifier/summarizer
-                    "author_or_channel": entry.author if 'author' in entry else f"r/{sub}",
-                    "thumbnail": _extract_reddit_thumbnail(entry),
-                    "raw_content": entry.description if 'description' in entry else ""
-                }
+                # Create NewsItem structure (the description HTML is parsed once, in build_news_item)
+                item = build_news_item(
+                    "reddit",
+                    title=entry.title if 'title' in entry else "No Title",
+                    url=entry.link if 'link' in entry else "",
+                    published_at=_parse_date(entry),
+                    author_or_channel=entry.author if 'author' in entry else f"r/{sub}",
+                    content=entry.description if 'description' in entry else "",
+                    thumbnail=_media_thumbnail(entry),
+                )
                 news_items.append(item)
                 
         except Exception as e:
             print(f"Critical error fetching {sub}: {e}")
+            call.errors += 1
             
     return news_items
 
@@ -57,28 +72,18 @@ def _parse_date(entry):
         return entry.published
     return datetime.utcnow().isoformat()
 
-def _extract_reddit_thumbnail(entry):
+def _media_thumbnail(entry):
     """
-    Tries to find a thumbnail URL in a Reddit RSS entry.
+    Thumbnail URL from a Reddit RSS entry's media tags; without one, build_news_item
+    takes the first image in the description.
     """
     if 'media_thumbnail' in entry and len(entry.media_thumbnail) > 0:
         return entry.media_thumbnail[0]['url']
-    
-    # Try parsing from content if missing
-    if 'description' in entry:
-        desc = entry.description
-        if 'src="' in desc:
-            try:
-                start = desc.find('src="') + 5
-                end = desc.find('"', start)
-                return desc[start:end]
-            except:
-                pass
     return None
 
 if __name__ == "__main__":
     # Test run
     subs = ["ArtificialInteligence", "OpenAI", "MachineLearning"]
     items = fetch_reddit_rss(subs)
-    print(json.dumps(items[:2], indent=2))
+    print(json.dumps([item.to_dict() for item in items[:2]], indent=2))
     print(f"Total items fetched: {len(items)}")
@@ -1,15 +1,35 @@
 import os
 import datetime
-import uuid
 import json
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httplib2
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from dotenv import load_dotenv
 
+from tools.cassette import cassette
+from tools.metrics import metrics
+from tools.news_item import build_news_item
+from tools.service_endpoints import canonical_url, youtube_build_kwargs
+
 load_dotenv()
 
 API_KEY = os.getenv("YOUTUBE_API_KEY")
 
+def _execute(request):
+    """Executes a YouTube API request through the cassette, keyed on its URI without the API key."""
+    parts = urlsplit(request.uri)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if k != "key"])
+    return cassette.call(
+        "youtube",
+        {"method": request.method, "uri": canonical_url(urlunsplit(parts._replace(query=query)))},
+        request.execute,
+        replay_error=lambda error: HttpError(
+            httplib2.Response({"status": error.get("status") or 500}), error["message"].encode("utf-8")
+        ),
+    )
+
 def get_channel_uploads_id(youtube, channel_id):
     """
     Retrieves the ID of the 'Uploads' playlist for a given channel.
@@ -19,7 +39,7 @@ def get_channel_uploads_id(youtube, channel_id):
             part="contentDetails",
             id=channel_id
         )
-        response = request.execute()
+        response = _execute(request)
         if "items" in response and len(response["items"]) > 0:
             return response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
     except HttpError as e:
@@ -49,7 +69,7 @@ def resolve_channel_id(youtube, identifier):
                 part="id",
                 forHandle=identifier
             )
-            response = request.execute()
+            response = _execute(request)
             if "items" in response and len(response["items"]) > 0:
                 resolved_id = response["items"][0]["id"]
                 print(f"Resolved {identifier} -> {resolved_id}")
@@ -72,10 +92,17 @@ def fetch_youtube_videos(channel_identifiers, max_results=5):
         print("Error: YOUTUBE_API_KEY not found in environment.")
         return []
 
+    with metrics.stage("scraper", items_in=len(channel_identifiers), source="youtube") as call:
+        news_items = _fetch_youtube_videos(channel_identifiers, max_results, call)
+        call.items_out = len(news_items)
+    return news_items
+
+def _fetch_youtube_videos(channel_identifiers, max_results, call):
     try:
-        youtube = build("youtube", "v3", developerKey=API_KEY)
+        youtube = build("youtube", "v3", developerKey=API_KEY, **youtube_build_kwargs())
     except Exception as e:
         print(f"Error building YouTube service: {e}")
+        call.errors += 1
         return []
 
     news_items = []
@@ -86,12 +113,14 @@ def fetch_youtube_videos(channel_identifiers, max_results=5):
         channel_id = resolve_channel_id(youtube, identifier)
         if not channel_id:
             print(f"Could not resolve Channel ID for: {identifier}")
+            call.errors += 1
             continue
 
         uploads_id = get_channel_uploads_id(youtube, channel_id)
         
         if not uploads_id:
             print(f"Could not find uploads for {channel_id}")
+            call.errors += 1
             continue
 
         try:
@@ -100,28 +129,26 @@ def fetch_youtube_videos(channel_identifiers, max_results=5):
                 playlistId=uploads_id,
                 maxResults=max_results
             )
-            response = request.execute()
+            response = _execute(request)
 
             for item in response.get("items", []):
                 snippet = item["snippet"]
                 video_id =  item["contentDetails"]["videoId"]
                 
-                news_item = {
-                    "id": str(uuid.uuid4()),
-                    "source_platform": "youtube",
-                    "title": snippet["title"],
-                    "url": f"https://www.youtube.com/watch?v={video_id}",
-                    "published_at": snippet["publishedAt"],
-                    "thumbnail": snippet["thumbnails"]["high"]["url"] if "thumbnails" in snippet and "high" in snippet["thumbnails"] else None,
-                    "summary_points": [],
-                    "category": "Uncategorized",
-                    "author_or_channel": snippet["channelTitle"],
-                    "raw_content": snippet["description"] # Description is the best we get without captions
-                }
+                news_item = build_news_item(
+                    "youtube",
+                    title=snippet["title"],
+                    url=f"https://www.youtube.com/watch?v={video_id}",
+                    published_at=snippet["publishedAt"],
+                    author_or_channel=snippet["channelTitle"],
+                    content=snippet["description"],  # Description is the best we get without captions
+                    thumbnail=snippet["thumbnails"]["high"]["url"] if "thumbnails" in snippet and "high" in snippet["thumbnails"] else None,
+                )
                 news_items.append(news_item)
 
         except HttpError as e:
             print(f"Error fetching uploads for {channel_id}: {e}")
+            call.errors += 1
 
     return news_items
 
@@ -130,5 +157,5 @@ if __name__ == "__main__":
     test_channels = ["UCbfYPyITQ-7l4upoX8nvctg"] 
     
     items = fetch_youtube_videos(test_channels, max_results=2)
-    print(json.dumps(items, indent=2))
+    print(json.dumps([item.to_dict() for item in items], indent=2))
     print(f"Total items fetched: {len(items)}")
@@ -0,0 +1,115 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+_TOKEN_RE = re.compile(r"[^\W_]+(?:['.+#-][^\W_]+)*", re.UNICODE)
+
+# Words that do not change what DuckDuckGo returns for the queries the planner writes
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "to", "and", "or", "with", "about", "at", "by",
+    "from", "is", "are", "what", "which", "how", "latest", "current", "recent",
+    "i", "w", "z", "na", "do", "o", "oraz", "dla", "jak", "co", "czy", "najnowsze", "aktualne",
+}
+
+
+def normalize_query(query: str) -> str:
+    """Lowercases, drops punctuation and stopwords and collapses whitespace; word order is kept."""
+    tokens = _TOKEN_RE.findall((query or "").lower())
+    kept = [t for t in tokens if t not in _STOPWORDS]
+    return " ".join(kept or tokens)
+
+
+class _Pending:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SearchCache:
+    """
+    Search results shared by every agent session, keyed on the normalized query.
+    Entries expire after `ttl` seconds and the least recently used are dropped beyond
+    `max_entries`. Concurrent misses for the same key wait for a single fetch.
+    Failed fetches are not cached.
+    """
+
+    def __init__(self, ttl: int = 900, max_entries: int = 512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+        self._pending: Dict[str, _Pending] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_fetch(self, query: str, fetch: Callable[[], object], variant: str = "") -> Tuple[object, bool]:
+        """Returns (results, from_cache). `variant` separates otherwise equal queries (e.g. max_results)."""
+        key = f"{variant}|{normalize_query(query)}"
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], True
+            if entry:
+                del self._entries[key]
+
+            pending = self._pending.get(key)
+            if pending:
+                self.coalesced += 1
+                owner = False
+            else:
+                pending = self._pending[key] = _Pending()
+                self.misses += 1
+                owner = True
+
+        if not owner:
+            pending.event.wait()
+            if pending.error:
+                raise pending.error
+            return pending.value, True
+
+        try:
+            pending.value = fetch()
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+                if pending.error is None:
+                    self._entries[key] = (time.monotonic() + self.ttl, pending.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            pending.event.set()
+        return pending.value, False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            }
+
+
+# Global instance
+search_cache = SearchCache(
+    ttl=int(os.getenv("AGENT_SEARCH_CACHE_TTL", "900")),
+    max_entries=int(os.getenv("AGENT_SEARCH_CACHE_SIZE", "512")),
+)
@@ -0,0 +1,53 @@
+import os
+from typing import Dict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Base URLs of the external services. Each can be pointed elsewhere (a proxy, or the
+# local stand-ins in benchmarks/fake_services.py) through the environment.
+# OpenAI reads OPENAI_BASE_URL itself and Supabase uses SUPABASE_URL.
+DEFAULT_REDDIT_RSS_BASE = "https://www.reddit.com"
+DEFAULT_GITHUB_API_BASE = "https://api.github.com"
+DEFAULT_YOUTUBE_API_BASE = "https://youtube.googleapis.com"
+
+REDDIT_RSS_BASE = (os.getenv("REDDIT_RSS_BASE") or DEFAULT_REDDIT_RSS_BASE).rstrip("/")
+GITHUB_API_BASE = (os.getenv("GITHUB_API_BASE") or DEFAULT_GITHUB_API_BASE).rstrip("/")
+YOUTUBE_API_BASE = os.getenv("YOUTUBE_API_BASE")
+APIFY_API_URL = os.getenv("APIFY_API_URL")
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE")
+
+
+def canonical_url(url: str) -> str:
+    """Maps a URL under an overridden base back to the public endpoint (for cassette keys)."""
+    overrides = [
+        (REDDIT_RSS_BASE, DEFAULT_REDDIT_RSS_BASE),
+        (GITHUB_API_BASE, DEFAULT_GITHUB_API_BASE),
+        ((YOUTUBE_API_BASE or DEFAULT_YOUTUBE_API_BASE).rstrip("/"), DEFAULT_YOUTUBE_API_BASE),
+    ]
+    # Longest first, so a base nested under another (e.g. <proxy>/github) wins
+    for base, default in sorted(overrides, key=lambda pair: len(pair[0]), reverse=True):
+        if base != default and url.startswith(base + "/"):
+            return default + url[len(base):]
+    return url
+
+
+def gemini_configure_kwargs() -> Dict:
+    """Extra genai.configure() arguments when GEMINI_API_BASE overrides the endpoint."""
+    if not GEMINI_API_BASE:
+        return {}
+    return {"transport": "rest", "client_options": {"api_endpoint": GEMINI_API_BASE}}
+
+
+def youtube_build_kwargs() -> Dict:
+    """Extra googleapiclient build() arguments when YOUTUBE_API_BASE overrides the endpoint."""
+    if not YOUTUBE_API_BASE:
+        return {}
+    return {"client_options": {"api_endpoint": YOUTUBE_API_BASE}}
+
+
+def apify_client_kwargs() -> Dict:
+    """Extra ApifyClient() arguments when APIFY_API_URL overrides the endpoint."""
+    if not APIFY_API_URL:
+        return {}
+    return {"api_url": APIFY_API_URL, "api_public_url": APIFY_API_URL}
@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from tools.cassette import cassette
+from tools.metrics import metrics
+
+load_dotenv()
+
+DEFAULT_PATH = os.path.join(".cache", "sources.json")
+# Age after which the snapshot is refreshed from the 'sources' table (in the background)
+DEFAULT_REFRESH_SECONDS = 900
+
+# Only the columns the scrapers need
+_COLUMNS = "platform,identifier"
+
+
+def group_sources(rows: List[Dict]) -> Dict[str, List[str]]:
+    """platform -> identifiers, in table order, in one pass over the rows."""
+    grouped: Dict[str, List[str]] = {}
+    for row in rows or []:
+        platform, identifier = row.get("platform"), row.get("identifier")
+        if platform and identifier:
+            grouped.setdefault(platform, []).append(identifier)
+    return grouped
+
+
+def _fetch_active_sources() -> Optional[List[Dict]]:
+    from tools.db_client import get_supabase_client
+
+    client = get_supabase_client()
+    if not client:
+        return None
+    return client.table("sources").select(_COLUMNS).eq("active", True).execute().data
+
+
+class SourceRegistry:
+    """
+    Active news sources (the 'sources' table) grouped by platform, served from a local
+    snapshot file so a run does not wait for the database:
+
+      fresh snapshot (younger than `refresh_seconds`) -> used as is
+      stale snapshot -> used as is, and refreshed in a background thread for the next run
+      no snapshot    -> fetched now; if that fails the caller falls back to its defaults
+
+    A failed refresh keeps the last snapshot. While a cassette records or replays, the
+    table is always read through it, so runs stay reproducible.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, refresh_seconds: float = DEFAULT_REFRESH_SECONDS):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Dict] = None
+        self._refreshing = False
+
+    def _load(self) -> Optional[Dict]:
+        # Callers hold self._lock
+        if self._snapshot is None and os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._snapshot = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable sources snapshot {self.path}: {e}")
+        return self._snapshot
+
+    def _save(self, snapshot: Dict):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self) -> Optional[Dict[str, List[str]]]:
+        """Reads the table and replaces the snapshot; None when the database is not configured or fails."""
+        with metrics.stage("sources") as call:
+            try:
+                rows = cassette.call("supabase", {"table": "sources", "active": True}, _fetch_active_sources)
+            except Exception as e:
+                call.errors += 1
+                print(f"Error fetching sources from DB: {e}")
+                return None
+            if rows is None:
+                return None
+            call.items_out = len(rows)
+
+        snapshot = {"fetched_at": time.time(), "sources": group_sources(rows)}
+        with self._lock:
+            self._snapshot = snapshot
+        if not cassette.active:
+            try:
+                self._save(snapshot)
+            except OSError as e:
+                print(f"Could not write sources snapshot {self.path}: {e}")
+        return snapshot["sources"]
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="source-registry-refresh", daemon=True).start()
+
+    def get(self) -> Optional[Dict[str, List[str]]]:
+        """platform -> identifiers (see the class docstring); None when nothing is known."""
+        if cassette.active:
+            return self.refresh()
+        with self._lock:
+            snapshot = self._load()
+        if snapshot is None:
+            return self.refresh()
+        if time.time() - snapshot.get("fetched_at", 0) > self.refresh_seconds:
+            self._refresh_in_background()
+        return snapshot.get("sources", {})
+
+
+def _source_registry_from_env() -> SourceRegistry:
+    try:
+        refresh_seconds = float(os.getenv("SOURCES_REFRESH_SECONDS") or DEFAULT_REFRESH_SECONDS)
+    except ValueError:
+        print("Invalid SOURCES_REFRESH_SECONDS. Using the default.")
+        refresh_seconds = DEFAULT_REFRESH_SECONDS
+    return SourceRegistry(os.getenv("SOURCES_SNAPSHOT_PATH") or DEFAULT_PATH, refresh_seconds)
+
+
+# Global instance
+source_registry = _source_registry_from_env()
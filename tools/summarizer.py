@@ -1,17 +1,11 @@
 import json
-import os
 import re
 from typing import Any, Dict, List
 
-import google.generativeai as genai
-from dotenv import load_dotenv
-
-load_dotenv()
-
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+from tools.llm_gateway import llm_gateway
+from tools.metrics import metrics
+from tools.news_item import NewsItem, build_news_item
+from tools.prompt_prep import estimate_tokens, fit_to_budget
 
 _ALLOWED_CATEGORIES = {
     "Modele LLM",
@@ -24,39 +18,15 @@ _ALLOWED_CATEGORIES = {
 }
 
 
-def _extract_json_payload(text: str) -> Dict[str, Any]:
-    """Try to parse Gemini response as JSON, even when wrapped in markdown fences."""
-    candidate = text.strip()
-
-    # Case 1: plain JSON
-    try:
-        return json.loads(candidate)
-    except Exception:
-        pass
-
-    # Case 2: fenced JSON: ```json ... ```
-    fence_match = re.search(r"```(?:json)?\s*(\{[\s\S]*?\})\s*```", candidate)
-    if fence_match:
-        return json.loads(fence_match.group(1))
-
-    # Case 3: first JSON object in text
-    object_match = re.search(r"(\{[\s\S]*\})", candidate)
-    if object_match:
-        return json.loads(object_match.group(1))
-
-    raise ValueError("Response does not contain valid JSON")
-
-
-def _fallback_summary(news_item: Dict[str, Any]) -> Dict[str, Any]:
+def _fallback_summary(news_item: NewsItem) -> NewsItem:
     """Deterministic fallback summary when LLM is unavailable or response is invalid."""
-    title = (news_item.get("title") or "Brak tytułu").strip()
-    source = news_item.get("source_platform", "źródło")
-    author = news_item.get("author_or_channel", "nieznany autor")
-    raw = (news_item.get("raw_content") or "").strip()
-
-    if raw:
-        normalized = re.sub(r"\s+", " ", raw)
-        snippets = [s.strip(" -•\t") for s in re.split(r"[\.!?]\s+", normalized) if s.strip()]
+    title = (news_item.title or "Brak tytułu").strip()
+    source = news_item.source_platform or "źródło"
+    author = news_item.author_or_channel or "nieznany autor"
+    text = news_item.raw_content
+
+    if text:
+        snippets = [s.strip(" -•\t") for s in re.split(r"[\.!?]\s+", text) if s.strip()]
         content_points = snippets[:2]
     else:
         content_points = []
@@ -74,14 +44,14 @@ def _fallback_summary(news_item: Dict[str, Any]) -> Dict[str, Any]:
     if len(summary_points) < 3:
         summary_points.append("Brak pełnej treści do analizy — warto otworzyć oryginalny materiał.")
 
-    news_item["summary_points"] = summary_points[:5]
-    if not news_item.get("category") or news_item.get("category") == "Uncategorized":
-        news_item["category"] = "Wiadomości z Branży"
+    news_item.summary_points = summary_points[:5]
+    if not news_item.category or news_item.category == "Uncategorized":
+        news_item.category = "Wiadomości z Branży"
 
     return news_item
 
 
-def _normalize_result(news_item: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+def _normalize_result(news_item: NewsItem, result: Dict[str, Any]) -> NewsItem:
     points = result.get("summary_points", [])
     if not isinstance(points, list):
         points = []
@@ -92,29 +62,43 @@ def _normalize_result(news_item: Dict[str, Any], result: Dict[str, Any]) -> Dict
     if category not in _ALLOWED_CATEGORIES:
         category = "Wiadomości z Branży"
 
-    news_item["summary_points"] = cleaned_points[:5]
-    news_item["category"] = category
+    news_item.summary_points = cleaned_points[:5]
+    news_item.category = category
 
-    if not news_item["summary_points"]:
+    if not news_item.summary_points:
         return _fallback_summary(news_item)
 
     return news_item
 
 
-def summarize_news_item(news_item: Dict[str, Any]) -> Dict[str, Any]:
+def summarize_news_item(news_item: NewsItem) -> NewsItem:
     """
-    Generates summary points and category for a NewsItem using Gemini.
-    Falls back to deterministic summary if API key is missing or parsing fails.
+    Generates summary points and category for a NewsItem through the LLM gateway.
+    Falls back to deterministic summary if no LLM is configured or the answer is unusable.
     """
-    if not GEMINI_API_KEY:
-        print("Warning: GEMINI_API_KEY not found. Using fallback summarization.")
+    with metrics.stage("summarizer", items_in=1) as call:
+        news_item = _summarize(news_item, call)
+        call.items_out = 1
+    return news_item
+
+
+def _summarize(news_item: NewsItem, call) -> NewsItem:
+    if not llm_gateway.available:
+        print("Warning: no LLM API key found (GEMINI_API_KEY / OPENAI_API_KEY). Using fallback summarization.")
         return _fallback_summary(news_item)
 
+    # Markup, links and boilerplate cost tokens and latency without helping the summary;
+    # scrapers already removed them (build_news_item), so only the budget is applied here
+    content = fit_to_budget(news_item.raw_content)
+    content_tokens = estimate_tokens(content)
+    metrics.inc("prompt_content_tokens_total", content_tokens, component="summarizer")
+    metrics.inc("prompt_tokens_saved_total", news_item.source_tokens - content_tokens, component="summarizer")
+
     prompt = f"""
-    Jesteś Ekspertem i Analitykiem AI. Przeanalizuj poniższą treść z platformy {news_item.get('source_platform', 'unknown')} ({news_item.get('author_or_channel', 'unknown')}).
+    Jesteś Ekspertem i Analitykiem AI. Przeanalizuj poniższą treść z platformy {news_item.source_platform} ({news_item.author_or_channel}).
 
-    Tytuł: {news_item.get('title', 'Brak tytułu')}
-    Treść: {news_item.get('raw_content', '')}
+    Tytuł: {news_item.title}
+    Treść: {content}
 
     Zadanie:
     1. Wygeneruj 3-5 zwięzłych punktów podsumowujących kluczowe informacje W JĘZYKU POLSKIM.
@@ -129,26 +113,25 @@ def summarize_news_item(news_item: Dict[str, Any]) -> Dict[str, Any]:
     """
 
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(
-            prompt,
-            generation_config={"response_mime_type": "application/json"},
-        )
-
-        result = _extract_json_payload(response.text)
+        result = llm_gateway.generate_json(prompt, "summarizer")
+        if not isinstance(result, dict):
+            raise ValueError("Expected a JSON object")
         return _normalize_result(news_item, result)
 
     except Exception as e:
-        print(f"Error summarizing item {news_item.get('title', 'Unknown')}: {e}. Using fallback.")
+        print(f"Error summarizing item {news_item.title}: {e}. Using fallback.")
+        call.errors += 1
         return _fallback_summary(news_item)
 
 
 if __name__ == "__main__":
-    fake_item = {
-        "source_platform": "test",
-        "author_or_channel": "Test Channel",
-        "title": "New AI Model Released",
-        "raw_content": "Today we come to you with a new model that achieves 99% on MMLU. It is open weights and available now.",
-    }
+    fake_item = build_news_item(
+        "test",
+        title="New AI Model Released",
+        url="https://example.com/new-model",
+        published_at="2026-01-01T00:00:00Z",
+        author_or_channel="Test Channel",
+        content="Today we come to you with a new model that achieves 99% on MMLU. It is open weights and available now.",
+    )
     summarized = summarize_news_item(fake_item)
-    print(json.dumps(summarized, indent=2, ensure_ascii=False))
+    print(json.dumps(summarized.to_dict(), indent=2, ensure_ascii=False))
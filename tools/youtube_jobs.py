@@ -0,0 +1,208 @@
+import os
+import re
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+import subprocess
+import concurrent.futures
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from tools.audio_cache import AudioCache, extract_video_id
+
+# "[download]  42.3% of   3.71MiB at    1.05MiB/s ETA 00:02"
+_PROGRESS_RE = re.compile(
+    r"\[download\]\s+(?P<percent>[\d.]+)%"
+    r"(?:\s+of\s+~?\s*(?P<size>\S+))?"
+    r"(?:\s+at\s+(?P<speed>\S+))?"
+    r"(?:\s+ETA\s+(?P<eta>\S+))?"
+)
+
+_FINISHED_STATES = {"completed", "failed"}
+
+
+class ConversionJob:
+    """A single YouTube -> MP3 conversion."""
+
+    def __init__(self, url: str, quality: str = "0"):
+        self.id = uuid.uuid4().hex[:12]
+        self.url = url
+        self.quality = quality
+        self.video_id = extract_video_id(url)
+        self.cached = False
+        self.status = "queued"
+        self.progress = 0.0
+        self.size = None
+        self.speed = None
+        self.eta = None
+        self.error = None
+        self.file_path: Optional[Path] = None
+        self.download_name: Optional[str] = None
+        self.tmp_dir: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "url": self.url,
+            "video_id": self.video_id,
+            "quality": self.quality,
+            "cached": self.cached,
+            "status": self.status,
+            "progress": self.progress,
+            "size": self.size,
+            "speed": self.speed,
+            "eta": self.eta,
+            "error": self.error,
+            "filename": self.download_name,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def parse_progress_line(job: ConversionJob, line: str):
+    """Updates job status/progress from a line of yt-dlp output."""
+    match = _PROGRESS_RE.search(line)
+    if match:
+        job.status = "downloading"
+        job.progress = float(match.group("percent"))
+        job.size = match.group("size") or job.size
+        job.speed = match.group("speed")
+        job.eta = match.group("eta")
+    elif line.startswith("[ExtractAudio]"):
+        job.status = "converting"
+        job.progress = 100.0
+
+
+class ConversionManager:
+    """
+    Runs yt-dlp conversions in a bounded thread pool.
+    Results for recognised video ids go to the AudioCache and are served from there on
+    repeat requests; concurrent requests for the same (video id, quality) share one job.
+    Other results are kept for `retention_seconds` and then removed.
+    """
+
+    def __init__(self, cache: AudioCache, max_concurrent: int = 2, retention_seconds: int = 3600):
+        self.cache = cache
+        self.retention_seconds = retention_seconds
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, max_concurrent), thread_name_prefix="ytmp3"
+        )
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, ConversionJob] = {}
+        self._inflight: Dict[Tuple[str, str], ConversionJob] = {}
+
+    def submit(self, url: str, quality: str = "0") -> ConversionJob:
+        self._expire_old_jobs()
+        job = ConversionJob(url, quality)
+        key = (job.video_id, quality) if job.video_id else None
+
+        with self._lock:
+            if key and key in self._inflight:
+                return self._inflight[key]
+
+            self._jobs[job.id] = job
+            cached = self.cache.get(job.video_id, quality) if key else None
+            if cached:
+                job.cached = True
+                job.file_path = cached["path"]
+                job.download_name = cached["download_name"]
+                job.status = "completed"
+                job.progress = 100.0
+                job.finished_at = time.time()
+                job.done.set()
+                return job
+
+            if key:
+                self._inflight[key] = job
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ConversionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _expire_old_jobs(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job.status in _FINISHED_STATES and now - job.finished_at > self.retention_seconds
+            ]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            if job.tmp_dir:
+                shutil.rmtree(job.tmp_dir, ignore_errors=True)
+
+    def _run(self, job: ConversionJob):
+        job.tmp_dir = tempfile.mkdtemp(prefix="ytmp3_")
+        output_template = str(Path(job.tmp_dir) / "%(title).80s-%(id)s.%(ext)s")
+
+        cmd = [
+            "yt-dlp",
+            "--extract-audio",
+            "--audio-format", "mp3",
+            "--audio-quality", job.quality,
+            "--no-playlist",
+            "--newline",
+            "--output", output_template,
+            job.url,
+        ]
+
+        job.status = "starting"
+        tail = []
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+            )
+            for raw_line in proc.stdout:
+                line = raw_line.strip()
+                parse_progress_line(job, line)
+                tail = (tail + [line])[-5:]
+
+            if proc.wait() != 0:
+                raise RuntimeError("\n".join(tail) or "Unknown error")
+
+            mp3_files = sorted(Path(job.tmp_dir).glob("*.mp3"), key=lambda p: p.stat().st_mtime, reverse=True)
+            if not mp3_files:
+                raise RuntimeError("Conversion completed, but MP3 file was not found")
+
+            job.download_name = mp3_files[0].name
+            if job.video_id:
+                job.file_path = self.cache.put(job.video_id, job.quality, mp3_files[0], job.download_name)
+                shutil.rmtree(job.tmp_dir, ignore_errors=True)
+                job.tmp_dir = None
+            else:
+                job.file_path = mp3_files[0]
+            job.status = "completed"
+            job.progress = 100.0
+        except Exception as e:
+            print(f"[ytmp3 {job.id}] Conversion failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+            shutil.rmtree(job.tmp_dir, ignore_errors=True)
+            job.tmp_dir = None
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if job.video_id and self._inflight.get((job.video_id, job.quality)) is job:
+                    del self._inflight[(job.video_id, job.quality)]
+            job.done.set()
+
+
+# Global instance
+audio_cache = AudioCache(
+    os.getenv("YTMP3_CACHE_DIR", os.path.join(".cache", "ytmp3")),
+    max_bytes=int(os.getenv("YTMP3_CACHE_MAX_MB", "2048")) * 1024 * 1024,
+)
+conversion_manager = ConversionManager(audio_cache, max_concurrent=int(os.getenv("YTMP3_MAX_CONCURRENT", "2")))
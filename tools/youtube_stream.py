@@ -0,0 +1,106 @@
+import os
+import subprocess
+import threading
+from typing import Iterator, List, Optional
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _ffmpeg_quality_args(quality: str) -> List[str]:
+    """Maps yt-dlp --audio-quality values (0-10 VBR or e.g. 192K) to libmp3lame flags."""
+    if quality.upper().endswith("K"):
+        return ["-b:a", quality.lower()]
+    return ["-q:a", str(min(int(quality), 9))]
+
+
+class Mp3Stream:
+    """
+    yt-dlp (best audio to stdout) piped into ffmpeg (mp3 to stdout).
+    Nothing touches the disk; iterate to receive MP3 chunks as ffmpeg produces them.
+    close() kills both children, so a client disconnect stops the download and transcode.
+    """
+
+    def __init__(self, url: str, quality: str = "0", chunk_size: int = CHUNK_SIZE):
+        self.url = url
+        self.quality = quality
+        self.chunk_size = chunk_size
+        self._procs: List[subprocess.Popen] = []
+        self._first_chunk: Optional[bytes] = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def start(self) -> bool:
+        """Starts the pipeline and waits for the first chunk. Returns False if nothing was produced."""
+        ytdlp = subprocess.Popen(
+            ["yt-dlp", "--format", "bestaudio/best", "--no-playlist", "--quiet", "--no-warnings",
+             "--output", "-", self.url],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._procs.append(ytdlp)
+        ffmpeg = subprocess.Popen(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-vn",
+             "-codec:a", "libmp3lame", *_ffmpeg_quality_args(self.quality), "-f", "mp3", "pipe:1"],
+            stdin=ytdlp.stdout,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._procs.append(ffmpeg)
+        # Only ffmpeg reads yt-dlp's stdout now; lets yt-dlp get SIGPIPE if ffmpeg dies
+        ytdlp.stdout.close()
+
+        self._first_chunk = self._read()
+        if not self._first_chunk:
+            self.close()
+            return False
+        return True
+
+    def _read(self) -> bytes:
+        # os.read returns whatever is available instead of waiting for a full chunk
+        return os.read(self._procs[-1].stdout.fileno(), self.chunk_size)
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            if self._first_chunk:
+                yield self._first_chunk
+                self._first_chunk = None
+            while True:
+                chunk = self._read()
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            # Runs on normal completion and on GeneratorExit when the client disconnects
+            self.close()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for proc in reversed(self._procs):
+            if proc.poll() is None:
+                proc.kill()
+        for proc in self._procs:
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+            if proc.stdout:
+                proc.stdout.close()
+
+
+class StreamLimiter:
+    """Caps the number of concurrent streaming conversions."""
+
+    def __init__(self, max_streams: int):
+        self._semaphore = threading.BoundedSemaphore(max(1, max_streams))
+
+    def try_acquire(self) -> bool:
+        return self._semaphore.acquire(blocking=False)
+
+    def release(self):
+        self._semaphore.release()
+
+
+stream_limiter = StreamLimiter(int(os.getenv("YTMP3_MAX_STREAMS", "4")))
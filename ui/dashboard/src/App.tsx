@@ -38,6 +38,14 @@ interface NewsItem {
   author_or_channel: string;
   status: 'inbox' | 'reviewed' | 'done' | 'trash';
   raw_content?: string;
+  related_sources?: RelatedSource[];
+}
+
+interface RelatedSource {
+  source_platform: string;
+  url: string;
+  title: string;
+  author_or_channel: string;
 }
 
 interface Source {
@@ -190,6 +190,25 @@ export const NewsCard = ({ item, onClickExpand, isExpanded, onUpdate }: any) =>
                                     )}
                                 </div>
                             )}
+
+                            {item.related_sources?.length > 0 && (
+                                <div className="mt-3 pt-2 border-t border-zinc-800/50 space-y-1 text-xs">
+                                    <p className="text-zinc-500">Także w:</p>
+                                    {item.related_sources.map((source: any) => (
+                                        <a
+                                            key={source.url}
+                                            href={source.url}
+                                            target="_blank"
+                                            rel="noopener noreferrer"
+                                            onPointerDown={e => e.stopPropagation()}
+                                            className="flex items-center gap-1.5 text-zinc-400 hover:text-emerald-400 truncate"
+                                        >
+                                            <ExternalLink size={12} className="shrink-0" />
+                                            <span className="truncate">{source.source_platform}: {source.title}</span>
+                                        </a>
+                                    ))}
+                                </div>
+                            )}
                         </div>
                     </motion.div>
                 )}
@@ -1,4 +1,4 @@
-from tools.db_client import save_leads, get_supabase_client
+from tools.db_client import save_leads, get_supabase_client, flush_outbox
 from datetime import datetime
 
 client = get_supabase_client()
@@ -22,6 +22,7 @@ test_lead = {
 print("Saving test lead...")
 res = save_leads([test_lead])
 print(f"Save Result: {res}")
+flush_outbox()
 
 print("Verifying in DB...")
 data = client.table("leads").select("*").eq("company_name", "Test Salon Warsaw").execute()